@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""Hash release assets once for size, SHA256, electron-updater SHA512 and CRC32.
+
+The same pass can also cut an electron-updater blockmap for differential
+updates; see :class:`BlockMapBuilder`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import BinaryIO
+
+import timings
+
+
+BUFFER_SIZE = 8 * 1024 * 1024
+CACHE_VERSION = 1
+CACHE_MAX_ENTRIES = 512
+BLOCKMAP_VERSION = "2"
+BLOCKMAP_CHECKSUM_SIZE = 18
+CHUNK_MIN_SIZE = 8 * 1024
+CHUNK_MAX_SIZE = 32 * 1024
+# A chunk may end after any byte pair matching this pattern, one position in
+# 8192 on compressed installers: 16 KiB average chunks. The literal first byte
+# lets ``re`` skip ahead in C instead of hashing every byte in Python.
+CHUNK_BOUNDARY_RE = re.compile(rb"\x5e[\x03\x1d\x38\x5b\x7a\x9c\xbe\xe1]")
+# Bump when the chunking rule changes so cached blockmaps are not reused.
+# Chunks cut by another rule (electron-builder's Rabin chunker, or an older
+# version here) never match these, so the first update across such a change
+# downloads the whole package once; later updates share chunks again.
+CHUNKER_VERSION = 2
+_buffer: bytearray | None = None
+
+
+class DigestCacheError(RuntimeError):
+    pass
+
+
+class BlockMapError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class AssetDigest:
+    path: str
+    size: int
+    sha256: str
+    sha512: str
+    crc32: int
+    seconds: float
+    cached: bool = False
+    blockmap: bytes | None = field(default=None, repr=False)
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.size / (1024 * 1024) / max(self.seconds, 1e-9)
+
+
+class MultiDigest:
+    """Incremental size, SHA256, SHA512 and CRC32 over one byte stream."""
+
+    def __init__(self) -> None:
+        self._sha256 = hashlib.sha256()
+        self._sha512 = hashlib.sha512()
+        self.crc32 = 0
+        self.size = 0
+
+    def update(self, chunk: bytes | memoryview) -> None:
+        self._sha256.update(chunk)
+        self._sha512.update(chunk)
+        self.crc32 = zlib.crc32(chunk, self.crc32)
+        self.size += len(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def sha512(self) -> str:
+        """Base64 SHA512, the ``sha512:`` format electron-builder writes."""
+        return base64.b64encode(self._sha512.digest()).decode("ascii")
+
+
+class BlockMapBuilder:
+    """Content-defined chunks of one byte stream, as an electron-updater blockmap.
+
+    Output follows electron-builder's version 2 layout: gzipped JSON with one
+    ``file`` entry listing chunk sizes and base64 18-byte BLAKE2b checksums.
+    A chunk of 8-32 KiB ends after the first byte pair matching
+    ``CHUNK_BOUNDARY_RE``, so an edit only changes the chunks around it and
+    the boundary search runs in C. electron-builder cuts with a Rabin chunker
+    instead; both are valid blockmaps, but only files chunked the same way
+    share chunks, so releases should all be built by this tool.
+    """
+
+    def __init__(self) -> None:
+        self.checksums: list[str] = []
+        self.sizes: list[int] = []
+        self._chunk = hashlib.blake2b(digest_size=BLOCKMAP_CHECKSUM_SIZE)
+        self._length = 0
+        self._last: int | None = None
+
+    def update(self, data: bytes | memoryview) -> None:
+        view = memoryview(data)
+        position = 0
+        end = len(view)
+        while position < end:
+            # The pair ending a chunk of CHUNK_MIN_SIZE bytes starts one byte earlier.
+            if self._length < CHUNK_MIN_SIZE - 1:
+                take = min(CHUNK_MIN_SIZE - 1 - self._length, end - position)
+                self._feed(view[position : position + take])
+                position += take
+                continue
+            limit = min(end, position + CHUNK_MAX_SIZE - self._length)
+            if self._last is not None and CHUNK_BOUNDARY_RE.fullmatch(
+                bytes((self._last, view[position]))
+            ):
+                cut, boundary = position + 1, True
+            else:
+                match = CHUNK_BOUNDARY_RE.search(view, position, limit)
+                cut, boundary = (match.end(), True) if match else (limit, False)
+            self._feed(view[position:cut])
+            position = cut
+            if boundary or self._length >= CHUNK_MAX_SIZE:
+                self._cut()
+
+    def _feed(self, data: memoryview) -> None:
+        self._chunk.update(data)
+        self._length += len(data)
+        self._last = data[-1]
+
+    def _cut(self) -> None:
+        self.checksums.append(base64.b64encode(self._chunk.digest()).decode("ascii"))
+        self.sizes.append(self._length)
+        self._chunk = hashlib.blake2b(digest_size=BLOCKMAP_CHECKSUM_SIZE)
+        self._length = 0
+        self._last = None
+
+    def finish(self) -> bytes:
+        if self._length:
+            self._cut()
+        return encode_blockmap(self.checksums, self.sizes)
+
+
+def encode_blockmap(checksums: list[str], sizes: list[int]) -> bytes:
+    """Serialize a blockmap reproducibly, so reruns produce identical bytes."""
+    document = {
+        "version": BLOCKMAP_VERSION,
+        "files": [
+            {"name": "file", "offset": 0, "checksums": checksums, "sizes": sizes}
+        ],
+    }
+    payload = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(payload, compresslevel=9, mtime=0)
+
+
+def decode_blockmap(data: bytes) -> tuple[list[str], list[int]]:
+    return read_blockmap(io.BytesIO(data))
+
+
+def read_blockmap(stream: BinaryIO) -> tuple[list[str], list[int]]:
+    """Decompress and parse a blockmap from ``stream`` without buffering it gzipped."""
+    try:
+        with gzip.GzipFile(fileobj=stream) as handle:
+            document = json.load(handle)
+    except (OSError, EOFError, ValueError) as exc:
+        raise BlockMapError(f"blockmap is not gzipped JSON: {exc}") from exc
+    if not isinstance(document, dict) or document.get("version") != BLOCKMAP_VERSION:
+        raise BlockMapError("unsupported blockmap version")
+    files = document.get("files")
+    if not isinstance(files, list) or len(files) != 1 or not isinstance(files[0], dict):
+        raise BlockMapError("blockmap must describe exactly one file")
+    checksums = files[0].get("checksums")
+    sizes = files[0].get("sizes")
+    if (
+        files[0].get("offset", 0) != 0
+        or not isinstance(checksums, list)
+        or not isinstance(sizes, list)
+        or len(checksums) != len(sizes)
+        or not all(isinstance(size, int) and size > 0 for size in sizes)
+        or not all(isinstance(checksum, str) for checksum in checksums)
+    ):
+        raise BlockMapError("blockmap chunk list is malformed")
+    return checksums, sizes
+
+
+def verify_blockmap(path: Path | str, data: bytes) -> int:
+    """Check every chunk of ``data`` against ``path`` and return the chunk count."""
+    checksums, sizes = decode_blockmap(data)
+    total = os.path.getsize(path)
+    if sum(sizes) != total:
+        raise BlockMapError(
+            f"blockmap covers {sum(sizes)} bytes but {path} has {total}"
+        )
+    with open(path, "rb") as handle:
+        for index, (checksum, size) in enumerate(zip(checksums, sizes)):
+            chunk = hashlib.blake2b(handle.read(size), digest_size=BLOCKMAP_CHECKSUM_SIZE)
+            if base64.b64encode(chunk.digest()).decode("ascii") != checksum:
+                offset = sum(sizes[:index])
+                raise BlockMapError(
+                    f"blockmap chunk {index} at offset {offset} does not match {path}"
+                )
+    timings.count("bytes_hashed", total)
+    return len(sizes)
+
+
+def chunked_here(sizes: list[int]) -> bool:
+    """Whether every chunk but the last fits this chunker's size bounds.
+
+    A blockmap that fails this was cut by another chunker, such as
+    electron-builder's, and shares next to no chunks with ours.
+    """
+    return all(CHUNK_MIN_SIZE <= size <= CHUNK_MAX_SIZE for size in sizes[:-1])
+
+
+def _reusable_buffer() -> memoryview:
+    global _buffer
+    if _buffer is None:
+        _buffer = bytearray(BUFFER_SIZE)
+    return memoryview(_buffer)
+
+
+def digest_file(path: Path | str, blockmap: bool = False) -> AssetDigest:
+    """Read ``path`` exactly once and feed every digest from the same buffer.
+
+    With ``blockmap`` the same pass also chunks the file for a blockmap.
+    """
+    started = time.perf_counter()
+    buffer = _reusable_buffer()
+    digest = MultiDigest()
+    builder = BlockMapBuilder() if blockmap else None
+    with open(path, "rb", buffering=0) as handle:
+        while True:
+            count = handle.readinto(buffer)
+            if not count:
+                break
+            digest.update(buffer[:count])
+            if builder is not None:
+                builder.update(buffer[:count])
+    return AssetDigest(
+        path=str(path),
+        size=digest.size,
+        sha256=digest.sha256,
+        sha512=digest.sha512,
+        crc32=digest.crc32,
+        seconds=time.perf_counter() - started,
+        blockmap=builder.finish() if builder is not None else None,
+    )
+
+
+def default_cache_path() -> Path:
+    configured = os.environ.get("XIAOR_DIGEST_CACHE")
+    if configured:
+        return Path(configured).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "xiaor-release" / "digests.json"
+
+
+def cache_key(stat: os.stat_result) -> str:
+    return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class DigestCache:
+    """Digests of unchanged local files, stored outside the repository.
+
+    Entries are keyed by device, inode, size and nanosecond mtime, so any
+    rewrite or replacement of a file misses the cache. Generated blockmaps
+    are kept beside the cache, named by the file's SHA256 and the chunker
+    version, and are only reused through a matching entry. The least
+    recently used entries are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, path: Path | None = None, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path or default_cache_path()
+        self.blockmap_dir = self.path.parent / "blockmaps"
+        self.max_entries = max_entries
+        self.entries: dict[str, dict] = {}
+        self.dirty = False
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+            entries = data.get("entries")
+            if isinstance(entries, dict):
+                self.entries = entries
+
+    def _blockmap_path(self, sha256: str) -> Path:
+        return self.blockmap_dir / f"{sha256}.v{CHUNKER_VERSION}.blockmap"
+
+    def get(self, key: str, path: Path | str, blockmap: bool = False) -> AssetDigest | None:
+        """Cached digest for ``key``; with ``blockmap`` only if its blockmap is kept too."""
+        entry = self.entries.get(key)
+        if not isinstance(entry, dict):
+            return None
+        try:
+            result = AssetDigest(
+                path=str(path),
+                size=int(key.rsplit(":", 2)[1]),
+                sha256=str(entry["sha256"]),
+                sha512=str(entry["sha512"]),
+                crc32=int(entry["crc32"]),
+                seconds=0.0,
+                cached=True,
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+        if blockmap:
+            data = self.blockmap(result.sha256)
+            if data is None:
+                return None
+            result = replace(result, blockmap=data)
+        entry["used"] = time.time()
+        self.dirty = True
+        return result
+
+    def blockmap(self, sha256: str) -> bytes | None:
+        try:
+            return self._blockmap_path(sha256).read_bytes()
+        except OSError:
+            return None
+
+    def put(self, key: str, result: AssetDigest) -> None:
+        self.entries[key] = {
+            "sha256": result.sha256,
+            "sha512": result.sha512,
+            "crc32": result.crc32,
+            "used": time.time(),
+        }
+        if result.blockmap is not None:
+            target = self._blockmap_path(result.sha256)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=target.parent, delete=False) as handle:
+                handle.write(result.blockmap)
+            os.replace(handle.name, target)
+        self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        if len(self.entries) > self.max_entries:
+            newest = sorted(
+                self.entries.items(),
+                key=lambda item: item[1].get("used", 0),
+                reverse=True,
+            )[: self.max_entries]
+            self.entries = dict(newest)
+            kept = {entry.get("sha256") for entry in self.entries.values()}
+            for stale in self.blockmap_dir.glob("*.blockmap"):
+                if stale.name.split(".", 1)[0] not in kept:
+                    stale.unlink(missing_ok=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=self.path.parent, delete=False
+        ) as handle:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries}, handle)
+        os.replace(handle.name, self.path)
+        self.dirty = False
+
+
+def _pooled_digests(
+    paths: list[Path], blockmaps: list[bool], jobs: int | None
+) -> list[AssetDigest]:
+    if jobs is None:
+        jobs = min(len(paths), os.cpu_count() or 1)
+    if jobs <= 1 or len(paths) <= 1:
+        return [digest_file(path, blockmap) for path, blockmap in zip(paths, blockmaps)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(digest_file, paths, blockmaps))
+
+
+def digest_files(
+    paths: list[Path],
+    jobs: int | None = None,
+    cache: DigestCache | None = None,
+    verify_cache: bool = False,
+    blockmaps: list[bool] | None = None,
+) -> list[AssetDigest]:
+    """Digest ``paths`` in a process pool, returning results in input order.
+
+    With ``verify_cache`` every file is rehashed and a cached entry or
+    blockmap that disagrees with the fresh result raises
+    :class:`DigestCacheError`. Files flagged in ``blockmaps`` also get a
+    blockmap, from the cache or cut in the same pass as their digests.
+    """
+    blockmaps = blockmaps or [False] * len(paths)
+    keys = [cache_key(os.stat(path)) for path in paths]
+    results: list[AssetDigest | None] = [None] * len(paths)
+    if cache is not None and not verify_cache:
+        for index, (path, key) in enumerate(zip(paths, keys)):
+            results[index] = cache.get(key, path, blockmaps[index])
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    fresh = _pooled_digests(
+        [paths[index] for index in pending], [blockmaps[index] for index in pending], jobs
+    )
+    timings.count("bytes_hashed", sum(result.size for result in fresh))
+    for index, result in zip(pending, fresh):
+        results[index] = result
+        if cache is None:
+            continue
+        if verify_cache:
+            previous = cache.get(keys[index], paths[index])
+            cached_blockmap = (
+                cache.blockmap(previous.sha256)
+                if previous is not None and result.blockmap is not None
+                else None
+            )
+            if previous is not None and (
+                replace(
+                    previous, seconds=result.seconds, cached=False, blockmap=result.blockmap
+                )
+                != result
+                or cached_blockmap not in (None, result.blockmap)
+            ):
+                cache.put(keys[index], result)
+                cache.save()
+                raise DigestCacheError(
+                    f"stale digest cache entry for {paths[index]}; entry replaced"
+                )
+        if cache_key(os.stat(paths[index])) == keys[index]:
+            cache.put(keys[index], result)
+    if cache is not None:
+        cache.save()
+    return results
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="neither read nor update the local digest cache",
+    )
+    group.add_argument(
+        "--verify-cache",
+        action="store_true",
+        help="rehash every file and fail if a cached digest disagrees",
+    )
+
+
+def cache_from_arguments(args: argparse.Namespace) -> DigestCache | None:
+    return None if args.no_cache else DigestCache()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Print size, SHA256, SHA512 (base64) and CRC32 for local files"
+    )
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--jobs", type=int, default=None, help="hashing processes")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    try:
+        results = digest_files(
+            args.files, args.jobs, cache_from_arguments(args), args.verify_cache
+        )
+    except (DigestCacheError, OSError) as exc:
+        print(f"asset digest failed: {exc}", file=sys.stderr)
+        return 1
+    for result in results:
+        print(
+            f"{result.path}\tsize={result.size}\tsha256={result.sha256}\t"
+            f"sha512={result.sha512}\tcrc32={result.crc32}\t"
+            + ("cached" if result.cached else f"{result.megabytes_per_second:.1f} MB/s")
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Benchmark the release control plane on synthetic trees of increasing scale.
+
+Each scale copies the tracked repository into a scratch directory and adds
+synthetic release manifests, data.json entries with long ``oldVersion``
+histories, update/software.yaml entries and superseded-registry records until
+the catalog is that multiple of today's. Every phase is timed on its own and
+then repeated under ``tracemalloc`` for its peak Python allocation. Nothing
+talks to GitHub or TOS: the inventory phase lists a ``LocalObjectStore`` of
+sparse files and the hashing phase reads a sparse multi-GB file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from asset_digest import digest_file
+from build_images import read_manifest
+from prerender_index import apply_prerender
+from release_catalog import ROOT, ReleaseCatalog, normalize_object
+from tos_inventory import check, list_inventory
+from tos_store import LocalObjectStore
+from validate_release import (
+    ValidationCache,
+    validate,
+    validate_release_manifests,
+)
+
+
+BASELINE_VERSION = 1
+# Committed so every checkout compares against the same reference run.
+BASELINE_PATH = Path(__file__).with_name("benchmark-baseline.json")
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_TOLERANCE = 0.5
+# Differences below these floors are timer and allocator noise, not regressions.
+NOISE_FLOORS = {"seconds": 0.05, "peak_bytes": 1024 * 1024}
+# Synthetic manifests carry one current asset, a version history and one
+# superseded build, which is longer than today's average manifest.
+HISTORY_LENGTH = 4
+GIB = 1024 * 1024 * 1024
+MEGABYTE = 1024 * 1024
+
+
+class BenchmarkError(RuntimeError):
+    pass
+
+
+def copy_tracked_tree(target: Path) -> None:
+    result = subprocess.run(
+        ["git", "ls-files", "-z"], cwd=ROOT, check=True, capture_output=True
+    )
+    for item in result.stdout.split(b"\0"):
+        if not item:
+            continue
+        relative = item.decode()
+        source = ROOT / relative
+        if not source.is_file():
+            continue
+        destination = target / relative
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source, destination)
+
+
+def fake_sha256(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def generate_tree(target: Path, scale: int) -> dict[str, int]:
+    """Write a tree with ``scale`` times today's manifests into ``target``."""
+    copy_tracked_tree(target)
+    catalog = ReleaseCatalog(target)
+    base_manifests = len(catalog.manifest_paths)
+    template = catalog.data[0]
+    data = list(catalog.data)
+    superseded = list(catalog.superseded or [])
+    yaml_lines = ["bench:"]
+    sizes: dict[str, int] = {}
+
+    for index in range(base_manifests * (scale - 1)):
+        tag = f"bench-{index:06d}"
+        prefix = f"software/bench/{index:06d}"
+        keys = [
+            f"{prefix}/BenchApp-{index}-{version}.apk"
+            for version in range(HISTORY_LENGTH + 2)
+        ]
+        current, history, retired = keys[-1], keys[1:-1][::-1], keys[0]
+        assets = []
+        for number, key in enumerate(keys):
+            size = 1 + (index * 7919 + number * 104729) % (64 * MEGABYTE)
+            sizes[key] = size
+            assets.append(
+                {
+                    "name": Path(key).name,
+                    "tos_key": key,
+                    "size": size,
+                    "sha256": fake_sha256(key),
+                }
+            )
+        (target / "releases" / f"{tag}.json").write_text(
+            json.dumps(
+                {
+                    "schema_version": 1,
+                    "tag": tag,
+                    "title": f"Bench App {index}",
+                    "target_commitish": "master",
+                    "assets": assets,
+                },
+                indent=2,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        data.append(
+            {
+                **template,
+                "name": {"en": f"Bench App {index}", "zh": f"基准应用 {index}"},
+                "link": [current],
+                "oldVersion": history,
+            }
+        )
+        superseded.append(
+            {
+                "tos_key": retired,
+                "replacement_tos_key": current,
+                "reason": "Synthetic benchmark build replaced by a corrected build.",
+            }
+        )
+        yaml_lines += [
+            f"  BenchApp{index}:",
+            f"    name: BenchApp{index}",
+            f"    version: 1.0.{index}",
+            f"    url: {current}",
+        ]
+
+    if scale > 1:
+        (target / "data.json").write_text(
+            json.dumps(data, ensure_ascii=False, indent=4) + "\n", encoding="utf-8"
+        )
+        # Keep the pre-rendered list in step so the tree still validates.
+        index = target / "index.html"
+        index.write_text(
+            apply_prerender(
+                index.read_text(encoding="utf-8"), data, read_manifest(target)["images"]
+            ),
+            encoding="utf-8",
+        )
+        (target / "releases/audit/superseded-assets.json").write_text(
+            json.dumps(superseded, ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+        with (target / "update/software.yaml").open("a", encoding="utf-8") as handle:
+            handle.write("\n".join(yaml_lines) + "\n")
+    for asset in catalog.assets:
+        sizes.setdefault(asset.tos_key, asset.size)
+
+    subprocess.run(["git", "init", "-q"], cwd=target, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=target, check=True)
+    return sizes
+
+
+def populate_store(store_root: Path, sizes: dict[str, int]) -> LocalObjectStore:
+    """Materialize every manifest asset as a sparse object in a local store."""
+    for key, size in sizes.items():
+        path = store_root / "objects" / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as handle:
+            handle.truncate(size)
+    return LocalObjectStore(store_root)
+
+
+def measure(phase: str, function) -> dict:
+    """Time ``function`` untraced, then rerun it under tracemalloc for memory."""
+    gc.collect()
+    started = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print(f"  {phase:<34} {seconds:9.3f} s {peak / MEGABYTE:9.1f} MiB", flush=True)
+    return {"phase": phase, "seconds": seconds, "peak_bytes": peak, "result": result}
+
+
+def run_scale(workdir: Path, scale: int, jobs: int) -> list[dict]:
+    tree = workdir / f"tree-{scale}x"
+    started = time.perf_counter()
+    sizes = generate_tree(tree, scale)
+    catalog = ReleaseCatalog(tree)
+    print(
+        f"scale {scale}x: {len(catalog.manifest_paths)} manifests, "
+        f"{len(sizes)} assets, {len(catalog.data)} data.json entries "
+        f"(generated in {time.perf_counter() - started:.1f} s)",
+        flush=True,
+    )
+    values = [
+        str(value)
+        for entry in catalog.data
+        for field in ("link", "oldVersion")
+        for value in entry.get(field, [])
+    ]
+    cache = ValidationCache(workdir / f"validation-{scale}x.json")
+    validate(ReleaseCatalog(tree), 1, cache)
+    store = populate_store(workdir / f"store-{scale}x", sizes)
+
+    phases = [
+        measure(
+            "normalize_object",
+            lambda: sum(1 for value in values if normalize_object(value)),
+        ),
+        measure(
+            "yaml_urls",
+            lambda: len(ReleaseCatalog(tree).urls("update/software.yaml")),
+        ),
+        measure(
+            "validate_release_manifests",
+            lambda: validate_release_manifests(ReleaseCatalog(tree))[0],
+        ),
+        measure(
+            "validate_release_manifests --jobs",
+            lambda: validate_release_manifests(ReleaseCatalog(tree), jobs)[0],
+        ),
+        measure("validate", lambda: len(validate(ReleaseCatalog(tree)))),
+        measure(
+            "validate --incremental",
+            lambda: len(
+                validate(
+                    ReleaseCatalog(tree),
+                    1,
+                    ValidationCache(workdir / f"validation-{scale}x.json"),
+                )
+            ),
+        ),
+        measure(
+            "tos inventory check",
+            lambda: len(
+                check(
+                    ReleaseCatalog(tree).referenced_objects,
+                    list_inventory(store, ("software/", "firmware/", "ota/")),
+                    sizes,
+                )
+            ),
+        ),
+    ]
+    for phase in phases:
+        phase["scale"] = scale
+    return phases
+
+
+def run_hash(workdir: Path, gib: float) -> dict:
+    path = workdir / "sparse-asset.bin"
+    with path.open("wb") as handle:
+        handle.truncate(int(gib * GIB))
+    print(f"sparse asset: {gib:g} GiB", flush=True)
+    # The same single read pass prepare_release makes for every asset.
+    phase = measure("digest_file", lambda: digest_file(path).sha256)
+    phase["scale"] = None
+    phase["megabytes_per_second"] = path.stat().st_size / MEGABYTE / phase["seconds"]
+    print(f"  {'':<34} {phase['megabytes_per_second']:9.1f} MB/s")
+    path.unlink()
+    return phase
+
+
+def phase_id(phase: dict) -> str:
+    scale = phase.get("scale")
+    return phase["phase"] if scale is None else f"{scale}x {phase['phase']}"
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    previous = {phase_id(phase): phase for phase in baseline.get("phases", [])}
+    regressions: list[str] = []
+    for phase in results:
+        before = previous.get(phase_id(phase))
+        if before is None:
+            continue
+        for field in ("seconds", "peak_bytes"):
+            if (
+                phase[field] > before[field] * (1 + tolerance)
+                and phase[field] - before[field] > NOISE_FLOORS[field]
+            ):
+                regressions.append(
+                    f"{phase_id(phase)} {field}: {before[field]:.4g} -> {phase[field]:.4g}"
+                )
+        if before.get("result") != phase.get("result"):
+            regressions.append(
+                f"{phase_id(phase)} result changed: {before.get('result')} -> "
+                f"{phase.get('result')}"
+            )
+    return regressions
+
+
+def parse_scales(value: str) -> list[int]:
+    try:
+        scales = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"invalid scale list: {value}") from exc
+    if not scales or min(scales) < 1:
+        raise argparse.ArgumentTypeError("scales must be positive integers")
+    return scales
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark release validation and hashing on synthetic trees"
+    )
+    parser.add_argument(
+        "--scales",
+        type=parse_scales,
+        default=list(DEFAULT_SCALES),
+        metavar="N,N,...",
+        help="multiples of today's catalog to generate (default: 1,10,100; "
+        "1000 takes several minutes)",
+    )
+    parser.add_argument(
+        "--asset-gib",
+        type=float,
+        default=2.0,
+        metavar="GIB",
+        help="size of the sparse file read by digest_file (default: 2)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar="N",
+        help="processes for the parallel manifest phase (default: CPU count)",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=BASELINE_PATH,
+        help="baseline results to compare against (default: scripts/benchmark-baseline.json)",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store this run as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="allowed slowdown or memory growth before a phase counts as a "
+        f"regression (default: {DEFAULT_TOLERANCE})",
+    )
+    parser.add_argument("--output", type=Path, help="also write results as JSON here")
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the generated trees for inspection"
+    )
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="xiaor-bench-"))
+    try:
+        phases: list[dict] = []
+        for scale in args.scales:
+            phases += run_scale(workdir, scale, args.jobs)
+        if args.asset_gib > 0:
+            phases.append(run_hash(workdir, args.asset_gib))
+        report = {
+            "version": BASELINE_VERSION,
+            "created": time.time(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "phases": phases,
+        }
+        if args.output:
+            args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+        if args.update_baseline:
+            args.baseline.parent.mkdir(parents=True, exist_ok=True)
+            args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+            print(f"stored baseline: {args.baseline}")
+            return 0
+        if not args.baseline.is_file():
+            print("no baseline to compare; rerun with --update-baseline to store one")
+            return 0
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("version") != BASELINE_VERSION:
+            raise BenchmarkError(f"unsupported baseline version: {args.baseline}")
+        regressions = compare(phases, baseline, args.tolerance)
+        if regressions:
+            raise BenchmarkError(
+                "\n  ".join(["regressions against baseline:", *regressions])
+            )
+        print(f"no regressions against baseline: {args.baseline}")
+        return 0
+    except (
+        BenchmarkError,
+        OSError,
+        ValueError,
+        subprocess.CalledProcessError,
+    ) as exc:
+        print(f"benchmark failed: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        if args.keep:
+            print(f"kept generated trees in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Measure what electron-updater differential downloads save between releases.
+
+Each side is either a ``releases/<tag>.json`` manifest, whose updater
+blockmaps are streamed from the public download host, or a local
+``ASSET=BLOCKMAP`` pair that is first checked chunk by chunk. The plan
+mirrors electron-updater: a new chunk whose checksum and size exist in the
+old file is copied locally, everything else is downloaded, and adjacent
+downloads are coalesced into one Range request. A warning is printed when
+only one side was cut by this repository's chunker.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from urllib.parse import quote
+
+from asset_digest import (
+    BlockMapError,
+    chunked_here,
+    decode_blockmap,
+    read_blockmap,
+    verify_blockmap,
+)
+from release_catalog import ROOT, ReleaseCatalog
+
+
+PUBLIC_DOWNLOAD_BASE_URL = "https://software.xiao-r.com/"
+UPDATER_SUFFIXES = (".dmg", ".exe", ".zip")
+VERSION_RE = re.compile(r"\d+(?:\.\d+)+")
+MEGABYTE = 1024 * 1024
+
+
+class SavingsError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class DownloadPlan:
+    size: int
+    ranges: list[tuple[int, int]]
+    copies: int
+
+    @property
+    def download(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    @property
+    def saved(self) -> int:
+        return self.size - self.download
+
+
+def plan_download(
+    old: tuple[list[str], list[int]], new: tuple[list[str], list[int]]
+) -> DownloadPlan:
+    """Return the byte ranges of the new file a client on ``old`` must fetch."""
+    old_chunks: dict[str, tuple[int, int]] = {}
+    offset = 0
+    for checksum, size in zip(*old):
+        old_chunks.setdefault(checksum, (offset, size))
+        offset += size
+
+    ranges: list[tuple[int, int]] = []
+    copies = 0
+    copy_end = None
+    offset = 0
+    for checksum, size in zip(*new):
+        match = old_chunks.get(checksum)
+        if match is not None and match[1] == size:
+            if copy_end != match[0]:
+                copies += 1
+            copy_end = match[0] + size
+        else:
+            copy_end = None
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1] = (ranges[-1][0], offset + size)
+            else:
+                ranges.append((offset, offset + size))
+        offset += size
+    return DownloadPlan(size=offset, ranges=ranges, copies=copies)
+
+
+def platform_key(name: str) -> str:
+    """``xr-studio-1.0.1-win-x64.exe`` -> ``xr-studio-*-win-x64.exe``."""
+    return VERSION_RE.sub("*", name)
+
+
+def local_blockmap(value: str) -> tuple[str, tuple[list[str], list[int]]]:
+    if "=" not in value:
+        raise SavingsError(f"expected releases/<tag>.json or ASSET=BLOCKMAP: {value}")
+    asset_text, blockmap_text = value.split("=", 1)
+    asset = Path(asset_text).expanduser()
+    data = Path(blockmap_text).expanduser().read_bytes()
+    verify_blockmap(asset, data)
+    return asset.name, decode_blockmap(data)
+
+
+def remote_blockmaps(
+    relative: str, catalog: ReleaseCatalog, base_url: str
+) -> dict[str, tuple[str, tuple[list[str], list[int]]]]:
+    """Stream every updater package blockmap a manifest declares, by platform."""
+    if relative not in catalog.manifests:
+        raise SavingsError(f"release manifest not found: {relative}")
+    keys = {asset.tos_key for asset in catalog.assets if asset.manifest == relative}
+    blockmaps = {}
+    for key in sorted(keys):
+        name = PurePosixPath(key).name
+        if not name.lower().endswith(UPDATER_SUFFIXES) or f"{key}.blockmap" not in keys:
+            continue
+        url = base_url + quote(f"{key}.blockmap", safe="/")
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                blockmaps[platform_key(name)] = (name, read_blockmap(response))
+        except urllib.error.URLError as exc:
+            raise SavingsError(f"unable to fetch {url}: {exc}") from exc
+    return blockmaps
+
+
+def side(
+    value: str, catalog: ReleaseCatalog, base_url: str
+) -> dict[str, tuple[str, tuple[list[str], list[int]]]]:
+    if value.endswith(".json"):
+        relative = Path(value).resolve().relative_to(ROOT).as_posix()
+        return remote_blockmaps(relative, catalog, base_url)
+    name, blockmap = local_blockmap(value)
+    return {platform_key(name): (name, blockmap)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Report bytes and Range requests saved by differential updates"
+    )
+    parser.add_argument("old", help="releases/<tag>.json or OLD_ASSET=OLD_BLOCKMAP")
+    parser.add_argument("new", help="releases/<tag>.json or NEW_ASSET=NEW_BLOCKMAP")
+    parser.add_argument(
+        "--public-base-url",
+        default=os.environ.get("PUBLIC_RELEASE_BASE_URL", PUBLIC_DOWNLOAD_BASE_URL),
+    )
+    parser.add_argument(
+        "--min-savings",
+        type=float,
+        metavar="PERCENT",
+        help="fail when any platform saves less than PERCENT of its full download",
+    )
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args()
+
+    try:
+        catalog = ReleaseCatalog()
+        old = side(args.old, catalog, args.public_base_url)
+        new = side(args.new, catalog, args.public_base_url)
+        if len(old) == 1 and len(new) == 1 and old.keys() != new.keys():
+            # Two explicit pairs always describe the same platform.
+            old = {next(iter(new)): next(iter(old.values()))}
+        platforms = sorted(old.keys() & new.keys())
+        if not platforms:
+            raise SavingsError("no updater package with a blockmap on both sides")
+
+        report = []
+        for platform in platforms:
+            if chunked_here(old[platform][1][1]) != chunked_here(new[platform][1][1]):
+                print(
+                    f"warning: {old[platform][0]} and {new[platform][0]} were chunked "
+                    "differently (electron-builder or an older chunker); clients "
+                    "download the whole package once",
+                    file=sys.stderr,
+                )
+            plan = plan_download(old[platform][1], new[platform][1])
+            report.append(
+                {
+                    "platform": platform,
+                    "old": old[platform][0],
+                    "new": new[platform][0],
+                    "size": plan.size,
+                    "download": plan.download,
+                    "saved": plan.saved,
+                    "saved_percent": round(100 * plan.saved / max(plan.size, 1), 2),
+                    "range_requests": len(plan.ranges),
+                    "copied_runs": plan.copies,
+                }
+            )
+    except (BlockMapError, OSError, SavingsError, ValueError) as exc:
+        print(f"blockmap savings failed: {exc}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for row in report:
+            print(
+                f"{row['old']} -> {row['new']}: download "
+                f"{row['download'] / MEGABYTE:.1f} of {row['size'] / MEGABYTE:.1f} MB "
+                f"in {row['range_requests']} Range request(s), "
+                f"saved {row['saved'] / MEGABYTE:.1f} MB ({row['saved_percent']:.1f}%)"
+            )
+    if args.min_savings is not None:
+        low = [row["platform"] for row in report if row["saved_percent"] < args.min_savings]
+        if low:
+            print(
+                f"blockmap savings failed: below {args.min_savings:g}% for "
+                + ", ".join(low),
+                file=sys.stderr,
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
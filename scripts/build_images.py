@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""Build right-sized, content-hashed variants of the product logos.
+
+``data.json`` points every card at a full-size PNG (up to 1024 px) that the
+page shows in a 48 CSS px box. For each ``logoSrc`` this stage writes PNG
+variants fitted to that box at 1x and 2x density into
+``software/image/variants/`` under content-hashed names, and records them in
+``image-variants.json`` together with the source SHA256. Neither is committed:
+the Pages and metadata deployment workflows run this stage and then
+``prerender_index.py``, which uses the manifest for ``src``/``srcset``. A
+checkout without the manifest serves the original logos; with it,
+``validate_release.py`` fails when a logo has no variants or they were built
+from an older source.
+
+Images are decoded, resampled and encoded with the standard library only,
+so the output is byte-for-byte reproducible. Only the 8-bit RGB and RGBA
+PNGs the logos use are read. Encoded variants are cached by source SHA256
+and box size in ``~/.cache/xiaor-release/images`` (``XIAOR_IMAGE_CACHE``, kept
+between workflow runs by the Actions cache), and sources whose SHA256 still
+matches the manifest are not decoded at all.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+
+from release_catalog import ROOT, VARIANT_DIR, strip_fingerprint
+
+
+PIPELINE_VERSION = 1
+MANIFEST_NAME = "image-variants.json"
+# CSS size of .logo-area img in style.css.
+LOGO_SIZE = 48
+DENSITIES = (1, 2)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# PNG color type -> channels: truecolor (RGB) and truecolor with alpha (RGBA).
+CHANNELS = {2: 3, 6: 4}
+
+
+class ImageBuildError(RuntimeError):
+    pass
+
+
+def default_cache_dir() -> Path:
+    configured = os.environ.get("XIAOR_IMAGE_CACHE")
+    if configured:
+        return Path(configured).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "xiaor-release" / "images"
+
+
+def _paeth(left: int, up: int, corner: int) -> int:
+    estimate = left + up - corner
+    to_left, to_up, to_corner = abs(estimate - left), abs(estimate - up), abs(estimate - corner)
+    if to_left <= to_up and to_left <= to_corner:
+        return left
+    return up if to_up <= to_corner else corner
+
+
+def _unfilter(raw: bytes, height: int, stride: int, bpp: int) -> bytearray:
+    pixels = bytearray(height * stride)
+    previous = bytearray(stride)
+    offset = 0
+    for y in range(height):
+        kind = raw[offset]
+        line = bytearray(raw[offset + 1 : offset + 1 + stride])
+        offset += stride + 1
+        if kind == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif kind == 2:
+            line = bytearray((a + b) & 0xFF for a, b in zip(line, previous))
+        elif kind == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + previous[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                corner = previous[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + _paeth(left, previous[i], corner)) & 0xFF
+        elif kind:
+            raise ImageBuildError(f"unknown PNG filter {kind}")
+        pixels[y * stride : (y + 1) * stride] = line
+        previous = line
+    return pixels
+
+
+def read_png(data: bytes) -> tuple[int, int, bytearray]:
+    """Decode an 8-bit, non-interlaced RGB or RGBA PNG to ``(width, height, RGBA)``."""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ImageBuildError("not a PNG image")
+    offset = len(PNG_SIGNATURE)
+    header = None
+    idat = bytearray()
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack_from(">I4s", data, offset)
+        body = data[offset + 8 : offset + 8 + length]
+        offset += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"IDAT":
+            idat += body
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise ImageBuildError("PNG has no IHDR chunk")
+    width, height, depth, color, _, _, interlace = header
+    if depth != 8 or interlace or color not in CHANNELS:
+        raise ImageBuildError("only 8-bit non-interlaced RGB or RGBA PNGs are supported")
+    channels = CHANNELS[color]
+    try:
+        raw = zlib.decompress(bytes(idat))
+    except zlib.error as exc:
+        raise ImageBuildError(f"corrupt PNG data: {exc}") from exc
+    if len(raw) != height * (width * channels + 1):
+        raise ImageBuildError("PNG data does not match its dimensions")
+    pixels = _unfilter(raw, height, width * channels, channels)
+
+    if color == 6:
+        return width, height, pixels
+    rgba = bytearray(width * height * 4)
+    for channel in range(3):
+        rgba[channel::4] = pixels[channel::3]
+    rgba[3::4] = b"\xff" * (width * height)
+    return width, height, rgba
+
+
+def _bounds(source: int, target: int) -> list[tuple[int, int]]:
+    """Source index range averaged into each of ``target`` output pixels."""
+    bounds = []
+    for i in range(target):
+        start = i * source // target
+        bounds.append((start, max((i + 1) * source // target, start + 1)))
+    return bounds
+
+
+def resize(
+    width: int, height: int, rgba: bytearray, new_width: int, new_height: int
+) -> bytearray:
+    """Area-average downscale with premultiplied alpha, so edges do not darken."""
+    columns = _bounds(width, new_width)
+    rows = []
+    for y in range(height):
+        line = rgba[y * width * 4 : (y + 1) * width * 4]
+        alpha = line[3::4]
+        colors = [line[channel::4] for channel in range(3)]
+        sums = []
+        for x0, x1 in columns:
+            a = alpha[x0:x1]
+            sums.append(sum(a))
+            for channel in colors:
+                sums.append(sum(c * w for c, w in zip(channel[x0:x1], a)))
+        rows.append(sums)
+
+    output = bytearray(new_width * new_height * 4)
+    position = 0
+    for y0, y1 in _bounds(height, new_height):
+        total = [sum(values) for values in zip(*rows[y0:y1])]
+        for x, (x0, x1) in enumerate(columns):
+            a, r, g, b = total[x * 4 : x * 4 + 4]
+            area = (x1 - x0) * (y1 - y0)
+            if a:
+                output[position : position + 4] = bytes(
+                    [*(min(255, (c + a // 2) // a) for c in (r, g, b)), (a + area // 2) // area]
+                )
+            position += 4
+    return output
+
+
+def _chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def write_png(width: int, height: int, rgba: bytearray) -> bytes:
+    """Encode RGBA as PNG, dropping alpha when opaque; filters chosen per row."""
+    opaque = all(value == 255 for value in rgba[3::4])
+    channels = 3 if opaque else 4
+    if opaque:
+        pixels = bytearray(width * height * 3)
+        for channel in range(3):
+            pixels[channel::3] = rgba[channel::4]
+    else:
+        pixels = rgba
+    stride = width * channels
+    previous = bytes(stride)
+    raw = bytearray()
+    for y in range(height):
+        line = bytes(pixels[y * stride : (y + 1) * stride])
+        left = bytes(channels) + line[:-channels]
+        corner = bytes(channels) + previous[:-channels]
+        candidates = [
+            line,
+            bytes((c - l) & 0xFF for c, l in zip(line, left)),
+            bytes((c - u) & 0xFF for c, u in zip(line, previous)),
+            bytes((c - ((l + u) >> 1)) & 0xFF for c, l, u in zip(line, left, previous)),
+            bytes(
+                (c - _paeth(l, u, d)) & 0xFF for c, l, u, d in zip(line, left, previous, corner)
+            ),
+        ]
+        # Minimum sum of absolute signed differences, the usual PNG heuristic.
+        kind = min(
+            range(5), key=lambda k: sum(v if v < 128 else 256 - v for v in candidates[k])
+        )
+        raw.append(kind)
+        raw += candidates[kind]
+        previous = line
+    header = struct.pack(">IIBBBBB", width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _chunk(b"IHDR", header)
+        + _chunk(b"IDAT", zlib.compress(bytes(raw), 9))
+        + _chunk(b"IEND", b"")
+    )
+
+
+def fitted_size(width: int, height: int, box: int) -> tuple[int, int]:
+    scale = box / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def plan_variants(width: int, height: int) -> list[tuple[int, int, int]]:
+    """``(density, width, height)`` worth generating; never upscale."""
+    plan = []
+    for density in DENSITIES:
+        size = fitted_size(width, height, LOGO_SIZE * density)
+        if size[0] < width:
+            plan.append((density, *size))
+    return plan
+
+
+def logo_sources(data: list) -> list[str]:
+    """Repository paths of every distinct local ``logoSrc``, in ``data.json`` order."""
+    sources = []
+    for entry in data:
+        value = entry.get("logoSrc") if isinstance(entry, dict) else None
+        # Logos hosted elsewhere are served as they are.
+        if isinstance(value, str) and value and not value.startswith(("http:", "https:", "//")):
+            path = strip_fingerprint(value).removeprefix("./")
+            if path not in sources:
+                sources.append(path)
+    return sources
+
+
+def variant_name(source: str, width: int, height: int, payload: bytes) -> str:
+    stem = Path(source).stem
+    digest = hashlib.sha256(payload).hexdigest()[:12]
+    return f"{VARIANT_DIR}/{stem}.{width}x{height}.{digest}.png"
+
+
+def read_manifest(root: Path = ROOT) -> dict:
+    path = root / MANIFEST_NAME
+    if not path.exists():
+        return {"version": PIPELINE_VERSION, "images": {}}
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError as exc:
+        raise ImageBuildError(f"invalid {MANIFEST_NAME}: {exc}") from exc
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("images"), dict):
+        raise ImageBuildError(f"invalid {MANIFEST_NAME}: expected an images object")
+    return manifest
+
+
+def check_entry(source: str, entry, root: Path = ROOT) -> list[str]:
+    """Problems with one manifest entry against the checked-out files."""
+    path = root / source
+    if not path.is_file():
+        return [f"{source}: logo file is missing"]
+    if not isinstance(entry, dict):
+        return [f"{source}: no image variants; run python3 scripts/build_images.py"]
+    if entry.get("sha256") != hashlib.sha256(path.read_bytes()).hexdigest():
+        return [f"{source}: image variants are stale; run python3 scripts/build_images.py"]
+    try:
+        planned = plan_variants(entry["width"], entry["height"])
+        built = [(item["density"], item["width"], item["height"]) for item in entry["variants"]]
+    except (KeyError, TypeError):
+        return [f"{source}: malformed {MANIFEST_NAME} entry"]
+    if built != planned:
+        return [f"{source}: image variants do not match the current sizes"]
+    problems = []
+    for item in entry["variants"]:
+        variant = root / str(item.get("path"))
+        if not variant.is_file():
+            problems.append(f"{source}: variant {item.get('path')} is missing")
+            continue
+        digest = hashlib.sha256(variant.read_bytes()).hexdigest()
+        if digest != item.get("sha256") or f".{digest[:12]}." not in variant.name:
+            problems.append(f"{source}: variant {item.get('path')} does not match its hash")
+    return problems
+
+
+def check_variants(data: list, root: Path = ROOT) -> list[str]:
+    # Variants are built at deploy time; without them the page keeps the originals.
+    if not (root / MANIFEST_NAME).exists():
+        return []
+    try:
+        images = read_manifest(root)["images"]
+    except ImageBuildError as exc:
+        return [str(exc)]
+    problems = []
+    for source in logo_sources(data):
+        problems += check_entry(source, images.get(source), root)
+    return problems
+
+
+def srcset(images: dict, logo_src: str) -> tuple[str, str | None]:
+    """``(src, srcset)`` for a ``logoSrc``; the original stays the fallback."""
+    source = strip_fingerprint(logo_src).removeprefix("./")
+    entry = images.get(source)
+    if not isinstance(entry, dict) or not entry.get("variants"):
+        return logo_src, None
+    prefix = "./" if logo_src.startswith("./") else ""
+    candidates = [(item["density"], prefix + item["path"]) for item in entry["variants"]]
+    if all(density != max(DENSITIES) for density, _ in candidates):
+        candidates.append((max(DENSITIES), logo_src))
+    return candidates[0][1], ", ".join(f"{path} {density}x" for density, path in candidates)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as handle:
+        handle.write(data)
+    os.chmod(handle.name, 0o644)
+    os.replace(handle.name, path)
+
+
+def build_variants(source: str, root: Path, cache: Path | None) -> tuple[dict, str]:
+    """Manifest entry for one logo, from the cache or by resampling it."""
+    data = (root / source).read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    key = f"{digest}.v{PIPELINE_VERSION}.{LOGO_SIZE}"
+    cached = cache / f"{key}.json" if cache else None
+    if cached and cached.is_file():
+        try:
+            entry = json.loads(cached.read_text(encoding="utf-8"))
+            for item in entry["variants"]:
+                payload = (cache / Path(item["path"]).name).read_bytes()
+                if hashlib.sha256(payload).hexdigest() != item["sha256"]:
+                    raise ValueError("cached variant changed")
+                _write_atomic(root / item["path"], payload)
+            return entry, "cached"
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    try:
+        width, height, rgba = read_png(data)
+    except ImageBuildError as exc:
+        raise ImageBuildError(f"{source}: {exc}") from exc
+    variants = []
+    for density, new_width, new_height in plan_variants(width, height):
+        resized = resize(width, height, rgba, new_width, new_height)
+        payload = write_png(new_width, new_height, resized)
+        path = variant_name(source, new_width, new_height, payload)
+        _write_atomic(root / path, payload)
+        if cache:
+            _write_atomic(cache / Path(path).name, payload)
+        variants.append(
+            {
+                "density": density,
+                "width": new_width,
+                "height": new_height,
+                "path": path,
+                "sha256": hashlib.sha256(payload).hexdigest(),
+                "size": len(payload),
+            }
+        )
+    entry = {"sha256": digest, "width": width, "height": height, "variants": variants}
+    if cached:
+        _write_atomic(cached, json.dumps(entry, sort_keys=True).encode())
+    return entry, "built"
+
+
+def build(root: Path = ROOT, cache: Path | None = None) -> list[tuple[str, str, dict]]:
+    data = json.loads((root / "data.json").read_text(encoding="utf-8-sig"))
+    if not isinstance(data, list):
+        raise ImageBuildError("data.json must contain a top-level list")
+    previous = read_manifest(root)["images"]
+    images = {}
+    report = []
+    for source in logo_sources(data):
+        entry = previous.get(source)
+        if check_entry(source, entry, root):
+            entry, action = build_variants(source, root, cache)
+        else:
+            action = "up to date"
+        images[source] = entry
+        report.append((source, action, entry))
+
+    keep = {item["path"] for entry in images.values() for item in entry["variants"]}
+    variant_dir = root / VARIANT_DIR
+    if variant_dir.is_dir():
+        for path in sorted(variant_dir.iterdir()):
+            if path.relative_to(root).as_posix() not in keep:
+                path.unlink()
+    manifest = {"version": PIPELINE_VERSION, "images": images}
+    _write_atomic(
+        root / MANIFEST_NAME,
+        (json.dumps(manifest, indent=2, sort_keys=True, ensure_ascii=False) + "\n").encode(),
+    )
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--check", action="store_true", help="verify the variants instead of building them"
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=default_cache_dir(),
+        metavar="DIR",
+        help="encoded variant cache (default: ~/.cache/xiaor-release/images)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="always resample")
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            data = json.loads((ROOT / "data.json").read_text(encoding="utf-8-sig"))
+            problems = check_variants(data)
+            if problems:
+                raise ImageBuildError("\n  ".join(["image variants are invalid:", *problems]))
+            if (ROOT / MANIFEST_NAME).exists():
+                print("image variants are up to date")
+            else:
+                print(f"no {MANIFEST_NAME}; the page uses the original logos")
+            return 0
+        for source, action, entry in build(cache=None if args.no_cache else args.cache):
+            original = (ROOT / source).stat().st_size
+            sizes = ", ".join(
+                f"{item['width']}x{item['height']} {item['size'] / 1024:.1f} KB"
+                for item in entry["variants"]
+            )
+            print(f"{source} ({original / 1024:.1f} KB): {sizes or 'already small'} [{action}]")
+    except (ImageBuildError, OSError, ValueError) as exc:
+        print(f"image build failed: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Build canonical, gzip-encoded copies of the download center's web metadata.
+
+TOS serves objects exactly as stored, so the encoded variant is uploaded
+under the original key with ``Content-Encoding: gzip``. Only files fetched by
+browsers are encoded: updater YAMLs are read by devices and electron-updater,
+which do not decode ``Content-Encoding``. ``data.json`` is also minified;
+HTML and CSS keep their bytes so inline scripts and hashes stay intact.
+
+``data.json`` is additionally split for lazy loading: ``data/index.json``
+carries what a card header needs, per-platform shards carry the download
+buttons, and per-product shards carry ``oldVersion`` and ``tools`` for the
+history and tools dialogs. Shard names contain a content hash, so they are
+cached as immutable; only the index is revalidated.
+
+``update/software.yaml`` is compiled into one small JSON document per app,
+``update/apps/<platform>/<app>.json``, and ``update/index.json`` listing the
+version, path and ETag of each, so an update check downloads its own entry
+with a conditional request instead of the whole YAML. Devices read these,
+so they are uploaded without ``Content-Encoding``.
+
+The build directory holds ``plain/<key>`` (the canonical bytes clients
+receive after decoding), ``gzip/<key>`` (what is uploaded for encoded files)
+and ``metadata-build.json`` describing both.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+from release_catalog import ROOT, catalog_objects
+
+
+BUILD_VERSION = 3
+SHARD_VERSION = 1
+UPDATE_INDEX_VERSION = 1
+INDEX_NAME = "metadata-build.json"
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+ENCODED_FILES = {
+    "data.json": JSON_CONTENT_TYPE,
+    "index.html": "text/html; charset=utf-8",
+    "style.css": "text/css; charset=utf-8",
+}
+REVALIDATE_CACHE_CONTROL = "no-cache,max-age=0"
+IMMUTABLE_CACHE_CONTROL = "public,max-age=31536000,immutable"
+CATALOG_INDEX = "data/index.json"
+INDEX_FIELDS = ("name", "desc", "logoSrc", "version", "platform", "platformVersions")
+DETAIL_FIELDS = ("oldVersion", "tools")
+SHARD_PLATFORMS = ("android", "windows", "ios", "mac")
+UPDATE_SOURCE = "update/software.yaml"
+UPDATE_INDEX = "update/index.json"
+UPDATE_LINE_RE = re.compile(r"(?P<key>[A-Za-z0-9_.-]+):(?:\s+(?P<value>.*))?")
+APP_ID_RE = re.compile(r"[A-Za-z0-9_.-]+(?:/[A-Za-z0-9_.-]+)?")
+
+
+class MetadataBuildError(RuntimeError):
+    pass
+
+
+def compact_json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def canonical_bytes(relative: str, data: bytes) -> bytes:
+    if relative.endswith(".json"):
+        return compact_json(parse_json(relative, data))
+    return data
+
+
+def parse_json(relative: str, data: bytes):
+    try:
+        return json.loads(data.decode("utf-8-sig"))
+    except ValueError as exc:
+        raise MetadataBuildError(f"invalid {relative}: {exc}") from exc
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    # A fixed mtime and no file name keep rebuilds byte-identical.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as handle:
+        handle.write(data)
+    os.replace(handle.name, path)
+
+
+def _hashed_name(stem: str, payload: bytes) -> str:
+    return f"data/{stem}.{hashlib.sha256(payload).hexdigest()[:12]}.json"
+
+
+def _product_slug(entry: dict, number: int) -> str:
+    name = entry.get("name")
+    english = name.get("en") if isinstance(name, dict) else None
+    slug = re.sub(r"[^a-z0-9]+", "-", str(english or "").lower()).strip("-")
+    return slug or f"entry-{number}"
+
+
+def shard_catalog(data: list) -> dict[str, bytes]:
+    """Split ``data.json`` into the lazy-loading index and its shards."""
+    if not isinstance(data, list):
+        raise MetadataBuildError("data.json must contain a top-level list")
+    index_entries = []
+    platforms: dict[str, list[dict]] = {}
+    products: dict[str, list[dict]] = {}
+    for number, entry in enumerate(data):
+        if not isinstance(entry, dict):
+            raise MetadataBuildError("every data.json entry must be an object")
+        platform = entry.get("platform")
+        shard = platform if platform in SHARD_PLATFORMS else "other"
+        index_entries.append(
+            {
+                "id": number,
+                "shard": shard,
+                "fields": {key: value for key, value in entry.items() if key in INDEX_FIELDS},
+            }
+        )
+        record = {
+            "id": number,
+            "fields": {
+                key: value
+                for key, value in entry.items()
+                if key not in INDEX_FIELDS and key not in DETAIL_FIELDS
+            },
+        }
+        details = {key: value for key, value in entry.items() if key in DETAIL_FIELDS}
+        if details:
+            slug = _product_slug(entry, number)
+            products.setdefault(slug, []).append({"id": number, "fields": details})
+            record["details"] = {
+                "product": slug,
+                "history": len(details.get("oldVersion") or []),
+                "tools": len(details.get("tools") or []),
+            }
+        platforms.setdefault(shard, []).append(record)
+
+    files: dict[str, bytes] = {}
+    product_paths = {}
+    for slug, entries in products.items():
+        payload = compact_json({"version": SHARD_VERSION, "entries": entries})
+        product_paths[slug] = _hashed_name(f"product-{slug}", payload)
+        files[product_paths[slug]] = payload
+    platform_paths = {}
+    for shard, records in platforms.items():
+        for record in records:
+            if "details" in record:
+                record["details"]["path"] = product_paths[record["details"].pop("product")]
+        payload = compact_json({"version": SHARD_VERSION, "entries": records})
+        platform_paths[shard] = _hashed_name(f"platform-{shard}", payload)
+        files[platform_paths[shard]] = payload
+    files[CATALOG_INDEX] = compact_json(
+        {"version": SHARD_VERSION, "platforms": platform_paths, "entries": index_entries}
+    )
+    return files
+
+
+def reconstruct_catalog(files: dict[str, object]) -> list[dict]:
+    """Reassemble ``data.json`` entries from a parsed index and its shards."""
+    try:
+        index = files[CATALOG_INDEX]
+        entries = [dict(entry["fields"]) for entry in index["entries"]]
+        if [entry["id"] for entry in index["entries"]] != list(range(len(entries))):
+            raise MetadataBuildError(f"{CATALOG_INDEX} entry ids are not sequential")
+        products = set()
+        for path in index["platforms"].values():
+            for record in files[path]["entries"]:
+                entries[record["id"]].update(record["fields"])
+                if "details" in record:
+                    products.add(record["details"]["path"])
+        for path in sorted(products):
+            for record in files[path]["entries"]:
+                entries[record["id"]].update(record["fields"])
+    except (IndexError, KeyError, TypeError) as exc:
+        raise MetadataBuildError(f"catalog shards are inconsistent: {exc!r}") from exc
+    return entries
+
+
+def _update_scalar(value: str):
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    if value in ("true", "false"):
+        return value == "true"
+    # Versions stay strings, as clients compare them, not numbers.
+    return value
+
+
+def parse_update_yaml(text: str) -> dict:
+    """Nested mappings of ``update/software.yaml``; anything else is rejected."""
+    root: dict = {}
+    stack: list[tuple[int, dict]] = [(-1, root)]
+    for number, line in enumerate(text.splitlines(), 1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        depth = len(line) - len(line.lstrip(" "))
+        match = UPDATE_LINE_RE.fullmatch(stripped)
+        if not match or line[depth] == "\t":
+            raise MetadataBuildError(f"{UPDATE_SOURCE} line {number}: unsupported YAML")
+        while depth <= stack[-1][0]:
+            stack.pop()
+        parent = stack[-1][1]
+        key, value = match["key"], match["value"]
+        if key in parent:
+            raise MetadataBuildError(f"{UPDATE_SOURCE} line {number}: duplicate key {key}")
+        if value:
+            parent[key] = _update_scalar(value.strip())
+        else:
+            parent[key] = {}
+            stack.append((depth, parent[key]))
+    return root
+
+
+def update_apps(text: str) -> dict[str, dict]:
+    """``platform/app`` (or a top-level app's own key) -> its YAML fields."""
+    apps = {}
+    for group, value in parse_update_yaml(text).items():
+        if not isinstance(value, dict):
+            raise MetadataBuildError(f"{UPDATE_SOURCE}: {group} must be a mapping")
+        members = [(group, value)] if "url" in value else [
+            (f"{group}/{name}", fields) for name, fields in value.items()
+        ]
+        for app_id, fields in members:
+            if not isinstance(fields, dict) or not isinstance(fields.get("url"), str):
+                raise MetadataBuildError(f"{UPDATE_SOURCE}: {app_id} has no url")
+            if not APP_ID_RE.fullmatch(app_id):
+                raise MetadataBuildError(f"{UPDATE_SOURCE}: unsupported app id {app_id}")
+            apps[app_id] = fields
+    return apps
+
+
+def compile_updates(text: str) -> dict[str, bytes]:
+    """Per-app update documents plus ``update/index.json``."""
+    files: dict[str, bytes] = {}
+    index = {}
+    for app_id, fields in update_apps(text).items():
+        path = f"update/apps/{app_id}.json"
+        files[path] = compact_json({"id": app_id, **fields})
+        index[app_id] = {
+            "version": fields.get("version"),
+            "path": path,
+            # TOS returns the MD5 of a single-part upload as the ETag, so a
+            # client can tell from the index whether its cached copy is current.
+            "etag": f'"{hashlib.md5(files[path], usedforsecurity=False).hexdigest()}"',
+        }
+    files[UPDATE_INDEX] = compact_json({"version": UPDATE_INDEX_VERSION, "apps": index})
+    return files
+
+
+def reconstruct_updates(files: dict[str, object]) -> dict[str, dict]:
+    """``update_apps()`` of the source, reassembled from parsed update documents."""
+    try:
+        apps = {}
+        for app_id, item in files[UPDATE_INDEX]["apps"].items():
+            document = dict(files[item["path"]])
+            if document.pop("id") != app_id or document.get("version") != item["version"]:
+                raise MetadataBuildError(f"{item['path']} does not match {UPDATE_INDEX}")
+            apps[app_id] = document
+    except (KeyError, TypeError) as exc:
+        raise MetadataBuildError(f"update documents are inconsistent: {exc!r}") from exc
+    return apps
+
+
+def build_files(root: Path = ROOT) -> list[tuple[str, str, str, bytes, bool]]:
+    """``(key, content type, cache control, plain bytes, gzip)`` for every built file."""
+    files = []
+    for relative, content_type in sorted(ENCODED_FILES.items()):
+        plain = canonical_bytes(relative, (root / relative).read_bytes())
+        files.append((relative, content_type, REVALIDATE_CACHE_CONTROL, plain, True))
+    data = parse_json("data.json", (root / "data.json").read_bytes())
+    for key, plain in sorted(shard_catalog(data).items()):
+        cache_control = (
+            REVALIDATE_CACHE_CONTROL if key == CATALOG_INDEX else IMMUTABLE_CACHE_CONTROL
+        )
+        files.append((key, JSON_CONTENT_TYPE, cache_control, plain, True))
+    updates = compile_updates((root / UPDATE_SOURCE).read_bytes().decode("utf-8-sig"))
+    for key, plain in sorted(updates.items()):
+        files.append((key, JSON_CONTENT_TYPE, REVALIDATE_CACHE_CONTROL, plain, False))
+    return files
+
+
+def build(output: Path, root: Path = ROOT) -> list[dict]:
+    entries = []
+    for key, content_type, cache_control, plain, encode in build_files(root):
+        write_atomic(output / "plain" / key, plain)
+        entry = {
+            "key": key,
+            "content_type": content_type,
+            "content_encoding": "identity",
+            "cache_control": cache_control,
+            "plain_sha256": hashlib.sha256(plain).hexdigest(),
+            "plain_size": len(plain),
+            "encoded_size": len(plain),
+        }
+        if encode:
+            encoded = gzip_bytes(plain)
+            write_atomic(output / "gzip" / key, encoded)
+            entry.update(content_encoding="gzip", encoded_size=len(encoded))
+        entries.append(entry)
+    write_atomic(
+        output / INDEX_NAME,
+        (
+            json.dumps({"version": BUILD_VERSION, "files": entries}, indent=2, sort_keys=True)
+            + "\n"
+        ).encode(),
+    )
+    return entries
+
+
+def check_build(output: Path, root: Path = ROOT) -> list[str]:
+    """Return problems with a build directory.
+
+    Every variant must decode to the canonical form of its source, the shards
+    must reassemble ``data.json`` exactly and expose the same TOS objects, and
+    the update documents must reassemble ``update/software.yaml``.
+    """
+    try:
+        index = json.loads((output / INDEX_NAME).read_text(encoding="utf-8"))
+        expected = {key: rest for key, *rest in build_files(root)}
+    except (OSError, ValueError, MetadataBuildError) as exc:
+        return [f"unreadable metadata build: {exc}"]
+    if not isinstance(index, dict) or index.get("version") != BUILD_VERSION:
+        return [f"unsupported {INDEX_NAME} version"]
+    problems = []
+    built = {entry.get("key"): entry for entry in index.get("files", [])}
+    if set(built) != set(expected):
+        problems.append(
+            "metadata build does not cover exactly: " + ", ".join(sorted(expected))
+        )
+    shards: dict[str, object] = {}
+    updates: dict[str, object] = {}
+    for key in sorted(set(built) & set(expected)):
+        content_type, cache_control, canonical, encode = expected[key]
+        entry = built[key]
+        try:
+            plain = (output / "plain" / key).read_bytes()
+            decoded = gzip.decompress((output / "gzip" / key).read_bytes()) if encode else plain
+        except (OSError, EOFError, gzip.BadGzipFile) as exc:
+            problems.append(f"{key}: {exc}")
+            continue
+        if plain != canonical or decoded != canonical:
+            problems.append(f"{key}: built variant does not match its source")
+        elif (
+            entry.get("content_type") != content_type
+            or entry.get("content_encoding") != ("gzip" if encode else "identity")
+            or entry.get("cache_control") != cache_control
+            or entry.get("plain_sha256") != hashlib.sha256(canonical).hexdigest()
+        ):
+            problems.append(f"{key}: {INDEX_NAME} entry is stale")
+        if not encode and (output / "gzip" / key).exists():
+            problems.append(f"{key}: update documents must not be gzip-encoded")
+        if decoded != canonical:
+            continue
+        if key.startswith("data/"):
+            shards[key] = json.loads(decoded)
+        elif key.startswith("update/"):
+            updates[key] = json.loads(decoded)
+
+    if CATALOG_INDEX in shards:
+        source = parse_json("data.json", (root / "data.json").read_bytes())
+        try:
+            rebuilt = reconstruct_catalog(shards)
+        except MetadataBuildError as exc:
+            problems.append(str(exc))
+        else:
+            if rebuilt != source:
+                problems.append("catalog shards do not reconstruct data.json")
+            elif catalog_objects(rebuilt) != catalog_objects(source):
+                problems.append("catalog shards do not reference the data.json TOS objects")
+
+    if UPDATE_INDEX in updates:
+        source = (root / UPDATE_SOURCE).read_bytes().decode("utf-8-sig")
+        try:
+            if reconstruct_updates(updates) != update_apps(source):
+                problems.append(f"update documents do not reconstruct {UPDATE_SOURCE}")
+        except MetadataBuildError as exc:
+            problems.append(str(exc))
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", type=Path, help="build directory, outside Git")
+    parser.add_argument(
+        "--check", action="store_true", help="verify an existing build instead of writing one"
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            problems = check_build(args.output)
+            if problems:
+                raise MetadataBuildError("\n  ".join(["metadata build is invalid:", *problems]))
+            print(f"verified metadata build: {args.output}")
+            return 0
+        for entry in build(args.output):
+            encoding = "gzip" if entry["content_encoding"] == "gzip" else "unencoded"
+            print(
+                f"{entry['key']}: {entry['plain_size']} bytes, "
+                f"{entry['encoded_size']} {encoding} ({entry['cache_control']})"
+            )
+    except (MetadataBuildError, OSError, ValueError) as exc:
+        print(f"metadata build failed: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
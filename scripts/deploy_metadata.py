@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""Deploy allowlisted metadata to TOS by content hash instead of Git history.
+
+The bucket keeps ``deploy/metadata-state.json``: for every deployed key the
+SHA256 of what clients receive after decoding, plus its Cache-Control,
+Content-Type and Content-Encoding. Planning hashes the allowlisted tracked
+files and the ``build_metadata.py`` output and selects every key whose record
+differs from that state, so a skipped or failed run is caught up by the next
+one. Applying uploads the selected keys concurrently within each stage, in
+the order assets, entrypoints, ``update/index.json``, ``data.json``,
+``data/index.json``, and then replaces the state object with ``If-Match`` on
+the ETag that was planned against. A concurrent deployment therefore fails
+instead of overwriting newer state, and a failed run leaves the old state.
+
+Static assets are published twice: under their source key with a short
+cache, and as the fingerprinted copy ``<stem>.<sha256[:12]><suffix>`` that
+pages reference, cached as immutable (see ``fingerprint_assets.py``).
+
+Logo variants are not tracked; the workflow builds them with
+``build_images.py`` first and they are published from ``image-variants.json``.
+
+Deployment never deletes: a tracked file that disappeared fails the plan
+until its object is removed from the bucket by the separate maintenance
+process. Generated shards and logo variants that are no longer built and
+fingerprinted copies of an older asset version stay in the bucket and simply
+drop out of the state.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import timings
+from build_images import ImageBuildError, read_manifest
+from build_metadata import (
+    CATALOG_INDEX,
+    IMMUTABLE_CACHE_CONTROL,
+    INDEX_NAME,
+    REVALIDATE_CACHE_CONTROL,
+    UPDATE_INDEX,
+    UPDATE_SOURCE,
+)
+from fingerprint_assets import STATIC_ASSET_DIRS, is_fingerprinted, published_assets
+from release_catalog import ELECTRON_UPDATER_FILES, PLAIN_UPDATER_FILES, ROOT, VARIANT_DIR
+from tos_store import ObjectStoreError, open_store
+from validate_release import tracked_files
+
+
+STATE_KEY = "deploy/metadata-state.json"
+STATE_VERSION = 1
+PLAN_VERSION = 1
+# Tracked files the deployment may publish; everything else stays in Git.
+ALLOWLIST = (
+    "data.json",
+    "index.html",
+    "logo.png",
+    "style.css",
+    *PLAIN_UPDATER_FILES,
+    *ELECTRON_UPDATER_FILES,
+    *(f"{directory}/*" for directory in STATIC_ASSET_DIRS),
+    "docs/*.html",
+)
+ENTRYPOINTS = ("index.html", *PLAIN_UPDATER_FILES, *ELECTRON_UPDATER_FILES)
+# Keys produced by build_metadata.py that may disappear from one build to the next.
+GENERATED_PREFIXES = ("data/", "update/apps/", f"{VARIANT_DIR}/")
+STAGES = ("assets", "entrypoints", "update-index", "data", "catalog-index")
+CONTENT_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+    ".json": "application/json; charset=utf-8",
+    ".yml": "text/yaml; charset=utf-8",
+    ".yaml": "text/yaml; charset=utf-8",
+}
+DEFAULT_CACHE_CONTROL = "public,max-age=3600"
+RECORD_FIELDS = ("sha256", "content_type", "cache_control", "content_encoding")
+
+
+class DeployError(RuntimeError):
+    pass
+
+
+def stage_of(key: str) -> str:
+    if key == "data.json":
+        return "data"
+    if key == CATALOG_INDEX:
+        return "catalog-index"
+    if key == UPDATE_INDEX:
+        return "update-index"
+    if key in ENTRYPOINTS or key.startswith("update/apps/"):
+        return "entrypoints"
+    return "assets"
+
+
+def content_type(key: str) -> str:
+    suffix = Path(key).suffix.lower()
+    return (
+        CONTENT_TYPES.get(suffix) or mimetypes.guess_type(key)[0] or "application/octet-stream"
+    )
+
+
+def cache_control(key: str) -> str:
+    # Only a fingerprinted name changes with the content; source keys may be
+    # linked from outside the pages and must pick up a replaced file.
+    if is_fingerprinted(key):
+        return IMMUTABLE_CACHE_CONTROL
+    if Path(key).suffix.lower() in CONTENT_TYPES:
+        return REVALIDATE_CACHE_CONTROL
+    return DEFAULT_CACHE_CONTROL
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_files(build: Path, root: Path = ROOT) -> dict[str, dict]:
+    """Key -> upload source and state record for everything that should be live."""
+    try:
+        index = json.loads((build / INDEX_NAME).read_text(encoding="utf-8"))
+        entries = index["files"]
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        raise DeployError(f"unreadable metadata build {build}: {exc}") from exc
+    files: dict[str, dict] = {}
+    for entry in entries:
+        key = entry["key"]
+        encoded = entry["content_encoding"] == "gzip"
+        files[key] = {
+            "source": str(build / ("gzip" if encoded else "plain") / key),
+            "sha256": entry["plain_sha256"],
+            "content_type": entry["content_type"],
+            "cache_control": entry["cache_control"],
+            "content_encoding": "gzip" if encoded else None,
+        }
+    images = read_manifest(root)["images"]
+    variants = [item["path"] for entry in images.values() for item in entry["variants"]]
+    with timings.phase("hash_files") as phase:
+        for relative in [*tracked_files(root), *variants]:
+            if relative in files or not any(
+                fnmatch.fnmatchcase(relative, pattern) for pattern in ALLOWLIST
+            ):
+                continue
+            path = root / relative
+            phase.bytes += path.stat().st_size
+            files[relative] = {
+                "source": str(path),
+                "sha256": sha256_file(path),
+                "content_type": content_type(relative),
+                "cache_control": cache_control(relative),
+                "content_encoding": None,
+            }
+    for key, relative in published_assets(root).items():
+        if relative in files:
+            files[key] = {**files[relative], "cache_control": cache_control(key)}
+    missing = [key for key in ("data.json", UPDATE_SOURCE) if key not in files]
+    if missing:
+        raise DeployError("deployment is missing required metadata: " + ", ".join(missing))
+    return dict(sorted(files.items()))
+
+
+def record(item: dict) -> dict:
+    return {field: item[field] for field in RECORD_FIELDS}
+
+
+def read_state(store) -> tuple[dict[str, dict], str | None]:
+    """Deployed records and the ETag they were read at; empty before the first run."""
+    info = store.head(STATE_KEY)
+    if info is None:
+        return {}, None
+    data = b"".join(store.read(STATE_KEY, etag=info.etag))
+    try:
+        state = json.loads(data)
+    except ValueError as exc:
+        raise DeployError(f"invalid {STATE_KEY}: {exc}") from exc
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+        raise DeployError(f"unsupported {STATE_KEY} version")
+    return state.get("files") or {}, info.etag
+
+
+def plan(store, build: Path, full: bool = False, root: Path = ROOT) -> dict:
+    local = local_files(build, root)
+    deployed, etag = read_state(store)
+    removed = [
+        key
+        for key in sorted(set(deployed) - set(local))
+        if not key.startswith(GENERATED_PREFIXES)
+        and not is_fingerprinted(key)
+        and store.head(key) is not None
+    ]
+    if removed:
+        raise DeployError(
+            "TOS deletion/rename is forbidden in deployment; remove these objects "
+            "through TOS maintenance first:\n  " + "\n  ".join(removed)
+        )
+    stages = {name: [] for name in STAGES}
+    for key, item in local.items():
+        if full or deployed.get(key) != record(item):
+            stages[stage_of(key)].append({"key": key, **item})
+    return {
+        "version": PLAN_VERSION,
+        "state_etag": etag,
+        "stages": [{"name": name, "files": files} for name, files in stages.items()],
+        "state": {key: record(item) for key, item in local.items()},
+    }
+
+
+def upload(store, item: dict) -> int:
+    """Upload one planned file and return its size in bytes."""
+    data = Path(item["source"]).read_bytes()
+    timings.count("http_requests")
+    store.replace(
+        item["key"],
+        data,
+        item["content_type"],
+        item["cache_control"],
+        content_encoding=item["content_encoding"],
+    )
+    return len(data)
+
+
+def apply(store, plan_data: dict, jobs: int) -> int:
+    """Upload every planned file stage by stage, then record the new state."""
+    current = store.head(STATE_KEY)
+    if (current.etag if current else None) != plan_data["state_etag"]:
+        raise DeployError(f"{STATE_KEY} changed since the plan was made; plan again")
+    uploaded = 0
+    for stage in plan_data["stages"]:
+        if not stage["files"]:
+            continue
+        # One phase per stage: wall time, not the sum over concurrent workers.
+        with timings.phase("upload") as phase, ThreadPoolExecutor(
+            max_workers=max(1, jobs)
+        ) as pool:
+            # sum() re-raises the first failure before the next stage starts.
+            phase.bytes += sum(pool.map(lambda item: upload(store, item), stage["files"]))
+        uploaded += len(stage["files"])
+        print(f"{stage['name']}: uploaded {len(stage['files'])} file(s)")
+    state = json.dumps(
+        {"version": STATE_VERSION, "files": plan_data["state"]}, indent=2, sort_keys=True
+    )
+    timings.count("http_requests")
+    with timings.phase("write_state"):
+        store.replace(
+            STATE_KEY,
+            (state + "\n").encode(),
+            CONTENT_TYPES[".json"],
+            "no-store",
+            if_match=plan_data["state_etag"],
+            if_absent=plan_data["state_etag"] is None,
+        )
+    return uploaded
+
+
+def write_plan(path: Path, plan_data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, delete=False
+    ) as handle:
+        json.dump(plan_data, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+    os.replace(handle.name, path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--build", type=Path, metavar="DIR", help="build_metadata.py output to plan from"
+    )
+    parser.add_argument(
+        "--plan-out", type=Path, metavar="FILE", help="write the plan to FILE for --apply"
+    )
+    parser.add_argument(
+        "--apply", type=Path, metavar="FILE", help="upload a plan written by --plan-out"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="plan every file regardless of the deployed state"
+    )
+    parser.add_argument("--jobs", type=int, default=8, help="concurrent uploads per stage")
+    timings.add_timings_argument(parser)
+    args = parser.parse_args()
+    if bool(args.apply) == bool(args.build):
+        parser.error("pass either --build DIR to plan or --apply FILE")
+
+    status = "failed"
+    try:
+        store = open_store()
+        if args.apply:
+            plan_data = json.loads(args.apply.read_text(encoding="utf-8"))
+            if plan_data.get("version") != PLAN_VERSION:
+                raise DeployError(f"unsupported plan version in {args.apply}")
+            uploaded = apply(store, plan_data, args.jobs)
+            recorded = len(plan_data["state"])
+            print(f"deployed {uploaded} file(s); recorded {recorded} in {STATE_KEY}")
+        else:
+            with timings.phase("plan"):
+                plan_data = plan(store, args.build, args.full)
+            if args.plan_out:
+                write_plan(args.plan_out, plan_data)
+            for stage in plan_data["stages"]:
+                for item in stage["files"]:
+                    print(f"{stage['name']}\t{item['key']}")
+            count = sum(len(stage["files"]) for stage in plan_data["stages"])
+            print(f"metadata plan: {count} of {len(plan_data['state'])} file(s) changed")
+        status = "ok"
+    except (DeployError, ImageBuildError, ObjectStoreError, OSError, ValueError) as exc:
+        print(f"metadata deployment failed: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        if args.timings_json:
+            timings.write_report(args.timings_json, "deploy_metadata", status)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Fingerprint static asset references with their content digest.
+
+Every file under ``software/image/``, ``software/ios/`` and ``docs/assets/``
+plus ``logo.png`` and ``style.css`` gets the first 12 characters of its
+SHA256. References to them in ``data.json``, ``index.html`` and
+``docs/*.html`` are rewritten to ``<stem>.<digest><suffix>``, so a changed
+image gets a new object name. The digest is part of the name rather than a
+``?v=`` query because a CDN or the TOS edge may ignore query strings when
+caching; only the fingerprinted copies are published as immutable, and the
+source keys keep a short cache. Git tracks the source files only:
+``deploy_metadata.py`` uploads the fingerprinted copies and ``--export DIR``
+writes them for the Pages site. The logo variants from ``build_images.py``
+already carry their digest in the file name and are left alone.
+``validate_release.py`` rejects any missing or stale fingerprint; run
+``prerender_index.py`` afterwards when ``data.json`` changed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from release_catalog import (
+    ROOT,
+    STATIC_ASSET_DIRS,
+    STATIC_ASSET_FILES,
+    is_static_asset,
+    strip_fingerprint,
+)
+
+
+REFERENCING_FILES = ("data.json", "index.html")
+REFERENCING_GLOBS = ("docs/*.html",)
+# A quoted relative path; a ``?v=`` query from the old scheme is replaced.
+REFERENCE_RE = re.compile(
+    r"""(?P<quote>["'])(?P<path>[\w./-]+?)(?P<query>\?v=[0-9a-f]*)?(?P=quote)"""
+)
+
+
+class FingerprintError(RuntimeError):
+    pass
+
+
+def asset_fingerprints(root: Path = ROOT) -> dict[str, str]:
+    """Repository-relative static asset path -> ``sha256[:12]``."""
+    paths = [root / name for name in STATIC_ASSET_FILES if (root / name).is_file()]
+    for directory in STATIC_ASSET_DIRS:
+        paths += [path for path in (root / directory).rglob("*") if path.is_file()]
+    relatives = [path.relative_to(root).as_posix() for path in sorted(paths)]
+    return {
+        relative: hashlib.sha256((root / relative).read_bytes()).hexdigest()[:12]
+        for relative in relatives
+        if is_static_asset(relative)
+    }
+
+
+def fingerprinted_name(relative: str, digest: str) -> str:
+    stem, suffix = posixpath.splitext(relative)
+    return f"{stem}.{digest}{suffix}"
+
+
+def published_assets(root: Path = ROOT) -> dict[str, str]:
+    """Fingerprinted object key -> the repository file it is a copy of."""
+    return {
+        fingerprinted_name(relative, digest): relative
+        for relative, digest in asset_fingerprints(root).items()
+    }
+
+
+def is_fingerprinted(key: str) -> bool:
+    """Whether ``key`` names a fingerprinted copy rather than a source file."""
+    source = strip_fingerprint(key)
+    return source != key and is_static_asset(source)
+
+
+def referencing_files(root: Path = ROOT) -> list[str]:
+    files = [name for name in REFERENCING_FILES if (root / name).is_file()]
+    for pattern in REFERENCING_GLOBS:
+        files += [path.relative_to(root).as_posix() for path in sorted(root.glob(pattern))]
+    return files
+
+
+def fingerprint_text(
+    relative: str, text: str, fingerprints: dict[str, str]
+) -> tuple[str, list[str]]:
+    """Rewrite static asset references in one file.
+
+    Returns the rewritten text and a problem for every reference that was
+    missing or stale, or that names a static asset which does not exist.
+    """
+    problems = []
+    base = posixpath.dirname(relative)
+
+    def rewrite(match: re.Match) -> str:
+        source = strip_fingerprint(match["path"])
+        key = posixpath.normpath(posixpath.join(base, source))
+        if not is_static_asset(key):
+            return match[0]
+        digest = fingerprints.get(key)
+        if digest is None:
+            problems.append(f"{relative}: {source} is not a static asset in the repository")
+            return match[0]
+        path = fingerprinted_name(source, digest)
+        if match["path"] != path or match["query"]:
+            state = "stale" if match["path"] != source or match["query"] else "missing"
+            problems.append(f"{relative}: {source} has a {state} fingerprint")
+        return f"{match['quote']}{path}{match['quote']}"
+
+    return REFERENCE_RE.sub(rewrite, text), problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--check", action="store_true", help="fail on stale references instead of rewriting"
+    )
+    parser.add_argument("--json", action="store_true", help="print the digest map as JSON")
+    parser.add_argument(
+        "--export",
+        type=Path,
+        metavar="DIR",
+        help="check, then copy every asset to DIR under its fingerprinted name",
+    )
+    args = parser.parse_args()
+
+    try:
+        fingerprints = asset_fingerprints()
+        stale = []
+        for relative in referencing_files():
+            path = ROOT / relative
+            text = path.read_text(encoding="utf-8")
+            rewritten, problems = fingerprint_text(relative, text, fingerprints)
+            if args.check or args.export:
+                stale += problems
+                continue
+            # Rewriting fixes fingerprints; only unknown assets remain.
+            stale += fingerprint_text(relative, rewritten, fingerprints)[1]
+            if rewritten == text:
+                continue
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", newline="", dir=path.parent, delete=False
+            ) as handle:
+                handle.write(rewritten)
+            os.chmod(handle.name, path.stat().st_mode)
+            os.replace(handle.name, path)
+            print(f"updated {relative}")
+        if stale:
+            raise FingerprintError("\n  ".join(["static asset references are invalid:", *stale]))
+        if args.export:
+            for key, source in published_assets().items():
+                target = args.export / key
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(ROOT / source, target)
+    except (FingerprintError, OSError, ValueError) as exc:
+        print(f"fingerprint failed: {exc}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(fingerprints, indent=2))
+    else:
+        print(f"{len(fingerprints)} static assets fingerprinted")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
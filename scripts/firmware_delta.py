@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Build and apply binary delta patches between firmware images.
+
+The format follows bsdiff: a list of ``(extra, diff, seek)`` controls plus a
+stream of byte-wise differences against the source image and a stream of
+literal bytes, each LZMA-compressed. Recompiled firmware mostly moves code
+and rewrites addresses, so the approximate regions bsdiff keeps as diffs
+are mostly zero bytes and compress to almost nothing. The header pins the
+size, CRC32 and SHA256 of both images; :func:`apply_patch` is the reference
+implementation devices follow and refuses any source or result that does
+not match them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import lzma
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+
+DELTA_MAGIC = b"XRDELTA1"
+DELTA_SUFFIX = ".delta"
+# magic, source size, target size, source CRC32, target CRC32, source SHA256,
+# target SHA256 and the compressed control, diff and extra stream lengths.
+HEADER = struct.Struct("<8sQQII32s32sQQQ")
+# Literal bytes to copy from extra, bytes to rebuild from diff, then the
+# signed source offset adjustment applied before the diff.
+CONTROL = struct.Struct("<QQq")
+SEED_SIZE = 8
+# Index at most this many source positions; longer images index every n-th.
+INDEX_LIMIT = 1 << 20
+# Approximate matches grow in blocks while at least half the bytes agree.
+EXTEND_BLOCK = 16
+
+
+class DeltaError(RuntimeError):
+    pass
+
+
+def image_digests(data: bytes) -> tuple[int, int, bytes]:
+    return len(data), zlib.crc32(data), hashlib.sha256(data).digest()
+
+
+def _common_length(a: bytes, ai: int, b: bytes, bi: int) -> int:
+    limit = min(len(a) - ai, len(b) - bi)
+    length = 0
+    step = 4096
+    while step:
+        while length + step <= limit and a[ai + length : ai + length + step] == b[
+            bi + length : bi + length + step
+        ]:
+            length += step
+        step //= 8
+    return length
+
+
+def _extend(source: bytes, j: int, target: bytes, i: int) -> int:
+    """Length of the region at ``target[i:]`` worth encoding against ``source[j:]``."""
+    length = _common_length(source, j, target, i)
+    while True:
+        start = length
+        end = min(start + EXTEND_BLOCK, len(source) - j, len(target) - i)
+        if end <= start:
+            return length
+        same = sum(
+            left == right
+            for left, right in zip(source[j + start : j + end], target[i + start : i + end])
+        )
+        if 2 * same < end - start:
+            return length
+        length = end + _common_length(source, j + end, target, i + end)
+
+
+def _matches(source: bytes, target: bytes):
+    """Yield non-overlapping ``(target_pos, source_pos, length)`` regions in order."""
+    stride = max(1, len(source) // INDEX_LIMIT)
+    index: dict[bytes, int] = {}
+    for j in range(0, len(source) - SEED_SIZE + 1, stride):
+        index.setdefault(source[j : j + SEED_SIZE], j)
+
+    start = 0
+    offset = 0
+    i = 0
+    while i + SEED_SIZE <= len(target):
+        seed = target[i : i + SEED_SIZE]
+        j = i + offset
+        if not (0 <= j and source[j : j + SEED_SIZE] == seed):
+            j = index.get(seed)
+            if j is None:
+                i += 1
+                continue
+        back = 0
+        while back < i - start and back < j and source[j - back - 1] == target[i - back - 1]:
+            back += 1
+        length = back + _extend(source, j, target, i)
+        i, j = i - back, j - back
+        yield i, j, length
+        offset = j - i
+        i = start = i + length
+
+
+def create_patch(source: bytes, target: bytes) -> bytes:
+    controls = bytearray()
+    diff = bytearray()
+    extra = bytearray()
+    written = 0
+    position = 0
+    regions = list(_matches(source, target))
+    for index, (i, j, length) in enumerate(regions):
+        extra += target[written:i]
+        diff += bytes(
+            (new - old) & 0xFF for new, old in zip(target[i : i + length], source[j : j + length])
+        )
+        controls += CONTROL.pack(i - written, length, j - position)
+        written = i + length
+        position = j + length
+    if written < len(target):
+        extra += target[written:]
+        controls += CONTROL.pack(len(target) - written, 0, 0)
+
+    streams = [lzma.compress(bytes(stream), preset=9) for stream in (controls, diff, extra)]
+    source_size, source_crc32, source_sha256 = image_digests(source)
+    target_size, target_crc32, target_sha256 = image_digests(target)
+    header = HEADER.pack(
+        DELTA_MAGIC,
+        source_size,
+        target_size,
+        source_crc32,
+        target_crc32,
+        source_sha256,
+        target_sha256,
+        *(len(stream) for stream in streams),
+    )
+    return header + b"".join(streams)
+
+
+def read_header(patch: bytes) -> tuple:
+    if len(patch) < HEADER.size:
+        raise DeltaError("patch is truncated")
+    header = HEADER.unpack_from(patch)
+    if header[0] != DELTA_MAGIC:
+        raise DeltaError("not a firmware delta patch")
+    if HEADER.size + sum(header[7:]) != len(patch):
+        raise DeltaError("patch stream lengths do not match its size")
+    return header
+
+
+def _decompress(data: bytes, limit: int) -> bytes:
+    decompressor = lzma.LZMADecompressor()
+    try:
+        result = decompressor.decompress(data, max_length=limit + 1)
+    except lzma.LZMAError as exc:
+        raise DeltaError(f"patch stream is corrupt: {exc}") from exc
+    if len(result) > limit or not decompressor.eof:
+        raise DeltaError("patch stream is larger than the target image")
+    return result
+
+
+def apply_patch(source: bytes, patch: bytes) -> bytes:
+    """Rebuild the target image, checking both images against the patch header."""
+    _, source_size, target_size, *digests, control_size, diff_size, _ = read_header(patch)
+    if image_digests(source) != (source_size, digests[0], digests[2]):
+        raise DeltaError("source image does not match the patch")
+
+    offset = HEADER.size
+    streams = []
+    for size, limit in (
+        (control_size, CONTROL.size * (2 * target_size + 1)),
+        (diff_size, target_size),
+        (len(patch) - offset - control_size - diff_size, target_size),
+    ):
+        streams.append(_decompress(patch[offset : offset + size], limit))
+        offset += size
+    controls, diff, extra = streams
+    if len(controls) % CONTROL.size:
+        raise DeltaError("patch control stream is truncated")
+
+    target = bytearray()
+    position = diff_offset = extra_offset = 0
+    for extra_size, diff_length, seek in CONTROL.iter_unpack(controls):
+        if extra_offset + extra_size > len(extra):
+            raise DeltaError("patch extra stream is truncated")
+        target += extra[extra_offset : extra_offset + extra_size]
+        extra_offset += extra_size
+        position += seek
+        if (
+            position < 0
+            or position + diff_length > len(source)
+            or diff_offset + diff_length > len(diff)
+        ):
+            raise DeltaError("patch control points outside the source image")
+        delta = diff[diff_offset : diff_offset + diff_length]
+        old = source[position : position + diff_length]
+        if delta.count(0) == diff_length:
+            target += old
+        else:
+            target += bytes((left + right) & 0xFF for left, right in zip(old, delta))
+        diff_offset += diff_length
+        position += diff_length
+        if len(target) > target_size:
+            raise DeltaError("patch produces more bytes than the target image")
+
+    if image_digests(bytes(target)) != (target_size, digests[1], digests[3]):
+        raise DeltaError("rebuilt image does not match the patch target")
+    return bytes(target)
+
+
+def version_entry(patch: bytes, name: str, from_version: str) -> str:
+    """The ``deltas`` item to add under a firmware in ``version.yaml``."""
+    _, source_size, _, source_crc32, _, source_sha256, *_ = read_header(patch)
+    return "\n".join(
+        [
+            f"      - from_version: {from_version}",
+            f"        url: {name}",
+            f"        size: {len(patch)}",
+            f"        sha256: {hashlib.sha256(patch).hexdigest()}",
+            f"        source_size: {source_size}",
+            f"        source_crc32: {source_crc32}",
+            f"        source_sha256: {source_sha256.hex()}",
+        ]
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="write a patch from SOURCE to TARGET")
+    create.add_argument("source", type=Path)
+    create.add_argument("target", type=Path)
+    create.add_argument("-o", "--output", type=Path, required=True)
+    create.add_argument(
+        "--from-version",
+        required=True,
+        help="firmware version of SOURCE, written to the version.yaml entry",
+    )
+    apply = commands.add_parser("apply", help="rebuild a target image from SOURCE")
+    apply.add_argument("source", type=Path)
+    apply.add_argument("patch", type=Path)
+    apply.add_argument("-o", "--output", type=Path, required=True)
+    verify = commands.add_parser(
+        "verify", help="check PATCH rebuilds TARGET from SOURCE byte for byte"
+    )
+    verify.add_argument("source", type=Path)
+    verify.add_argument("target", type=Path)
+    verify.add_argument("patch", type=Path)
+    args = parser.parse_args()
+
+    try:
+        source = args.source.read_bytes()
+        if args.command == "create":
+            if args.output.suffix != DELTA_SUFFIX:
+                raise DeltaError(f"patch file name must end with {DELTA_SUFFIX}")
+            target = args.target.read_bytes()
+            patch = create_patch(source, target)
+            # Never publish a patch the reference implementation cannot replay.
+            if apply_patch(source, patch) != target:
+                raise DeltaError("patch does not rebuild the target image")
+            args.output.write_bytes(patch)
+            print(
+                f"wrote {args.output.name}: {len(patch)} bytes for a "
+                f"{len(target)}-byte image ({100 * len(patch) / max(len(target), 1):.1f}%)"
+            )
+            print("add under the firmware's deltas: in version.yaml:")
+            print(version_entry(patch, args.output.name, args.from_version))
+        elif args.command == "apply":
+            target = apply_patch(source, args.patch.read_bytes())
+            args.output.write_bytes(target)
+            print(f"wrote {args.output.name}: {len(target)} bytes")
+        else:
+            target = apply_patch(source, args.patch.read_bytes())
+            if target != args.target.read_bytes():
+                raise DeltaError(f"patch does not rebuild {args.target.name}")
+            print(f"verified {args.patch.name}: rebuilds {args.target.name} byte for byte")
+    except (DeltaError, OSError, lzma.LZMAError) as exc:
+        print(f"firmware delta failed: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+"""Minimal keep-alive client for the GitHub Releases REST API."""
+
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import threading
+import urllib.request
+from pathlib import Path
+from urllib.parse import quote, urlencode, urljoin, urlsplit
+
+import timings
+
+
+API_URL = os.environ.get("XIAOR_GITHUB_API_URL", "https://api.github.com")
+UPLOAD_URL = os.environ.get("XIAOR_GITHUB_UPLOAD_URL", "https://uploads.github.com")
+API_VERSION = "2022-11-28"
+PAGE_SIZE = 100
+
+
+class GitHubApiError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"GitHub API {status}: {message}")
+        self.status = status
+
+
+class GitHubReleaseClient:
+    """Release operations over one persistent connection per host and thread.
+
+    Results use the same shape as ``gh release view --json
+    isDraft,name,tagName,assets`` so callers can switch transports freely.
+    """
+
+    def __init__(
+        self,
+        repository: str,
+        token: str,
+        api_url: str = API_URL,
+        upload_url: str = UPLOAD_URL,
+        timeout: float = 60.0,
+    ):
+        self.repository = repository
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.upload_url = upload_url.rstrip("/")
+        self.timeout = timeout
+        self.requests = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened: list[http.client.HTTPConnection] = []
+
+    def _connection(self, base_url: str) -> tuple[http.client.HTTPConnection, str]:
+        parts = urlsplit(base_url)
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get(parts.netloc)
+        if connection is None:
+            factory = (
+                http.client.HTTPSConnection
+                if parts.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            connection = factory(parts.netloc, timeout=self.timeout)
+            connections[parts.netloc] = connection
+            with self._lock:
+                self._opened.append(connection)
+        return connection, parts.path.rstrip("/")
+
+    def _headers(self, accept: str, headers: dict[str, str] | None = None) -> dict[str, str]:
+        return {
+            "Accept": accept,
+            "Authorization": f"Bearer {self.token}",
+            "User-Agent": "xiaor-prepare-release",
+            "X-GitHub-Api-Version": API_VERSION,
+            **(headers or {}),
+        }
+
+    def _send(self, method: str, base_url: str, path: str, body, headers: dict[str, str]):
+        """Send one request and return the unread response.
+
+        A pooled connection the server already closed only fails on its next
+        request, so the request is retried once on a fresh socket; a file
+        body is rewound to where it started first.
+        """
+        connection, prefix = self._connection(base_url)
+        start = body.tell() if hasattr(body, "seek") else None
+        retry = body is None or isinstance(body, bytes) or start is not None
+        while True:
+            try:
+                connection.request(method, prefix + path, body=body, headers=headers)
+                return connection.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                if not retry:
+                    raise
+                retry = False
+                if start is not None:
+                    body.seek(start)
+                timings.count("retries")
+
+    def _request(
+        self,
+        method: str,
+        base_url: str,
+        path: str,
+        body=None,
+        headers: dict[str, str] | None = None,
+    ):
+        response = self._send(
+            method, base_url, path, body, self._headers("application/vnd.github+json", headers)
+        )
+        payload = response.read()
+        with self._lock:
+            self.requests += 1
+        timings.count("http_requests")
+        if response.status >= 400:
+            try:
+                message = json.loads(payload).get("message", "")
+            except (ValueError, AttributeError):
+                message = payload.decode("utf-8", "replace")
+            raise GitHubApiError(response.status, message or response.reason)
+        return json.loads(payload) if payload else None
+
+    def release_info(self, tag: str) -> dict | None:
+        """Return the release for ``tag`` including drafts, or ``None``.
+
+        Draft releases are invisible to ``/releases/tags/{tag}``, so the
+        release list is paged instead; each page already embeds the assets.
+        """
+        page = 1
+        while True:
+            query = urlencode({"per_page": PAGE_SIZE, "page": page})
+            releases = self._request(
+                "GET", self.api_url, f"/repos/{self.repository}/releases?{query}"
+            )
+            for release in releases:
+                if release.get("tag_name") == tag:
+                    return self._release_view(release)
+            if len(releases) < PAGE_SIZE:
+                return None
+            page += 1
+
+    def create_draft_release(self, tag: str, title: str, target: str, notes: str) -> dict:
+        body = json.dumps(
+            {
+                "tag_name": tag,
+                "target_commitish": target,
+                "name": title,
+                "body": notes,
+                "draft": True,
+            }
+        ).encode("utf-8")
+        release = self._request(
+            "POST",
+            self.api_url,
+            f"/repos/{self.repository}/releases",
+            body=body,
+            headers={"Content-Type": "application/json"},
+        )
+        return self._release_view(release)
+
+    def upload_asset(self, release_id: int, source: Path, asset_name: str) -> dict:
+        """Stream ``source`` to the release under ``asset_name`` without copying it."""
+        size = source.stat().st_size
+        query = urlencode({"name": asset_name}, quote_via=quote)
+        with source.open("rb") as handle:
+            return self._request(
+                "POST",
+                self.upload_url,
+                f"/repos/{self.repository}/releases/{release_id}/assets?{query}",
+                body=handle,
+                headers={
+                    "Content-Type": "application/octet-stream",
+                    "Content-Length": str(size),
+                },
+            )
+
+    def publish_release(self, release_id: int, target: str) -> None:
+        """Turn a draft into a published release without marking it latest."""
+        body = json.dumps(
+            {"draft": False, "make_latest": "false", "target_commitish": target}
+        ).encode("utf-8")
+        self._request(
+            "PATCH",
+            self.api_url,
+            f"/repos/{self.repository}/releases/{release_id}",
+            body=body,
+            headers={"Content-Type": "application/json"},
+        )
+
+    def open_asset(self, asset_id: int):
+        """Return a readable stream of a (possibly draft) release asset's bytes.
+
+        GitHub answers with a redirect to signed storage; the token is only
+        sent to the API host, never to the redirect target.
+        """
+        path = f"/repos/{self.repository}/releases/assets/{asset_id}"
+        response = self._send(
+            "GET", self.api_url, path, None, self._headers("application/octet-stream")
+        )
+        with self._lock:
+            self.requests += 1
+        timings.count("http_requests")
+        if response.status in {301, 302, 303, 307, 308}:
+            location = urljoin(self.api_url + path, response.getheader("Location", ""))
+            response.read()
+            timings.count("http_requests")
+            return urllib.request.urlopen(location, timeout=self.timeout)
+        if response.status != 200:
+            payload = response.read()
+            raise GitHubApiError(
+                response.status, payload.decode("utf-8", "replace") or response.reason
+            )
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._opened:
+                connection.close()
+            self._opened.clear()
+
+    @staticmethod
+    def _release_view(release: dict) -> dict:
+        return {
+            "id": release["id"],
+            "isDraft": release.get("draft", False),
+            "name": release.get("name"),
+            "tagName": release.get("tag_name"),
+            "assets": [
+                {
+                    "id": asset.get("id"),
+                    "name": asset.get("name"),
+                    "state": asset.get("state"),
+                    "size": asset.get("size"),
+                    "digest": asset.get("digest"),
+                }
+                for asset in release.get("assets", [])
+            ],
+        }
@@ -1,25 +1,71 @@
 #!/usr/bin/env python3
-"""Idempotently manage XiaoR's TOS historical-version retention rule."""
+"""Idempotently manage XiaoR's TOS lifecycle rules and storage tiering.
+
+``xiaor-release-retention-v1`` expires noncurrent versions and aborts stale
+multipart uploads bucket-wide. The tiering rules move objects carrying a
+``xiaor-tier`` tag out of standard storage, and the tags are derived from the
+catalog on every run:
+
+- ``historical``: ``oldVersion`` builds beyond the newest rollback of each
+  ``data.json`` entry and build variant (platform, ABI and file type read
+  from the file name), still downloadable, so they only move to IA.
+- ``superseded``: keys in ``releases/audit/superseded-assets.json``, kept for
+  audit and never served, so they continue to ARCHIVE. Archived objects
+  cannot be read without a restore, so ``mirror_release.py`` skips them when
+  replaying a manifest that still lists them.
+
+Every other referenced object (``link`` targets, tools, updater files and
+the rollback build) stays in standard storage; a stale tier tag on one is
+removed. ``--dry-run`` needs neither credentials nor the SDK and reports the
+bytes per tier. All bucket calls go through a ``TosClientV2``-compatible
+object, so a fake client can stand in for TOS.
+"""
 
 from __future__ import annotations
 
+import argparse
 import os
+import re
 import sys
+from contextlib import contextmanager
+from pathlib import PurePosixPath
 
-import tos
-from tos.enum import StatusType
-from tos.exceptions import TosServerError
-from tos.models2 import (
-    BucketLifeCycleAbortInCompleteMultipartUpload,
-    BucketLifeCycleNoCurrentVersionExpiration,
-    BucketLifeCycleRule,
+import timings
+from release_catalog import (
+    ELECTRON_UPDATER_FILES,
+    PLAIN_UPDATER_FILES,
+    ReleaseCatalog,
+    catalog_objects,
 )
+from tos_store import ObjectStoreError, open_store
+from tos_inventory import list_inventory
 
 
 RULE_ID = "xiaor-release-retention-v1"
 CONFIRMATION = "APPLY-XIAOR-TOS-LIFECYCLE"
 NONCURRENT_DAYS = 30
 MULTIPART_DAYS = 7
+TIER_TAG = "xiaor-tier"
+# oldVersion builds per data.json entry and build variant kept in standard
+# storage for rollback.
+HOT_ROLLBACKS = 1
+# File name tokens that tell the builds of one entry apart, e.g. one APK per ABI.
+VARIANT_RE = re.compile(
+    r"(?<![a-z0-9])(arm64-v8a|armeabi-v7a|x86_64|x86|arm64|x64|ia32|universal"
+    r"|windows|win|macos|mac|darwin|osx|linux)(?![a-z0-9])"
+)
+# Tier -> (storage class, days after the object was written) transitions.
+# IA and ARCHIVE bill at least 30 and 60 days, so no stage is shorter.
+TIERS = {
+    "historical": (("IA", 30),),
+    "superseded": (("IA", 30), ("ARCHIVE", 90)),
+}
+TIER_RULE_IDS = {tier: f"xiaor-tier-{tier}-v1" for tier in TIERS}
+GIB = 1024**3
+
+
+class LifecycleError(RuntimeError):
+    pass
 
 
 def required_env(name: str) -> str:
@@ -29,29 +75,137 @@ def required_env(name: str) -> str:
     return value
 
 
-def main() -> int:
+@contextmanager
+def _tos_errors(action: str):
+    from tos.exceptions import TosClientError, TosServerError
+
     try:
-        if required_env("TOS_LIFECYCLE_CONFIRM") != CONFIRMATION:
-            raise ValueError("exact lifecycle confirmation value is required")
+        yield
+    except TosServerError as exc:
+        raise LifecycleError(f"TOS {exc.status_code} {exc.code} {action}: {exc.message}") from exc
+    except TosClientError as exc:
+        raise LifecycleError(f"TOS client error {action}: {exc.message}") from exc
 
-        bucket = required_env("TOS_BUCKET")
-        client = tos.TosClientV2(
-            required_env("TOS_ACCESS_KEY_ID"),
-            required_env("TOS_SECRET_ACCESS_KEY"),
-            required_env("TOS_ENDPOINT"),
-            required_env("TOS_REGION"),
-            security_token=os.environ.get("TOS_SECURITY_TOKEN") or None,
-        )
 
-        try:
-            existing = list(client.get_bucket_lifecycle(bucket=bucket).rules or [])
-        except TosServerError as exc:
-            if exc.status_code != 404:
-                raise
-            existing = []
+def build_variant(value: str) -> tuple[str, ...]:
+    """File type plus the platform and ABI tokens of a build's file name."""
+    name = PurePosixPath(value.lower()).name
+    return (PurePosixPath(name).suffix, *VARIANT_RE.findall(name))
+
+
+def hot_rollbacks(entry: dict) -> list:
+    """The newest ``HOT_ROLLBACKS`` ``oldVersion`` builds of every build variant."""
+    kept = []
+    seen: dict[tuple[str, ...], int] = {}
+    for value in entry.get("oldVersion") or []:
+        variant = build_variant(str(value))
+        seen[variant] = seen.get(variant, 0) + 1
+        if seen[variant] <= HOT_ROLLBACKS:
+            kept.append(value)
+    return kept
+
+
+def tier_plan(catalog: ReleaseCatalog) -> dict[str, str | None]:
+    """TOS key -> tier of every referenced or superseded object; ``None`` stays hot."""
+    hot = catalog_objects(
+        [
+            {**entry, "oldVersion": hot_rollbacks(entry)} if isinstance(entry, dict) else entry
+            for entry in catalog.data
+        ]
+    )
+    for relative, base in PLAIN_UPDATER_FILES.items():
+        hot |= catalog.urls(relative, base)
+    for relative in ELECTRON_UPDATER_FILES:
+        hot |= catalog.electron_objects(relative)
+    plan: dict[str, str | None] = {
+        key: None if key in hot else "historical" for key in catalog.referenced_objects
+    }
+    for key in catalog.superseded_keys - set(plan):
+        plan[key] = "superseded"
+    return dict(sorted(plan.items()))
+
+
+def final_class(tier: str | None) -> str:
+    return TIERS[tier][-1][0] if tier else "STANDARD"
+
+
+def tier_report(
+    plan: dict[str, str | None], sizes: dict[str, int], prices: dict[str, float]
+) -> list[str]:
+    """Bytes per tier and, with prices per GiB-month, the projected monthly savings."""
+    lines = []
+    saved = 0.0
+    for tier in (None, *TIERS):
+        keys = [key for key, value in plan.items() if value == tier]
+        known = sum(sizes[key] for key in keys if key in sizes)
+        unknown = sum(key not in sizes for key in keys)
+        stages = ", ".join(f"{cls} after {days} days" for cls, days in TIERS.get(tier, ()))
+        label = f"{tier} -> {stages}" if tier else "current (STANDARD)"
+        line = f"{label}: {len(keys)} objects, {known / GIB:.3f} GiB"
+        if unknown:
+            line += f" (+{unknown} of unknown size)"
+        lines.append(line)
+        if tier and {"STANDARD", final_class(tier)} <= set(prices):
+            saved += known / GIB * (prices["STANDARD"] - prices[final_class(tier)])
+    moved = sum(sizes.get(key, 0) for key, tier in plan.items() if tier)
+    lines.append(f"leaving STANDARD once all transitions ran: {moved / GIB:.3f} GiB")
+    if {"STANDARD", *(final_class(tier) for tier in TIERS)} <= set(prices):
+        lines.append(f"projected storage savings: {saved:.2f} per month")
+    return lines
+
+
+def object_sizes(catalog: ReleaseCatalog, inventory: bool = False) -> dict[str, int]:
+    """Sizes from release manifests, or from one bucket listing with ``inventory``."""
+    sizes = {asset.tos_key: asset.size for asset in catalog.assets}
+    if inventory:
+        with timings.phase("list_inventory"):
+            sizes.update({key: info.size for key, info in list_inventory(open_store()).items()})
+    return sizes
+
+
+def sync_tier_tags(client, bucket: str, plan: dict[str, str | None]) -> dict[str, int]:
+    """Set or clear ``xiaor-tier`` on every planned key, keeping unrelated tags."""
+    from tos.models2 import Tag
+
+    changes = {"tagged": 0, "cleared": 0, "unchanged": 0}
+    for key, tier in plan.items():
+        timings.count("http_requests")
+        with timings.phase("get_tagging"), _tos_errors(f"reading tags of {key}"):
+            tags = list(client.get_object_tagging(bucket, key).tag_set or [])
+        current = next((tag.value for tag in tags if tag.key == TIER_TAG), None)
+        if current == tier:
+            changes["unchanged"] += 1
+            continue
+        others = [tag for tag in tags if tag.key != TIER_TAG]
+        timings.count("http_requests")
+        with timings.phase("put_tagging"), _tos_errors(f"tagging {key}"):
+            if tier:
+                client.put_object_tagging(bucket, key, others + [Tag(TIER_TAG, tier)])
+            elif others:
+                client.put_object_tagging(bucket, key, others)
+            else:
+                client.delete_object_tagging(bucket, key)
+        if tier:
+            changes["tagged"] += 1
+        else:
+            # Objects already moved stay in their class until rewritten.
+            changes["cleared"] += 1
+            print(f"warning: {key} is current again; cleared its {current} tier tag")
+    return changes
+
 
-        preserved = [rule for rule in existing if rule.id != RULE_ID]
-        managed_rule = BucketLifeCycleRule(
+def managed_rules() -> list:
+    from tos.enum import StatusType, StorageClassType
+    from tos.models2 import (
+        BucketLifeCycleAbortInCompleteMultipartUpload,
+        BucketLifeCycleNoCurrentVersionExpiration,
+        BucketLifeCycleRule,
+        BucketLifeCycleTransition,
+        Tag,
+    )
+
+    rules = [
+        BucketLifeCycleRule(
             id=RULE_ID,
             prefix="",
             status=StatusType.Status_Enable,
@@ -62,33 +216,156 @@ def main() -> int:
                 days_after_init=MULTIPART_DAYS
             ),
         )
+    ]
+    for tier, stages in TIERS.items():
+        rules.append(
+            BucketLifeCycleRule(
+                id=TIER_RULE_IDS[tier],
+                prefix="",
+                status=StatusType.Status_Enable,
+                tags=[Tag(TIER_TAG, tier)],
+                transitions=[
+                    BucketLifeCycleTransition(storage_class=StorageClassType(cls), days=days)
+                    for cls, days in stages
+                ],
+            )
+        )
+    return rules
+
+
+def _rule_fields(rule) -> tuple:
+    def value(item):
+        return getattr(item, "value", item)
+
+    return (
+        value(rule.status),
+        rule.prefix or "",
+        getattr(rule.no_current_version_expiration, "no_current_days", None),
+        getattr(rule.abort_in_complete_multipart_upload, "days_after_init", None),
+        sorted((tag.key, tag.value) for tag in rule.tags or []),
+        [(value(item.storage_class), item.days) for item in rule.transitions or []],
+    )
 
-        print("preserving lifecycle rules:", [rule.id for rule in preserved])
-        client.put_bucket_lifecycle(bucket=bucket, rules=preserved + [managed_rule])
 
+def apply_rules(client, bucket: str) -> list[str]:
+    """Replace the managed rules, keep every other rule, and verify the result."""
+    from tos.exceptions import TosServerError
+
+    expected = managed_rules()
+    managed_ids = {rule.id for rule in expected}
+    timings.count("http_requests")
+    with timings.phase("get_lifecycle"), _tos_errors("reading lifecycle rules"):
+        try:
+            existing = list(client.get_bucket_lifecycle(bucket=bucket).rules or [])
+        except TosServerError as exc:
+            if exc.status_code != 404:
+                raise
+            existing = []
+
+    preserved = [rule for rule in existing if rule.id not in managed_ids]
+    print("preserving lifecycle rules:", [rule.id for rule in preserved])
+    timings.count("http_requests")
+    with timings.phase("put_lifecycle"), _tos_errors("writing lifecycle rules"):
+        # The tier rules share the bucket-wide prefix and differ by tag only.
+        client.put_bucket_lifecycle(
+            bucket=bucket, rules=preserved + expected, allow_same_action_overlap=True
+        )
+
+    timings.count("http_requests")
+    with timings.phase("verify_lifecycle"), _tos_errors("reading lifecycle rules"):
         result = client.get_bucket_lifecycle(bucket=bucket)
-        matches = [rule for rule in result.rules or [] if rule.id == RULE_ID]
+    for rule in expected:
+        matches = [item for item in result.rules or [] if item.id == rule.id]
         if len(matches) != 1:
-            raise RuntimeError("managed lifecycle rule was not returned exactly once")
-        rule = matches[0]
-        if (
-            rule.status != StatusType.Status_Enable
-            or rule.prefix != ""
-            or rule.no_current_version_expiration is None
-            or rule.no_current_version_expiration.no_current_days != NONCURRENT_DAYS
-            or rule.abort_in_complete_multipart_upload is None
-            or rule.abort_in_complete_multipart_upload.days_after_init != MULTIPART_DAYS
-        ):
-            raise RuntimeError("managed lifecycle rule verification failed")
+            raise LifecycleError(f"managed lifecycle rule {rule.id} was not returned exactly once")
+        if _rule_fields(matches[0]) != _rule_fields(rule):
+            raise LifecycleError(f"managed lifecycle rule {rule.id} verification failed")
+    return [rule.id for rule in expected]
+
+
+def parse_price(value: str) -> tuple[str, float]:
+    cls, separator, price = value.partition("=")
+    try:
+        if not separator:
+            raise ValueError
+        return cls.upper(), float(price)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected CLASS=PRICE, e.g. STANDARD=0.12") from None
+
 
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Apply and verify the managed TOS lifecycle and tiering rules"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report the tier of every object; no credentials or SDK needed",
+    )
+    parser.add_argument(
+        "--inventory",
+        action="store_true",
+        help="size objects from one bucket listing instead of the release manifests",
+    )
+    parser.add_argument(
+        "--price",
+        action="append",
+        type=parse_price,
+        default=[],
+        metavar="CLASS=PRICE",
+        help="storage price per GiB-month, e.g. STANDARD=0.12; with STANDARD, IA and "
+        "ARCHIVE the report projects monthly savings; repeatable",
+    )
+    timings.add_timings_argument(parser)
+    args = parser.parse_args()
+
+    status = "failed"
+    try:
+        catalog = ReleaseCatalog()
+        with timings.phase("plan_tiers"):
+            plan = tier_plan(catalog)
+        report = tier_report(plan, object_sizes(catalog, args.inventory), dict(args.price))
+        if args.dry_run:
+            print("\n".join(report))
+            status = "ok"
+            return 0
+
+        if required_env("TOS_LIFECYCLE_CONFIRM") != CONFIRMATION:
+            raise ValueError("exact lifecycle confirmation value is required")
+
+        import tos
+
+        bucket = required_env("TOS_BUCKET")
+        client = tos.TosClientV2(
+            required_env("TOS_ACCESS_KEY_ID"),
+            required_env("TOS_SECRET_ACCESS_KEY"),
+            required_env("TOS_ENDPOINT"),
+            required_env("TOS_REGION"),
+            security_token=os.environ.get("TOS_SECURITY_TOKEN") or None,
+        )
+
+        changes = sync_tier_tags(client, bucket, plan)
+        print(
+            f"tier tags: {changes['tagged']} set, {changes['cleared']} cleared, "
+            f"{changes['unchanged']} unchanged"
+        )
+        apply_rules(client, bucket)
         print(
             f"verified {RULE_ID}: noncurrent={NONCURRENT_DAYS} days, "
             f"incomplete-multipart={MULTIPART_DAYS} days"
         )
+        for tier, stages in TIERS.items():
+            stages_text = ", ".join(f"{cls} after {days} days" for cls, days in stages)
+            print(f"verified {TIER_RULE_IDS[tier]}: {TIER_TAG}={tier} -> {stages_text}")
+        print("\n".join(report))
+        status = "ok"
         return 0
-    except (OSError, RuntimeError, TosServerError, ValueError) as exc:
+    except (LifecycleError, ObjectStoreError, OSError, ValueError) as exc:
         print(f"lifecycle maintenance failed: {exc}", file=sys.stderr)
         return 1
+    finally:
+        if args.timings_json:
+            timings.write_report(args.timings_json, "manage_tos_lifecycle", status)
 
 
 if __name__ == "__main__":
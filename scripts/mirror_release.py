@@ -0,0 +1,668 @@
+#!/usr/bin/env python3
+"""Stream reviewed Draft Release assets into TOS without staging them on disk."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+from asset_digest import MultiDigest
+from github_releases import GitHubApiError, GitHubReleaseClient
+from release_catalog import ROOT, ReleaseCatalog
+from tos_store import ObjectInfo, ObjectStoreError, open_store
+
+
+PUBLIC_DOWNLOAD_BASE_URL = "https://software.xiao-r.com/"
+IMMUTABLE_CACHE_CONTROL = "public,max-age=31536000,immutable"
+UPDATER_PREFIX = "ota/xr-studio/"
+UPDATER_SUFFIXES = {".dmg", ".exe", ".zip"}
+MANIFEST_PATH_RE = re.compile(r"^releases/[^/]+\.json$")
+MEGABYTE = 1024 * 1024
+PART_SIZE = 16 * MEGABYTE
+PUBLIC_RETRIES = 5
+PART_RETRIES = 3
+JOURNAL_VERSION = 1
+
+
+class MirrorError(RuntimeError):
+    pass
+
+
+def expected_sha512(
+    tos_key: str, name: str, size: int, entries: dict[str, tuple[str, int]]
+) -> str | None:
+    if not tos_key.startswith(UPDATER_PREFIX) or Path(tos_key).suffix.lower() not in (
+        UPDATER_SUFFIXES
+    ):
+        return None
+    entry = entries.get(Path(tos_key).name)
+    if entry is None or entry[1] != size:
+        raise MirrorError(f"updater manifest entry missing or size mismatch: {tos_key}")
+    return entry[0]
+
+
+def check_digest(
+    tos_key: str, digest: MultiDigest, size: int, sha256: str, sha512: str | None
+) -> None:
+    if digest.size != size:
+        raise MirrorError(f"release asset size mismatch: {tos_key}")
+    if digest.sha256 != sha256:
+        raise MirrorError(f"release asset SHA256 mismatch: {tos_key}")
+    if sha512 is not None and digest.sha512 != sha512:
+        raise MirrorError(f"updater manifest SHA512 mismatch: {tos_key}")
+
+
+def default_journal_dir() -> Path:
+    configured = os.environ.get("XIAOR_UPLOAD_JOURNAL")
+    if configured:
+        return Path(configured).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "xiaor-release" / "uploads"
+
+
+class UploadJournal:
+    """Completed multipart parts per TOS key, kept on disk so reruns resume.
+
+    Each record pins the asset size, SHA256 and part size, and lists every
+    uploaded part's ETag with the SHA256 of its bytes. A rerun still streams
+    the whole asset so the final digests are checked before completion, but
+    only re-uploads parts the store does not hold with identical bytes.
+
+    The journal also remembers the ETag of every object this pipeline wrote
+    or fully hashed, so a later HEAD can tell that object from one replaced
+    out of band with copied metadata.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._records: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _verified_path(self, key: str) -> Path:
+        return self.directory / "verified" / self._path(key).name
+
+    @staticmethod
+    def _dump(path: Path, record: dict) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=path.parent, delete=False
+        ) as handle:
+            json.dump(record, handle, sort_keys=True)
+        os.replace(handle.name, path)
+
+    def _write(self, key: str) -> None:
+        self._dump(self._path(key), self._records[key])
+
+    def resume(
+        self, store, key: str, size: int, sha256: str, part_size: int
+    ) -> tuple[str, dict[int, tuple[str, str]]] | None:
+        """Return the open upload id and its reusable parts, if any."""
+        try:
+            record = json.loads(self._path(key).read_text(encoding="utf-8"))
+            pinned = [
+                record.get(field) for field in ("version", "key", "size", "sha256", "part_size")
+            ]
+            if pinned != [JOURNAL_VERSION, key, size, sha256, part_size]:
+                return None
+            uploaded = store.list_parts(key, record["upload_id"])
+            parts = {
+                int(number): (etag, part_sha256)
+                for number, (etag, part_sha256) in record["parts"].items()
+                if uploaded.get(int(number)) == etag
+            }
+        except (ObjectStoreError, OSError, KeyError, TypeError, ValueError):
+            return None
+        with self._lock:
+            record["parts"] = {str(number): list(part) for number, part in parts.items()}
+            self._records[key] = record
+            self._write(key)
+        return record["upload_id"], parts
+
+    def start(self, key: str, size: int, sha256: str, part_size: int, upload_id: str) -> None:
+        with self._lock:
+            self._records[key] = {
+                "version": JOURNAL_VERSION,
+                "key": key,
+                "size": size,
+                "sha256": sha256,
+                "part_size": part_size,
+                "upload_id": upload_id,
+                "parts": {},
+            }
+            self._write(key)
+
+    def record(self, key: str, number: int, etag: str, part_sha256: str) -> None:
+        with self._lock:
+            self._records[key]["parts"][str(number)] = [etag, part_sha256]
+            self._write(key)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._records.pop(key, None)
+            self._path(key).unlink(missing_ok=True)
+
+    def verified_etag(self, key: str, size: int, sha256: str) -> str | None:
+        """ETag the object had when its content last matched ``size`` and ``sha256``."""
+        try:
+            record = json.loads(self._verified_path(key).read_text(encoding="utf-8"))
+            pinned = [record.get(field) for field in ("version", "key", "size", "sha256")]
+        except (OSError, ValueError, AttributeError):
+            return None
+        if pinned != [JOURNAL_VERSION, key, size, sha256]:
+            return None
+        return record.get("etag") or None
+
+    def verified(self, key: str, size: int, sha256: str, etag: str) -> None:
+        record = {
+            "version": JOURNAL_VERSION,
+            "key": key,
+            "size": size,
+            "sha256": sha256,
+            "etag": etag,
+        }
+        with self._lock:
+            self._dump(self._verified_path(key), record)
+
+
+def upload_part(
+    store,
+    tos_key: str,
+    upload_id: str,
+    number: int,
+    data: bytes,
+    journal: UploadJournal | None,
+) -> str:
+    for attempt in range(PART_RETRIES + 1):
+        try:
+            etag = store.upload_part(tos_key, upload_id, number, data)
+            break
+        except ObjectStoreError:
+            if attempt == PART_RETRIES:
+                raise
+            time.sleep(2**attempt)
+    if journal is not None:
+        journal.record(tos_key, number, etag, hashlib.sha256(data).hexdigest())
+    return etag
+
+
+def object_meta(sha256: str, sha512: str | None) -> dict[str, str]:
+    meta = {"sha256": sha256}
+    if sha512 is not None:
+        meta["sha512"] = sha512
+    return meta
+
+
+def read_exactly(stream, size: int) -> bytes:
+    chunks: list[bytes] = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def stream_upload(
+    store,
+    tos_key: str,
+    stream,
+    size: int,
+    sha256: str,
+    sha512: str | None,
+    part_size: int = PART_SIZE,
+    part_jobs: int = 4,
+    journal: UploadJournal | None = None,
+) -> int:
+    """Pipe ``stream`` into TOS, committing only once every digest matched.
+
+    Parts are uploaded while later bytes are still downloading; at most
+    ``part_jobs`` parts are buffered at a time, and each part is retried
+    before the upload gives up. A digest mismatch aborts the multipart
+    upload so no object ever becomes visible. Any other failure aborts it
+    too unless a ``journal`` is given, in which case the upload stays open
+    and the next run resumes it. Returns the number of parts reused.
+    """
+    meta = object_meta(sha256, sha512)
+    digest = MultiDigest()
+    if size <= part_size:
+        data = read_exactly(stream, size + 1)
+        digest.update(data)
+        check_digest(tos_key, digest, size, sha256, sha512)
+        store.put(tos_key, data, meta, IMMUTABLE_CACHE_CONTROL)
+        return 0
+
+    resumed = journal.resume(store, tos_key, size, sha256, part_size) if journal else None
+    if resumed is None:
+        upload_id = store.create_multipart(tos_key, meta, IMMUTABLE_CACHE_CONTROL)
+        uploaded: dict[int, tuple[str, str]] = {}
+        if journal is not None:
+            journal.start(tos_key, size, sha256, part_size, upload_id)
+    else:
+        upload_id, uploaded = resumed
+    reused = 0
+    try:
+        slots = threading.BoundedSemaphore(part_jobs)
+        futures = []
+        with ThreadPoolExecutor(max_workers=part_jobs) as pool:
+            while True:
+                data = read_exactly(stream, part_size)
+                if not data:
+                    break
+                digest.update(data)
+                if digest.size > size:
+                    raise MirrorError(f"release asset size mismatch: {tos_key}")
+                for _, future in futures:
+                    if future.done() and future.exception():
+                        raise future.exception()
+                number = len(futures) + 1
+                part = uploaded.get(number)
+                if part is not None and part[1] == hashlib.sha256(data).hexdigest():
+                    future = Future()
+                    future.set_result(part[0])
+                    futures.append((number, future))
+                    reused += 1
+                    continue
+                slots.acquire()
+                future = pool.submit(
+                    upload_part, store, tos_key, upload_id, number, data, journal
+                )
+                future.add_done_callback(lambda _: slots.release())
+                futures.append((number, future))
+            parts = [(number, future.result()) for number, future in futures]
+        check_digest(tos_key, digest, size, sha256, sha512)
+        store.complete_multipart(tos_key, upload_id, parts)
+    except MirrorError:
+        store.abort_multipart(tos_key, upload_id)
+        if journal is not None:
+            journal.discard(tos_key)
+        raise
+    except BaseException:
+        if journal is None:
+            store.abort_multipart(tos_key, upload_id)
+        raise
+    if journal is not None:
+        journal.discard(tos_key)
+    return reused
+
+
+def hash_object(
+    store, info: ObjectInfo, range_size: int = PART_SIZE, jobs: int = 4
+) -> MultiDigest:
+    """Hash a remote object from parallel ranged GETs, consumed in order.
+
+    Every range is pinned to the HEAD ETag so a concurrent replacement
+    fails the read rather than producing a mixed digest.
+    """
+    digest = MultiDigest()
+    ranges = [
+        (start, min(start + range_size, info.size) - 1)
+        for start in range(0, info.size, range_size)
+    ]
+
+    def fetch(bounds: tuple[int, int]) -> bytes:
+        return b"".join(store.read(info.key, bounds[0], bounds[1], info.etag or None))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for bounds in ranges:
+            pending.append(pool.submit(fetch, bounds))
+            if len(pending) >= jobs:
+                digest.update(pending.popleft().result())
+        while pending:
+            digest.update(pending.popleft().result())
+    return digest
+
+
+def verify_existing(
+    store,
+    info: ObjectInfo,
+    size: int,
+    sha256: str,
+    sha512: str | None,
+    args: argparse.Namespace,
+    journal: UploadJournal | None = None,
+) -> str:
+    """Confirm an existing object holds the manifest bytes; return how.
+
+    Objects written by this pipeline carry ``sha256`` (and for updater
+    packages ``sha512``) metadata, so a HEAD is trusted outright when that
+    metadata matches and the ETag is the one the journal recorded when the
+    object was written or last hashed. Anything else, including a missing
+    journal entry, falls back to hashing the content.
+    """
+    conflict = f"TOS key exists with different content; refusing overwrite: {info.key}"
+    if info.size != size:
+        raise MirrorError(conflict)
+    if (
+        args.verify_existing == "metadata"
+        and journal is not None
+        and info.etag
+        and info.etag == journal.verified_etag(info.key, size, sha256)
+        and info.meta.get("sha256") == sha256
+        and (sha512 is None or info.meta.get("sha512") == sha512)
+    ):
+        return "metadata"
+    digest = hash_object(store, info, args.part_size, args.part_jobs)
+    try:
+        check_digest(info.key, digest, size, sha256, sha512)
+    except MirrorError as exc:
+        raise MirrorError(conflict) from exc
+    if journal is not None and info.etag:
+        journal.verified(info.key, size, sha256, info.etag)
+    return "content"
+
+
+def copy_duplicate(
+    store,
+    tos_key: str,
+    sources: list[str],
+    size: int,
+    sha256: str,
+    sha512: str | None,
+    args: argparse.Namespace,
+    journal: UploadJournal | None = None,
+) -> str | None:
+    """Server-side copy from another key that already holds the same bytes.
+
+    A source qualifies only after the same existing-object verification the
+    mirror applies to the key itself. Returns the source key, or ``None``
+    when no published duplicate is usable.
+    """
+    for source in sources:
+        info = store.head(source)
+        if info is None:
+            continue
+        try:
+            verify_existing(store, info, size, sha256, sha512, args, journal)
+        except MirrorError:
+            continue
+        store.copy(source, tos_key, object_meta(sha256, sha512), IMMUTABLE_CACHE_CONTROL)
+        return source
+    return None
+
+
+def public_url(base_url: str, tos_key: str) -> str:
+    return base_url + quote(tos_key, safe="/")
+
+
+def _open_with_retries(request: urllib.request.Request):
+    for attempt in range(PUBLIC_RETRIES + 1):
+        try:
+            return urllib.request.urlopen(request, timeout=60)
+        except urllib.error.HTTPError as exc:
+            if exc.code < 500 or attempt == PUBLIC_RETRIES:
+                raise
+        except urllib.error.URLError:
+            if attempt == PUBLIC_RETRIES:
+                raise
+        time.sleep(2**attempt)
+    raise AssertionError("unreachable")
+
+
+def verify_public(base_url: str, tos_key: str, size: int) -> None:
+    """Check public HTTPS Content-Length and single-byte Range support."""
+    url = public_url(base_url, tos_key)
+    with _open_with_retries(urllib.request.Request(url, method="HEAD")) as response:
+        if response.headers.get("Content-Length") != str(size):
+            raise MirrorError(f"public Content-Length mismatch: {tos_key}")
+    request = urllib.request.Request(url, headers={"Range": "bytes=0-0"})
+    with _open_with_retries(request) as response:
+        content_range = response.headers.get("Content-Range")
+        response.read()
+        if response.status != 206 or content_range != f"bytes 0-0/{size}":
+            raise MirrorError(f"public Range verification failed: {tos_key}")
+
+
+def mirror_asset(
+    client: GitHubReleaseClient,
+    store,
+    release_assets: dict[str, dict],
+    asset: dict,
+    entries: dict[str, tuple[str, int]],
+    duplicates: list[str],
+    args: argparse.Namespace,
+    journal: UploadJournal | None = None,
+) -> str:
+    name = asset["name"]
+    tos_key = asset["tos_key"]
+    size = asset["size"]
+    sha256 = asset["sha256"]
+    started = time.perf_counter()
+
+    draft_asset = release_assets.get(name)
+    if draft_asset is None:
+        raise MirrorError(f"release asset not found in draft: {name}")
+    if draft_asset.get("size") != size or draft_asset.get("digest") not in {
+        None,
+        f"sha256:{sha256}",
+    }:
+        raise MirrorError(f"release asset size or SHA256 mismatch: {name}")
+    sha512 = expected_sha512(tos_key, name, size, entries)
+
+    info = store.head(tos_key)
+    if info is not None:
+        method = verify_existing(store, info, size, sha256, sha512, args, journal)
+        action = f"TOS object already matches ({method}); skipped"
+    elif duplicates and (
+        source := copy_duplicate(
+            store, tos_key, duplicates, size, sha256, sha512, args, journal
+        )
+    ):
+        action = f"Copied TOS object server-side from {source}"
+    else:
+        with client.open_asset(draft_asset["id"]) as stream:
+            reused = stream_upload(
+                store,
+                tos_key,
+                stream,
+                size,
+                sha256,
+                sha512,
+                args.part_size,
+                args.part_jobs,
+                journal,
+            )
+        action = "Uploaded new TOS object"
+        if reused:
+            action += f" (resumed, {reused} parts reused)"
+    if info is None and journal is not None:
+        written = store.head(tos_key)
+        if written is None or written.size != size:
+            raise MirrorError(f"TOS object missing after upload: {tos_key}")
+        journal.verified(tos_key, size, sha256, written.etag)
+    verify_public(args.public_base_url, tos_key, size)
+    seconds = time.perf_counter() - started
+    return (
+        f"{action}: {tos_key} ({size / MEGABYTE:.1f} MB in {seconds:.1f}s, "
+        f"{size / MEGABYTE / max(seconds, 1e-9):.1f} MB/s); verified public HTTPS, "
+        "length and Range"
+    )
+
+
+def mirror_manifest(
+    client: GitHubReleaseClient,
+    store,
+    path: str,
+    catalog: ReleaseCatalog,
+    args: argparse.Namespace,
+    journal: UploadJournal | None = None,
+) -> None:
+    if not MANIFEST_PATH_RE.fullmatch(path) or path not in catalog.manifests:
+        raise MirrorError(f"replay manifest not found: {path}")
+    manifest = catalog.manifests[path]
+    entries = catalog.updater_entries
+    tag = manifest["tag"]
+    release = client.release_info(tag)
+    if release is None:
+        raise MirrorError(f"GitHub Release not found: {tag}")
+    release_assets = {asset["name"]: asset for asset in release["assets"]}
+
+    # Superseded keys move to ARCHIVE (see manage_tos_lifecycle.py), where
+    # neither a hash nor the public Range check can read them; they are
+    # never served, so a replay leaves them alone.
+    superseded = catalog.superseded_keys
+    assets = []
+    for asset in manifest["assets"]:
+        if asset["tos_key"] in superseded:
+            print(f"Superseded TOS object kept for audit; skipped: {asset['tos_key']}")
+        else:
+            assets.append(asset)
+    # Installers must be public before any blockmap that describes them, and
+    # the first key of each content runs before keys that can copy from it.
+    installers = [asset for asset in assets if not asset["name"].endswith(".blockmap")]
+    blockmaps = [asset for asset in assets if asset["name"].endswith(".blockmap")]
+    groups = []
+    for batch in (installers, blockmaps):
+        first: dict[str, dict] = {}
+        for asset in batch:
+            first.setdefault(asset["sha256"], asset)
+        groups.append(list(first.values()))
+        groups.append([asset for asset in batch if first[asset["sha256"]] is not asset])
+    for group in groups:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            futures = [
+                pool.submit(
+                    mirror_asset,
+                    client,
+                    store,
+                    release_assets,
+                    asset,
+                    entries,
+                    [
+                        key
+                        for key in catalog.keys_by_sha256.get(asset["sha256"], [])
+                        if key != asset["tos_key"] and key not in superseded
+                    ],
+                    args,
+                    journal,
+                )
+                for asset in group
+            ]
+            try:
+                for future in futures:
+                    print(future.result(), flush=True)
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    if release["isDraft"]:
+        if not args.target:
+            raise MirrorError("--target commit is required to publish a draft release")
+        client.publish_release(release["id"], args.target)
+        print(f"Published GitHub Release: {tag}")
+    else:
+        print(f"GitHub Release already published: {tag}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Mirror reviewed Draft Release assets to TOS and publish them"
+    )
+    parser.add_argument("manifests", nargs="*", metavar="releases/TAG.json")
+    parser.add_argument(
+        "--manifests-file",
+        type=Path,
+        help="file listing one releases/<tag>.json path per line",
+    )
+    parser.add_argument("--repo", default=os.environ.get("GITHUB_REPOSITORY"))
+    parser.add_argument(
+        "--target",
+        default=os.environ.get("GITHUB_SHA"),
+        help="commit a draft release is published at (default: $GITHUB_SHA)",
+    )
+    parser.add_argument(
+        "--public-base-url",
+        default=os.environ.get("PUBLIC_RELEASE_BASE_URL", PUBLIC_DOWNLOAD_BASE_URL),
+    )
+    parser.add_argument("--jobs", type=int, default=4, help="assets mirrored concurrently")
+    parser.add_argument(
+        "--part-jobs", type=int, default=4, help="multipart uploads in flight per asset"
+    )
+    parser.add_argument(
+        "--verify-existing",
+        choices=("metadata", "content"),
+        default="metadata",
+        help="trust matching sha256 metadata on existing objects, or always rehash",
+    )
+    parser.add_argument(
+        "--part-size",
+        type=lambda value: int(value) * MEGABYTE,
+        default=PART_SIZE,
+        metavar="MIB",
+        help="multipart part size in MiB (default: 16)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=default_journal_dir(),
+        metavar="DIR",
+        help="directory recording uploaded parts so an interrupted multipart upload "
+        "resumes on the next run, and the ETags of verified objects "
+        "(default: ~/.cache/xiaor-release/uploads)",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="abort interrupted multipart uploads instead of keeping them to resume, "
+        "and hash every existing object",
+    )
+    args = parser.parse_args()
+
+    try:
+        manifests = list(args.manifests)
+        if args.manifests_file:
+            manifests += [
+                line.strip()
+                for line in args.manifests_file.read_text(encoding="utf-8").splitlines()
+                if line.strip()
+            ]
+        if not manifests:
+            print("no release manifests to mirror")
+            return 0
+        if not args.repo:
+            raise MirrorError("--repo or GITHUB_REPOSITORY is required")
+        token = os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN")
+        if not token:
+            raise MirrorError("GH_TOKEN or GITHUB_TOKEN is required")
+        client = GitHubReleaseClient(args.repo, token)
+        store = open_store()
+        catalog = ReleaseCatalog(ROOT)
+        journal = None if args.no_journal else UploadJournal(args.journal)
+        try:
+            for path in manifests:
+                mirror_manifest(client, store, path, catalog, args, journal)
+        finally:
+            client.close()
+        return 0
+    except (
+        GitHubApiError,
+        MirrorError,
+        ObjectStoreError,
+        OSError,
+        KeyError,
+        ValueError,
+    ) as exc:
+        print(f"release mirror failed: {exc}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
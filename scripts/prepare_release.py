@@ -12,18 +12,32 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path, PurePosixPath
 
+from asset_digest import (
+    AssetDigest,
+    DigestCacheError,
+    add_cache_arguments,
+    cache_from_arguments,
+    digest_file,
+    digest_files,
+)
+from github_releases import GitHubApiError, GitHubReleaseClient
+import timings
+from release_catalog import ROOT, ReleaseCatalog
 
-ROOT = Path(__file__).resolve().parents[1]
 MANIFEST_DIR = ROOT / "releases"
 MAX_ASSET_SIZE = 2 * 1024 * 1024 * 1024
+MEGABYTE = 1024 * 1024
 TAG_RE = re.compile(r"^[a-z0-9][a-z0-9._-]{2,127}$")
 ALLOWED_SUFFIXES = {
     ".aab",
     ".apk",
     ".bin",
     ".blockmap",
+    ".delta",
     ".dmg",
     ".exe",
     ".hex",
@@ -31,7 +45,20 @@ ALLOWED_SUFFIXES = {
     ".zip",
 }
 ALLOWED_TOS_PREFIXES = ("software/", "firmware/", "ota/")
+UPDATER_PACKAGE_SUFFIXES = {".dmg", ".exe", ".zip"}
+UPDATER_MANIFESTS = {"windows": "latest.yml", "mac": "latest-mac.yml"}
+# electron-builder artifact names carry the target OS as its own name token.
+UPDATER_PLATFORM_TOKENS = {
+    "win": "windows",
+    "windows": "windows",
+    "mac": "mac",
+    "macos": "mac",
+    "darwin": "mac",
+    "osx": "mac",
+}
+UPDATER_PLATFORM_SUFFIXES = {".exe": "windows", ".dmg": "mac"}
 GH_CLI = os.environ.get("XIAOR_GH", "gh")
+RELEASE_NOTES = "Prepared by scripts/prepare_release.py; publication requires reviewed master."
 
 
 class ReleaseError(RuntimeError):
@@ -39,6 +66,7 @@ class ReleaseError(RuntimeError):
 
 
 def run_gh(*args: str, check: bool = True) -> subprocess.CompletedProcess[str]:
+    timings.count("subprocesses")
     return subprocess.run(
         [GH_CLI, *args],
         cwd=ROOT,
@@ -48,14 +76,6 @@ def run_gh(*args: str, check: bool = True) -> subprocess.CompletedProcess[str]:
     )
 
 
-def sha256(path: Path) -> str:
-    digest = hashlib.sha256()
-    with path.open("rb") as handle:
-        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
-            digest.update(chunk)
-    return digest.hexdigest()
-
-
 def release_asset_name(filename: str) -> str:
     """Return a deterministic GitHub-safe name while TOS keeps its original key."""
     safe = re.sub(r"[^A-Za-z0-9._-]+", ".", filename).strip(".")
@@ -93,7 +113,96 @@ def parse_asset(value: str) -> tuple[Path, str, str]:
     return source, normalized_key, release_asset_name(source.name)
 
 
-def release_info(repository: str, tag: str) -> dict | None:
+def is_updater_package(tos_key: str) -> bool:
+    return tos_key.startswith("ota/") and (
+        Path(tos_key).suffix.lower() in UPDATER_PACKAGE_SUFFIXES
+    )
+
+
+def write_blockmap(
+    directory: Path, source: Path, tos_key: str, blockmap: bytes
+) -> tuple[Path, str, str]:
+    """Write a generated blockmap into ``directory`` and return its asset tuple."""
+    path = directory / f"{source.name}.blockmap"
+    path.write_bytes(blockmap)
+    return path, f"{tos_key}.blockmap", release_asset_name(path.name)
+
+
+def updater_platform(tos_key: str) -> str:
+    """Platform whose ``latest*.yml`` lists ``tos_key``: windows or mac.
+
+    ``.exe`` and ``.dmg`` only exist for one platform; any other package, such
+    as a zip, must name its platform with a ``-win-``/``-mac-`` style token.
+    """
+    name = PurePosixPath(tos_key).name.lower()
+    platforms = {
+        UPDATER_PLATFORM_TOKENS[token]
+        for token in re.split(r"[-_. ]+", name)
+        if token in UPDATER_PLATFORM_TOKENS
+    }
+    suffix_platform = UPDATER_PLATFORM_SUFFIXES.get(PurePosixPath(name).suffix)
+    if suffix_platform is not None:
+        platforms.add(suffix_platform)
+    if len(platforms) != 1:
+        raise ReleaseError(
+            f"cannot tell the updater platform of {tos_key}; "
+            "name it with a -win- or -mac- token"
+        )
+    return platforms.pop()
+
+
+def release_date(packages: list[tuple[str, AssetDigest]]) -> str:
+    """The newest package mtime, so rerunning on the same files keeps the same date."""
+    newest = max(os.stat(result.path).st_mtime_ns for _, result in packages)
+    seconds, nanoseconds = divmod(newest, 1_000_000_000)
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+    return f"{stamp}.{nanoseconds // 1_000_000:03d}Z"
+
+
+def updater_manifest_text(version: str, packages: list[tuple[str, AssetDigest]]) -> str:
+    """Render an electron-builder ``latest*.yml`` for ``(tos_key, digest)`` pairs."""
+    names = [PurePosixPath(key).name for key, _ in packages]
+    # electron-updater installs from ``path``: the zip on macOS, the exe on Windows.
+    wanted = ".zip" if updater_platform(packages[0][0]) == "mac" else ".exe"
+    primary = next(
+        (index for index, name in enumerate(names) if name.lower().endswith(wanted)), 0
+    )
+    lines = [f"version: {version}", "files:"]
+    for name, (_, result) in zip(names, packages):
+        lines += [
+            f"  - url: {name}",
+            f"    sha512: {result.sha512}",
+            f"    size: {result.size}",
+        ]
+    lines += [
+        f"path: {names[primary]}",
+        f"sha512: {packages[primary][1].sha512}",
+        f"releaseDate: '{release_date(packages)}'",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_updater_manifests(
+    version: str, packages: list[tuple[str, AssetDigest]]
+) -> list[Path]:
+    """Write ``latest.yml`` (Windows) and ``latest-mac.yml`` next to the packages."""
+    groups: dict[Path, list[tuple[str, AssetDigest]]] = {}
+    for tos_key, result in packages:
+        name = UPDATER_MANIFESTS[updater_platform(tos_key)]
+        groups.setdefault(ROOT / PurePosixPath(tos_key).parent / name, []).append(
+            (tos_key, result)
+        )
+    for path, group in groups.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(updater_manifest_text(version, group), encoding="utf-8")
+    return list(groups)
+
+
+def release_info(
+    repository: str, tag: str, client: GitHubReleaseClient | None = None
+) -> dict | None:
+    if client is not None:
+        return client.release_info(tag)
     result = run_gh(
         "release",
         "view",
@@ -109,9 +218,13 @@ def release_info(repository: str, tag: str) -> dict | None:
     return json.loads(result.stdout)
 
 
-def ensure_draft_release(repository: str, tag: str, title: str) -> dict:
-    info = release_info(repository, tag)
-    if info is None:
+def ensure_draft_release(
+    repository: str, tag: str, title: str, client: GitHubReleaseClient | None = None
+) -> dict:
+    info = release_info(repository, tag, client)
+    if info is None and client is not None:
+        info = client.create_draft_release(tag, title, "master", RELEASE_NOTES)
+    elif info is None:
         run_gh(
             "release",
             "create",
@@ -124,7 +237,7 @@ def ensure_draft_release(repository: str, tag: str, title: str) -> dict:
             "--title",
             title,
             "--notes",
-            "Prepared by scripts/prepare_release.py; publication requires reviewed master.",
+            RELEASE_NOTES,
         )
         info = release_info(repository, tag)
     if not info or not info.get("isDraft"):
@@ -132,6 +245,16 @@ def ensure_draft_release(repository: str, tag: str, title: str) -> dict:
     return info
 
 
+def api_client(repository: str) -> GitHubReleaseClient:
+    """Build a REST client from ``GH_TOKEN``/``GITHUB_TOKEN`` or the gh login."""
+    token = os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN")
+    if not token:
+        token = run_gh("auth", "token").stdout.strip()
+    if not token:
+        raise ReleaseError("no GitHub token available for --transport api")
+    return GitHubReleaseClient(repository, token)
+
+
 def verify_existing_asset(asset: dict, expected_size: int, expected_sha: str) -> None:
     if (
         asset.get("state") != "uploaded"
@@ -144,6 +267,75 @@ def verify_existing_asset(asset: dict, expected_size: int, expected_sha: str) ->
         )
 
 
+def upload_asset(
+    repository: str,
+    tag: str,
+    source: Path,
+    asset_name: str,
+    release: dict | None = None,
+    client: GitHubReleaseClient | None = None,
+) -> float:
+    """Upload one asset under its GitHub-safe name and return elapsed seconds."""
+    started = time.perf_counter()
+    if client is not None and release is not None:
+        client.upload_asset(release["id"], source, asset_name)
+    elif asset_name == source.name:
+        run_gh("release", "upload", tag, str(source), "--repo", repository)
+    else:
+        with tempfile.TemporaryDirectory(
+            prefix="xiaor-release-name-", dir=source.parent
+        ) as directory:
+            upload_path = Path(directory) / asset_name
+            try:
+                os.link(source, upload_path)
+            except OSError:
+                shutil.copyfile(source, upload_path)
+            run_gh("release", "upload", tag, str(upload_path), "--repo", repository)
+    return time.perf_counter() - started
+
+
+def upload_assets(
+    repository: str,
+    tag: str,
+    uploads: list[tuple[Path, str, int]],
+    jobs: int,
+    release: dict | None = None,
+    client: GitHubReleaseClient | None = None,
+) -> None:
+    """Upload ``(source, asset_name, size)`` entries with at most ``jobs`` in flight."""
+    if not uploads:
+        return
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {
+            pool.submit(
+                upload_asset, repository, tag, source, asset_name, release, client
+            ): (
+                asset_name,
+                size,
+            )
+            for source, asset_name, size in uploads
+        }
+        try:
+            for future in as_completed(futures):
+                asset_name, size = futures[future]
+                seconds = future.result()
+                print(
+                    f"uploaded draft asset: {asset_name} "
+                    f"({size / MEGABYTE:.1f} MB in {seconds:.1f}s, "
+                    f"{size / MEGABYTE / max(seconds, 1e-9):.1f} MB/s)"
+                )
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+    elapsed = time.perf_counter() - started
+    total = sum(size for _, _, size in uploads)
+    print(
+        f"uploaded {len(uploads)} draft asset(s): {total / MEGABYTE:.1f} MB in "
+        f"{elapsed:.1f}s, {total / MEGABYTE / max(elapsed, 1e-9):.1f} MB/s aggregate"
+    )
+
+
 def load_manifest(path: Path, tag: str, title: str) -> dict:
     if not path.exists():
         return {
@@ -159,6 +351,31 @@ def load_manifest(path: Path, tag: str, title: str) -> dict:
     return data
 
 
+def write_manifest(tag: str, title: str, prepared: list[dict]) -> Path:
+    """Merge ``prepared`` assets into ``releases/<tag>.json`` and return its path."""
+    MANIFEST_DIR.mkdir(exist_ok=True)
+    manifest_path = MANIFEST_DIR / f"{tag}.json"
+    manifest = load_manifest(manifest_path, tag, title)
+    merged = {asset["name"]: asset for asset in manifest.get("assets", [])}
+    for asset in prepared:
+        current = merged.get(asset["name"])
+        if current and current != asset:
+            raise ReleaseError(
+                f"manifest already declares different content for {asset['name']}"
+            )
+        merged[asset["name"]] = asset
+    manifest["title"] = title
+    manifest["assets"] = sorted(
+        merged.values(),
+        key=lambda item: (item["name"].endswith(".blockmap"), item["name"]),
+    )
+    manifest_path.write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2) + "\n",
+        encoding="utf-8",
+    )
+    return manifest_path
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Prepare a GitHub Draft Release without committing binaries to Git"
@@ -172,99 +389,173 @@ def main() -> int:
         metavar="LOCAL_FILE=TOS_KEY",
         help="repeat for every architecture/platform asset",
     )
+    parser.add_argument(
+        "--hash-jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="hashing processes (default: one per asset, up to the CPU count)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="concurrent draft asset uploads (default: 1, one after another)",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=("gh", "api"),
+        default="gh",
+        help="use the gh CLI per call, or one keep-alive REST client (default: gh)",
+    )
+    parser.add_argument(
+        "--repo",
+        metavar="OWNER/NAME",
+        help="GitHub repository (default: ask gh repo view)",
+    )
+    parser.add_argument(
+        "--updater-version",
+        metavar="VERSION",
+        help="also write latest.yml/latest-mac.yml for the ota/ packages at VERSION",
+    )
+    add_cache_arguments(parser)
+    timings.add_timings_argument(parser)
     args = parser.parse_args()
 
+    status = "failed"
+    blockmap_dir: Path | None = None
     try:
         if not TAG_RE.fullmatch(args.tag):
             raise ReleaseError(
                 "tag must be 3-128 lowercase letters, digits, dots, underscores or hyphens"
             )
-        repository_result = run_gh("repo", "view", "--json", "nameWithOwner")
-        repository = json.loads(repository_result.stdout)["nameWithOwner"]
+        if args.repo:
+            repository = args.repo
+        else:
+            with timings.phase("repository"):
+                repository_result = run_gh("repo", "view", "--json", "nameWithOwner")
+            repository = json.loads(repository_result.stdout)["nameWithOwner"]
         assets = [parse_asset(value) for value in args.asset]
         if len({name for _, _, name in assets}) != len(assets):
             raise ReleaseError("duplicate normalized GitHub Release asset name")
         if len({key for _, key, _ in assets}) != len(assets):
             raise ReleaseError("duplicate TOS key")
+        # Updater packages get a generated blockmap unless one is passed in.
+        keys = {key for _, key, _ in assets}
+        if args.updater_version:
+            for key in keys:
+                if is_updater_package(key):
+                    updater_platform(key)
+        blockmaps = [
+            is_updater_package(key) and f"{key}.blockmap" not in keys
+            for _, key, _ in assets
+        ]
+        catalog = ReleaseCatalog(ROOT)
+        for tos_key in sorted(
+            keys | {f"{key}.blockmap" for (_, key, _), wanted in zip(assets, blockmaps) if wanted}
+        ):
+            owner = catalog.assets_by_key.get(tos_key)
+            if owner and owner.tag != args.tag:
+                raise ReleaseError(f"TOS key already declared by {owner.manifest}: {tos_key}")
+
+        with timings.phase("hash") as phase:
+            digests = digest_files(
+                [source for source, _, _ in assets],
+                args.hash_jobs,
+                cache_from_arguments(args),
+                args.verify_cache,
+                blockmaps,
+            )
+            phase.bytes = sum(result.size for result in digests if not result.cached)
+        packages = [
+            (tos_key, result)
+            for (_, tos_key, _), result in zip(assets, digests)
+            if is_updater_package(tos_key)
+        ]
+        if any(blockmaps):
+            blockmap_dir = Path(tempfile.mkdtemp(prefix="xiaor-blockmap-"))
+            for (source, tos_key, _), result in list(zip(assets, digests)):
+                if result.blockmap is None:
+                    continue
+                generated = write_blockmap(blockmap_dir, source, tos_key, result.blockmap)
+                assets.append(generated)
+                digests.append(digest_file(generated[0]))
+                print(f"generated blockmap {generated[2]} for {PurePosixPath(tos_key).name}")
+        for (_, tos_key, asset_name), result in zip(assets, digests):
+            if result.cached:
+                print(f"reused cached digest for {asset_name}: {result.size} bytes")
+            else:
+                print(
+                    f"hashed {asset_name}: {result.size} bytes, "
+                    f"{result.megabytes_per_second:.1f} MB/s"
+                )
+            if is_updater_package(tos_key):
+                print(f"  electron-updater sha512: {result.sha512}")
+            for other in catalog.keys_by_sha256.get(result.sha256, []):
+                if other != tos_key:
+                    print(f"  identical content already published as {other}")
 
-        info = ensure_draft_release(repository, args.tag, args.title)
+        client = api_client(repository) if args.transport == "api" else None
+        with timings.phase("draft_release"):
+            info = ensure_draft_release(repository, args.tag, args.title, client)
         existing_assets = {asset["name"]: asset for asset in info.get("assets", [])}
-        prepared: list[dict] = []
-        for source, tos_key, asset_name in assets:
-            digest = sha256(source)
+        uploads: list[tuple[Path, str, int]] = []
+        for (source, _, asset_name), result in zip(assets, digests):
             if asset_name in existing_assets:
                 verify_existing_asset(
-                    existing_assets[asset_name], source.stat().st_size, digest
+                    existing_assets[asset_name], result.size, result.sha256
                 )
                 print(f"verified existing draft asset: {asset_name}")
             else:
-                if asset_name == source.name:
-                    upload_path = source
-                    run_gh(
-                        "release",
-                        "upload",
-                        args.tag,
-                        str(upload_path),
-                        "--repo",
-                        repository,
-                    )
-                else:
-                    with tempfile.TemporaryDirectory(
-                        prefix="xiaor-release-name-", dir=source.parent
-                    ) as directory:
-                        upload_path = Path(directory) / asset_name
-                        try:
-                            os.link(source, upload_path)
-                        except OSError:
-                            shutil.copyfile(source, upload_path)
-                        run_gh(
-                            "release",
-                            "upload",
-                            args.tag,
-                            str(upload_path),
-                            "--repo",
-                            repository,
-                        )
-                print(f"uploaded draft asset: {asset_name}")
-            prepared.append(
-                {
-                    "name": asset_name,
-                    "tos_key": tos_key,
-                    "size": source.stat().st_size,
-                    "sha256": digest,
-                }
-            )
+                uploads.append((source, asset_name, result.size))
+        try:
+            with timings.phase("upload") as phase:
+                upload_assets(repository, args.tag, uploads, args.jobs, info, client)
+                phase.bytes = sum(size for _, _, size in uploads)
+        finally:
+            if client is not None:
+                print(f"GitHub API requests: {client.requests}")
+                client.close()
 
-        MANIFEST_DIR.mkdir(exist_ok=True)
-        manifest_path = MANIFEST_DIR / f"{args.tag}.json"
-        manifest = load_manifest(manifest_path, args.tag, args.title)
-        merged = {asset["name"]: asset for asset in manifest.get("assets", [])}
-        for asset in prepared:
-            current = merged.get(asset["name"])
-            if current and current != asset:
-                raise ReleaseError(
-                    f"manifest already declares different content for {asset['name']}"
-                )
-            merged[asset["name"]] = asset
-        manifest["title"] = args.title
-        manifest["assets"] = sorted(
-            merged.values(),
-            key=lambda item: (item["name"].endswith(".blockmap"), item["name"]),
-        )
-        manifest_path.write_text(
-            json.dumps(manifest, ensure_ascii=False, indent=2) + "\n",
-            encoding="utf-8",
-        )
+        prepared = [
+            {
+                "name": asset_name,
+                "tos_key": tos_key,
+                "size": result.size,
+                "sha256": result.sha256,
+            }
+            for (_, tos_key, asset_name), result in zip(assets, digests)
+        ]
+
+        with timings.phase("manifest_write"):
+            manifest_path = write_manifest(args.tag, args.title, prepared)
+            if args.updater_version and packages:
+                for path in write_updater_manifests(args.updater_version, packages):
+                    print(f"wrote updater manifest: {path.relative_to(ROOT)}")
         print(f"wrote public manifest: {manifest_path.relative_to(ROOT)}")
         print("next: update data.json/updater manifests, validate, commit, push and open a PR")
+        status = "ok"
         return 0
-    except (json.JSONDecodeError, OSError, ReleaseError, subprocess.CalledProcessError) as exc:
+    except (
+        DigestCacheError,
+        GitHubApiError,
+        OSError,
+        ReleaseError,
+        subprocess.CalledProcessError,
+        ValueError,
+    ) as exc:
         if isinstance(exc, subprocess.CalledProcessError):
             detail = (exc.stderr or exc.stdout or str(exc)).strip()
         else:
             detail = str(exc)
         print(f"release preparation failed: {detail}", file=sys.stderr)
         return 1
+    finally:
+        if blockmap_dir is not None:
+            shutil.rmtree(blockmap_dir, ignore_errors=True)
+        if args.timings_json:
+            timings.write_report(args.timings_json, "prepare_release", status)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Pre-render the download list from data.json into index.html.
+
+The grouped product cards for every language in the page's ``langData`` are
+written between the ``prerender`` markers inside ``<section id="list">``, so
+visitors and crawlers get the full list without running JavaScript. The
+page script only switches the visible language block and opens the history,
+tools and QR code dialogs. Logos get a ``srcset`` of the variants listed in
+``image-variants.json`` when ``build_images.py`` has run, as it does in the
+deployment workflows; the committed page is rendered without it and uses the
+original logos. ``validate_release.py`` fails when the markup no longer
+matches ``data.json``; rerun this script after editing it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import tempfile
+from urllib.parse import quote, urljoin
+
+from build_images import ImageBuildError, read_manifest, srcset
+from release_catalog import ROOT, strip_fingerprint
+
+
+RELEASE_BASE_URL = "https://software.xiao-r.com/"
+DEFAULT_LANG = "en"
+START_MARKER = "<!-- prerender:start -->"
+END_MARKER = "<!-- prerender:end -->"
+LIST_RE = re.compile(
+    r'(<section id="list">)\s*(?:' + re.escape(START_MARKER) + r".*?"
+    + re.escape(END_MARKER) + r"\s*|Loading\.\.\.)(</section>)",
+    re.S,
+)
+LANG_DATA_RE = re.compile(r"const langData = (\{.*?\n  \});", re.S)
+SUPPORTED_PLATFORMS = ("android", "windows", "ios", "mac")
+PLATFORM_LABELS = {"android": "Android", "windows": "Windows", "mac": "Mac", "ios": "iOS"}
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+# Characters the browser's URL parser leaves alone in a path.
+URL_PATH_SAFE = "/:@!$&'()*+,;=-._~%[]|^"
+
+
+class PrerenderError(RuntimeError):
+    pass
+
+
+def lang_data(index_text: str) -> dict[str, dict[str, str]]:
+    """The page's own ``langData`` labels, so both renderers share one copy."""
+    match = LANG_DATA_RE.search(index_text)
+    if not match:
+        raise PrerenderError("index.html does not define langData")
+    try:
+        return json.loads(match.group(1))
+    except ValueError as exc:
+        raise PrerenderError(f"index.html langData is not plain JSON: {exc}") from exc
+
+
+def text_by_lang(value, lang: str):
+    if isinstance(value, dict):
+        return value.get(lang) or value.get(DEFAULT_LANG)
+    return value
+
+
+def resolve_download_url(path: str) -> str:
+    if re.match(r"^https?://", path, re.I):
+        return path
+    if path.startswith("//"):
+        return f"https:{path}"
+    return urljoin(RELEASE_BASE_URL, quote(re.sub(r"^\./", "", path), safe=URL_PATH_SAFE))
+
+
+def entry_platform(entry: dict) -> str:
+    """Explicit ``platform`` first; link inference only for legacy entries."""
+    if entry.get("platform") in SUPPORTED_PLATFORMS:
+        return entry["platform"]
+    btn_names = entry.get("btnNames")
+    english = btn_names.get("en") if isinstance(btn_names, dict) else None
+    for link in entry.get("link") or []:
+        if "android" in link:
+            return "android"
+        if ".dmg" in link.lower():
+            return "mac"
+        if any(suffix in link for suffix in IMAGE_SUFFIXES):
+            return "ios"
+        if "pc" in link or any("windows" in name.lower() for name in english or []):
+            return "windows"
+    return "other"
+
+
+def group_by_software(data: list, lang: str) -> dict[str, dict]:
+    grouped: dict[str, dict] = {}
+    for number, entry in enumerate(data):
+        if not isinstance(entry, dict):
+            raise PrerenderError("every data.json entry must be an object")
+        name = entry.get("name") or {}
+        key = str(name.get(lang) or name.get(DEFAULT_LANG))
+        software = grouped.setdefault(
+            key,
+            {
+                "name": name,
+                "desc": entry.get("desc"),
+                "logoSrc": entry.get("logoSrc") or "",
+                "platformVersions": entry.get("platformVersions") or {},
+                "platforms": {},
+            },
+        )
+        software["platforms"].setdefault(entry_platform(entry), []).append((number, entry))
+    return grouped
+
+
+def button_style(url: str, label: str, platform: str) -> tuple[str, str]:
+    """``(class, icon)`` of a download button, matching the page's rules."""
+    is_image = strip_fingerprint(url).endswith(IMAGE_SUFFIXES)
+    if is_image and platform == "ios":
+        return "ios", "fas fa-qrcode"
+    if platform == "android" or "android" in label:
+        return "android", "fab fa-android"
+    if platform == "windows" or "win" in label or "pc" in label:
+        return "windows", "fab fa-windows"
+    if platform == "mac" or "mac" in label:
+        return "mac", "fab fa-apple"
+    if platform == "ios" or "ios" in label:
+        return "ios", "fab fa-apple"
+    if is_image:
+        return "ios", "fas fa-qrcode"
+    return "", "fas fa-download"
+
+
+def render_buttons(
+    number: int, entry: dict, platform: str, name: str, labels: dict[str, str], lang: str
+) -> list[str]:
+    btn_names = text_by_lang(entry.get("btnNames"), lang) or []
+    history_count = len(entry.get("oldVersion") or [])
+    tool_count = len(entry.get("tools") or []) if entry.get("hasTools") else 0
+    item_platform = entry.get("platform") or platform
+    esc = html.escape
+    lines = []
+    for i, url in enumerate(entry.get("link") or []):
+        label = btn_names[i] if i < len(btn_names) and btn_names[i] else ""
+        cls, icon = button_style(url, label.lower() or "download", item_platform)
+        text = esc(label or labels["download"])
+        lines.append('      <div class="platform-button-group">')
+        if strip_fingerprint(url).endswith(IMAGE_SUFFIXES):
+            lines.append(
+                f'        <button class="btn {cls} image-btn" data-image="{esc(url)}">'
+                f'<i class="{icon}"></i> {text}</button>'
+            )
+        else:
+            lines.append(
+                f'        <a class="btn {cls}" href="{esc(resolve_download_url(url))}" '
+                f'download target="_blank" rel="noopener"><i class="{icon}"></i> {text}</a>'
+            )
+        if history_count:
+            lines.append(
+                f'        <button class="history-btn" data-software="{esc(name)}" '
+                f'data-platform="{platform}" data-entry="{number}">'
+                f'<i class="fas fa-history"></i> {esc(labels["history"])}</button>'
+            )
+        if tool_count:
+            lines.append(
+                f'        <button class="tools-btn" data-software="{esc(name)}" '
+                f'data-entry="{number}"><i class="fas fa-tools"></i> '
+                f'{esc(labels["tools"])}</button>'
+            )
+        lines.append("      </div>")
+    return lines
+
+
+def render_logo(logo: str, name: str, images: dict) -> str:
+    """``<img>`` for a card logo, with the built variants as ``srcset``."""
+    esc = html.escape
+    match = re.search(r'src="([^"]+)"', logo)
+    if match:
+        logo = match.group(1)
+    src, candidates = srcset(images, logo)
+    if candidates is None:
+        return f'<img src="{esc(src)}" alt="{esc(name)}">'
+    return f'<img src="{esc(src)}" srcset="{esc(candidates)}" alt="{esc(name)}">'
+
+
+def render_list(
+    data: list, lang: str, labels: dict[str, str], images: dict | None = None
+) -> list[str]:
+    esc = html.escape
+    lines = []
+    for software in group_by_software(data, lang).values():
+        name = str(text_by_lang(software["name"], lang))
+        desc = str(text_by_lang(software["desc"], lang) or "")
+        versions = [
+            f'<span class="version-tag {esc(platform)}">'
+            f"{esc(PLATFORM_LABELS.get(platform, platform))}: {esc(version)}</span>"
+            for platform, version in software["platformVersions"].items()
+            if version and version not in ("v1.0", "vunknown")
+        ]
+        lines += [
+            '  <div class="software-card">',
+            '    <div class="software-header">',
+            f'      <div class="logo-area">{render_logo(software["logoSrc"], name, images or {})}'
+            "</div>",
+            '      <div class="title-area">',
+            f"        <h2>{esc(name)}</h2>",
+            f'        <p class="desc">{esc(desc)}</p>',
+        ]
+        if versions:
+            lines.append(f'        <div class="version-info">{"".join(versions)}</div>')
+        lines += ["      </div>", "    </div>", '    <div class="platforms-area">']
+        for platform, items in software["platforms"].items():
+            for number, entry in items:
+                lines += render_buttons(number, entry, platform, name, labels, lang)
+        lines += ["    </div>", "  </div>"]
+    return lines
+
+
+def prerendered_list(data: list, index_text: str, images: dict | None = None) -> str:
+    """Markup for ``<section id="list">``, one block per language."""
+    if not isinstance(data, list):
+        raise PrerenderError("data.json must contain a top-level list")
+    lines = [START_MARKER]
+    for lang, labels in lang_data(index_text).items():
+        hidden = "" if lang == DEFAULT_LANG else " hidden"
+        lines.append(f'<div class="prerendered-list" data-prerendered="{lang}"{hidden}>')
+        lines += render_list(data, lang, labels, images)
+        lines.append("</div>")
+    lines.append(END_MARKER)
+    return "\n".join(lines)
+
+
+def apply_prerender(index_text: str, data: list, images: dict | None = None) -> str:
+    """``index.html`` with its download list re-rendered from ``data``.
+
+    ``images`` is the ``images`` object of ``image-variants.json``; logos
+    without variants keep their plain ``src``.
+    """
+    if not LIST_RE.search(index_text):
+        raise PrerenderError('index.html has no <section id="list"> to pre-render into')
+    markup = prerendered_list(data, index_text, images)
+    return LIST_RE.sub(lambda match: f"{match[1]}\n{markup}\n{match[2]}", index_text, count=1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--check", action="store_true", help="fail when index.html is stale instead of writing"
+    )
+    args = parser.parse_args()
+
+    index_path = ROOT / "index.html"
+    try:
+        index_text = index_path.read_text(encoding="utf-8")
+        data = json.loads((ROOT / "data.json").read_text(encoding="utf-8-sig"))
+        rendered = apply_prerender(index_text, data, read_manifest()["images"])
+        if rendered == index_text:
+            print("index.html download list is up to date")
+            return 0
+        if args.check:
+            raise PrerenderError(
+                "index.html download list does not match data.json; "
+                "run python3 scripts/prerender_index.py"
+            )
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", newline="", dir=index_path.parent, delete=False
+        ) as handle:
+            handle.write(rendered)
+        os.chmod(handle.name, index_path.stat().st_mode)
+        os.replace(handle.name, index_path)
+        print("updated index.html download list")
+    except (PrerenderError, ImageBuildError, OSError, ValueError) as exc:
+        print(f"pre-render failed: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
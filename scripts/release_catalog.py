@@ -0,0 +1,361 @@
+"""Parse the Git control plane once and index it for release tooling."""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from urllib.parse import urlparse
+
+import timings
+
+
+ROOT = Path(__file__).resolve().parents[1]
+TOS_DOWNLOAD_HOSTS = {"software.xiao-r.com"}
+SUPERSEDED_REGISTRY = "releases/audit/superseded-assets.json"
+# Metadata file -> TOS key prefix its relative url/path values resolve against.
+PLAIN_UPDATER_FILES = {
+    "update/software.yaml": "",
+    "firmware/mxbit/version.yaml": "firmware/mxbit/",
+    "firmware/xr-car-tail/version.yaml": "firmware/xr-car-tail/",
+    "software/pc/latest.yml": "software/pc/",
+    "software/pc/moxin/latest.yml": "software/pc/moxin/",
+}
+ELECTRON_UPDATER_FILES = {
+    "ota/xr-studio/latest.yml": "ota/xr-studio/",
+    "ota/xr-studio/latest-mac.yml": "ota/xr-studio/",
+}
+ELECTRON_PACKAGE_SUFFIXES = {".dmg", ".exe", ".zip"}
+URL_LINE_RE = re.compile(r"^\s*(?:-\s*)?(?:url|path):\s*(.+?)\s*$")
+SCALAR_LINE_RE = re.compile(r"^\s*([A-Za-z0-9_-]+):\s*['\"]?(.*?)['\"]?\s*$")
+LIST_ITEM_RE = re.compile(r"^\s*-\s*['\"]?([^:'\"]+?)['\"]?\s*$")
+FIELD_RE = re.compile(r"^(-\s+)?([A-Za-z0-9_]+):\s*['\"]?(.*?)['\"]?\s*$")
+# Page assets served from the repository; only these carry a content
+# fingerprint in their name, ``name.<sha256[:12]>.ext`` (see fingerprint_assets.py).
+STATIC_ASSET_DIRS = ("software/image", "software/ios", "docs/assets")
+STATIC_ASSET_FILES = ("logo.png", "style.css")
+# Logo variants from build_images.py, already named by their own digest.
+VARIANT_DIR = "software/image/variants"
+FINGERPRINT_RE = re.compile(r"(?<=[^/.])\.[0-9a-f]{12}(?=\.[A-Za-z0-9]+$)")
+
+
+def strip_fingerprint(value: str) -> str:
+    return FINGERPRINT_RE.sub("", value)
+
+
+def is_static_asset(key: str) -> bool:
+    """Whether a repository-relative key is a fingerprinted page asset."""
+    if key.startswith(f"{VARIANT_DIR}/"):
+        return False
+    return key in STATIC_ASSET_FILES or key.startswith(
+        tuple(f"{directory}/" for directory in STATIC_ASSET_DIRS)
+    )
+
+
+def normalize_object(value: str, base: str = "") -> str | None:
+    value = value.strip().strip("'\"")
+    if value.startswith("//"):
+        parsed = urlparse(f"https:{value}")
+        if parsed.hostname not in TOS_DOWNLOAD_HOSTS:
+            return None
+        return parsed.path.lstrip("/")
+    if value.startswith(("http://", "https://")):
+        parsed = urlparse(value)
+        if parsed.hostname not in TOS_DOWNLOAD_HOSTS:
+            return None
+        return parsed.path.lstrip("/")
+    if value.startswith("./"):
+        value = value[2:]
+    key = f"{base}{value}".lstrip("/")
+    # Release files may carry a short commit hash; only page assets are fingerprinted.
+    source = strip_fingerprint(key)
+    return source if is_static_asset(source) else key
+
+
+def parse_yaml_urls(text: str, base: str = "") -> set[str]:
+    objects: set[str] = set()
+    for line in text.splitlines():
+        match = URL_LINE_RE.match(line)
+        if not match:
+            continue
+        key = normalize_object(match.group(1), base)
+        if key:
+            objects.add(key)
+    return objects
+
+
+def catalog_objects(entries: list) -> set[str]:
+    """TOS keys behind every link, old version and tool of data.json entries."""
+    objects: set[str] = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("every data.json entry must be an object")
+        for field in ("link", "oldVersion"):
+            values = entry.get(field, [])
+            if not isinstance(values, list):
+                raise ValueError(f"data.json field {field} must be a list")
+            for value in values:
+                key = normalize_object(str(value))
+                if key:
+                    objects.add(key)
+        for tool in entry.get("tools", []):
+            if isinstance(tool, dict) and tool.get("file_path"):
+                key = normalize_object(str(tool["file_path"]))
+                if key:
+                    objects.add(key)
+    return objects
+
+
+@dataclass(frozen=True)
+class ManifestAsset:
+    manifest: str
+    tag: str
+    name: str
+    tos_key: str
+    size: int
+    sha256: str
+
+
+class ReleaseCatalog:
+    """Read-once view of ``data.json``, release manifests and updater YAMLs.
+
+    Every source file is read on first use and kept; indexes are built
+    lazily from the parsed data. Parsing failures raise ``ValueError`` with
+    the same messages ``validate_release.py`` reports. Structural validation
+    stays in the validator, so indexes skip malformed records silently.
+    """
+
+    def __init__(self, root: Path = ROOT):
+        self.root = root
+        self._texts: dict[str, str] = {}
+        self._urls: dict[tuple[str, str], set[str]] = {}
+        self._scalars: dict[str, dict[str, list[str]]] = {}
+
+    def text(self, relative: str) -> str:
+        if relative not in self._texts:
+            with timings.phase("read_files") as phase:
+                data = (self.root / relative).read_bytes()
+                self._texts[relative] = data.decode("utf-8-sig")
+                phase.bytes += len(data)
+        return self._texts[relative]
+
+    @cached_property
+    def data(self) -> list:
+        text = self.text("data.json")
+        try:
+            with timings.phase("parse_json"):
+                data = json.loads(text)
+        except (OSError, json.JSONDecodeError) as exc:
+            raise ValueError(f"invalid data.json: {exc}") from exc
+        if not isinstance(data, list):
+            raise ValueError("data.json must contain a top-level list")
+        return data
+
+    @cached_property
+    def manifest_paths(self) -> list[str]:
+        """Repository-relative ``releases/*.json`` paths, sorted."""
+        return [
+            path.relative_to(self.root).as_posix()
+            for path in sorted((self.root / "releases").glob("*.json"))
+        ]
+
+    @cached_property
+    def manifests(self) -> dict[str, object]:
+        """Parsed release manifests keyed by repository-relative path, sorted."""
+        manifests: dict[str, object] = {}
+        for relative in self.manifest_paths:
+            text = self.text(relative)
+            try:
+                with timings.phase("parse_json"):
+                    manifests[relative] = json.loads(text)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"invalid release manifest {relative}: {exc}") from exc
+        return manifests
+
+    @cached_property
+    def superseded(self) -> object | None:
+        if not (self.root / SUPERSEDED_REGISTRY).exists():
+            return None
+        text = self.text(SUPERSEDED_REGISTRY)
+        try:
+            with timings.phase("parse_json"):
+                return json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"invalid superseded asset registry: {exc}") from exc
+
+    @cached_property
+    def superseded_keys(self) -> set[str]:
+        """TOS keys registered as superseded: kept for audit, never served."""
+        return {
+            record["tos_key"]
+            for record in self.superseded or []
+            if isinstance(record, dict) and isinstance(record.get("tos_key"), str)
+        }
+
+    @cached_property
+    def assets(self) -> list[ManifestAsset]:
+        assets: list[ManifestAsset] = []
+        for relative, manifest in self.manifests.items():
+            if not isinstance(manifest, dict) or not isinstance(
+                manifest.get("assets"), list
+            ):
+                continue
+            for asset in manifest["assets"]:
+                try:
+                    assets.append(
+                        ManifestAsset(
+                            manifest=relative,
+                            tag=manifest.get("tag"),
+                            name=asset["name"],
+                            tos_key=asset["tos_key"],
+                            size=asset["size"],
+                            sha256=asset["sha256"],
+                        )
+                    )
+                except (KeyError, TypeError):
+                    continue
+        return assets
+
+    @cached_property
+    def assets_by_key(self) -> dict[str, ManifestAsset]:
+        index: dict[str, ManifestAsset] = {}
+        for asset in self.assets:
+            index.setdefault(asset.tos_key, asset)
+        return index
+
+    @cached_property
+    def keys_by_sha256(self) -> dict[str, list[str]]:
+        index: dict[str, list[str]] = {}
+        for asset in self.assets:
+            index.setdefault(asset.sha256, []).append(asset.tos_key)
+        return index
+
+    @cached_property
+    def duplicate_content(self) -> list[tuple[str, int, list[str]]]:
+        """``(sha256, size, keys)`` for content published under several keys."""
+        groups = []
+        for digest, keys in sorted(self.keys_by_sha256.items()):
+            unique = sorted(set(keys))
+            if len(unique) > 1:
+                groups.append((digest, self.assets_by_key[unique[0]].size, unique))
+        return groups
+
+    @cached_property
+    def manifests_by_tag(self) -> dict[str, str]:
+        return {
+            manifest["tag"]: relative
+            for relative, manifest in self.manifests.items()
+            if isinstance(manifest, dict) and isinstance(manifest.get("tag"), str)
+        }
+
+    @cached_property
+    def entries_by_name(self) -> dict[str, list[dict]]:
+        index: dict[str, list[dict]] = {}
+        for entry in self.data:
+            if isinstance(entry, dict) and isinstance(entry.get("name"), dict):
+                index.setdefault(entry["name"].get("en"), []).append(entry)
+        return index
+
+    def entries_named(self, english_name: str) -> list[dict]:
+        return self.entries_by_name.get(english_name, [])
+
+    def urls(self, relative: str, base: str = "") -> set[str]:
+        if (relative, base) not in self._urls:
+            self._urls[relative, base] = parse_yaml_urls(self.text(relative), base)
+        return self._urls[relative, base]
+
+    def electron_objects(self, relative: str) -> set[str]:
+        """Updater packages plus their implicit differential blockmaps."""
+        objects = self.urls(relative, ELECTRON_UPDATER_FILES[relative])
+        return objects | {
+            f"{key}.blockmap"
+            for key in objects
+            if Path(key).suffix.lower() in ELECTRON_PACKAGE_SUFFIXES
+        }
+
+    def yaml_scalars(self, relative: str) -> dict[str, list[str]]:
+        """Every ``field: value`` pair and ``- item`` in one scan, at any depth.
+
+        List items are collected under the empty-string field.
+        """
+        if relative not in self._scalars:
+            scalars: dict[str, list[str]] = {}
+            for line in self.text(relative).splitlines():
+                item = LIST_ITEM_RE.match(line)
+                if item:
+                    scalars.setdefault("", []).append(item.group(1))
+                    continue
+                match = SCALAR_LINE_RE.match(line)
+                if match and match.group(2):
+                    scalars.setdefault(match.group(1), []).append(match.group(2))
+            self._scalars[relative] = scalars
+        return self._scalars[relative]
+
+    @cached_property
+    def updater_entries(self) -> dict[str, tuple[str, int]]:
+        """Map electron-updater file names to their ``(sha512, size)`` entries."""
+        entries: dict[str, tuple[str, int]] = {}
+        for relative in ELECTRON_UPDATER_FILES:
+            current: str | None = None
+            fields: dict[str, str] = {}
+            for line in [*self.text(relative).splitlines(), "end:"]:
+                url = re.match(r"^\s+-\s*url:\s*(.+?)\s*$", line)
+                field = re.match(r"^\s+(sha512|size):\s*(.+?)\s*$", line)
+                if url or not line.startswith((" ", "\t")):
+                    if current and {"sha512", "size"} <= set(fields):
+                        entries.setdefault(
+                            current, (fields["sha512"], int(fields["size"]))
+                        )
+                    current = url.group(1).strip("'\"") if url else None
+                    fields = {}
+                elif field and current:
+                    fields.setdefault(field.group(1), field.group(2).strip("'\""))
+        return entries
+
+    @cached_property
+    def firmware_deltas(self) -> dict[str, list[dict[str, str]]]:
+        """``deltas:`` items of every firmware ``version.yaml``, in file order."""
+        deltas: dict[str, list[dict[str, str]]] = {}
+        for relative in PLAIN_UPDATER_FILES:
+            if not relative.startswith("firmware/"):
+                continue
+            items: list[dict[str, str]] = []
+            indent: int | None = None
+            for line in self.text(relative).splitlines():
+                stripped = line.strip()
+                depth = len(line) - len(line.lstrip())
+                if indent is None:
+                    if stripped == "deltas:":
+                        indent = depth
+                    continue
+                if not stripped:
+                    continue
+                if depth < indent or (depth == indent and not stripped.startswith("-")):
+                    indent = None
+                    if stripped == "deltas:":
+                        indent = depth
+                    continue
+                match = FIELD_RE.match(stripped)
+                if not match:
+                    continue
+                if match.group(1) or not items:
+                    items.append({})
+                items[-1].setdefault(match.group(2), match.group(3))
+            deltas[relative] = items
+        return deltas
+
+    @cached_property
+    def data_objects(self) -> set[str]:
+        return catalog_objects(self.data)
+
+    @cached_property
+    def referenced_objects(self) -> set[str]:
+        """Every TOS key reachable from public metadata."""
+        objects = set(self.data_objects)
+        for relative, base in PLAIN_UPDATER_FILES.items():
+            objects |= self.urls(relative, base)
+        for relative in ELECTRON_UPDATER_FILES:
+            objects |= self.electron_objects(relative)
+        return objects
@@ -0,0 +1,115 @@
+"""Process-wide phase timers and counters for the release scripts.
+
+Scripts wrap their stages in :func:`phase` and bump :func:`count` where work
+happens; ``--timings-json PATH`` then writes :func:`report` for CI to archive.
+The report schema is versioned, keys are sorted and every standard counter is
+present even when zero, so reports from different runs diff cleanly. Phases
+may nest, in which case the outer phase includes the inner one's time.
+Work done inside worker processes is only visible through the parent's
+phases and counters.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+REPORT_VERSION = 1
+STANDARD_COUNTERS = ("bytes_hashed", "http_requests", "retries", "subprocesses")
+
+
+class Phase:
+    """Accumulated wall time of one named phase; ``bytes`` enables throughput."""
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.calls = 0
+        self.bytes = 0
+
+
+_lock = threading.Lock()
+_started = time.time()
+_clock = time.perf_counter()
+_phases: dict[str, Phase] = {}
+_counters: dict[str, int] = {}
+
+
+def reset() -> None:
+    global _started, _clock
+    with _lock:
+        _started = time.time()
+        _clock = time.perf_counter()
+        _phases.clear()
+        _counters.clear()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[Phase]:
+    with _lock:
+        record = _phases.setdefault(name, Phase())
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            record.seconds += elapsed
+            record.calls += 1
+
+
+def count(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def report(tool: str, status: str) -> dict:
+    with _lock:
+        phases = {}
+        for name, record in _phases.items():
+            entry = {"calls": record.calls, "seconds": round(record.seconds, 6)}
+            if record.bytes:
+                entry["bytes"] = record.bytes
+                entry["megabytes_per_second"] = round(
+                    record.bytes / (1024 * 1024) / max(record.seconds, 1e-9), 3
+                )
+            phases[name] = entry
+        counters = {name: 0 for name in STANDARD_COUNTERS}
+        counters.update(_counters)
+        return {
+            "version": REPORT_VERSION,
+            "tool": tool,
+            "status": status,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(_started)),
+            "total_seconds": round(time.perf_counter() - _clock, 6),
+            "python": platform.python_version(),
+            "phases": phases,
+            "counters": counters,
+        }
+
+
+def write_report(path: Path, tool: str, status: str) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, delete=False
+    ) as handle:
+        json.dump(report(tool, status), handle, indent=2, sort_keys=True)
+        handle.write("\n")
+    os.replace(handle.name, path)
+
+
+def add_timings_argument(parser) -> None:
+    parser.add_argument(
+        "--timings-json",
+        type=Path,
+        metavar="PATH",
+        help="write per-phase timings and counters as JSON to PATH",
+    )
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Check every referenced TOS object against one bulk listing of the bucket."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tos_store import ObjectInfo, ObjectStoreError, open_store
+from release_catalog import ReleaseCatalog
+from validate_release import validate
+
+
+INVENTORY_PREFIXES = ("software/", "firmware/", "ota/")
+CACHE_VERSION = 1
+DEFAULT_TTL = 3600
+
+
+def list_inventory(store, prefixes=INVENTORY_PREFIXES) -> dict[str, ObjectInfo]:
+    inventory: dict[str, ObjectInfo] = {}
+    for prefix in prefixes:
+        for info in store.list(prefix):
+            inventory[info.key] = info
+    return inventory
+
+
+def read_cache(path: Path, ttl: float) -> dict[str, ObjectInfo] | None:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(data, dict)
+        or data.get("version") != CACHE_VERSION
+        or data.get("prefixes") != list(INVENTORY_PREFIXES)
+        or time.time() - data.get("created", 0) > ttl
+    ):
+        return None
+    return {
+        key: ObjectInfo(key=key, size=size, etag=etag, meta=meta)
+        for key, (size, etag, meta) in data.get("objects", {}).items()
+    }
+
+
+def write_cache(path: Path, inventory: dict[str, ObjectInfo]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, delete=False
+    ) as handle:
+        json.dump(
+            {
+                "version": CACHE_VERSION,
+                "created": time.time(),
+                "prefixes": list(INVENTORY_PREFIXES),
+                "objects": {
+                    key: [info.size, info.etag, info.meta]
+                    for key, info in sorted(inventory.items())
+                },
+            },
+            handle,
+        )
+    os.replace(handle.name, path)
+
+
+def manifest_sizes(catalog: ReleaseCatalog) -> dict[str, int]:
+    return {key: asset.size for key, asset in catalog.assets_by_key.items()}
+
+
+def check(
+    objects: set[str], inventory: dict[str, ObjectInfo], sizes: dict[str, int]
+) -> list[str]:
+    problems: list[str] = []
+    for key in sorted(objects):
+        info = inventory.get(key)
+        if info is None:
+            problems.append(f"missing TOS object: {key}")
+        elif key in sizes and info.size != sizes[key]:
+            problems.append(
+                f"TOS object size {info.size} does not match manifest {sizes[key]}: {key}"
+            )
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Verify referenced TOS objects against a bulk bucket inventory"
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        help="reuse an inventory snapshot at this path while it is fresh; objects "
+        "deleted after the snapshot go unnoticed until it expires",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help=f"seconds a cached inventory stays valid (default: {DEFAULT_TTL})",
+    )
+    args = parser.parse_args()
+
+    try:
+        catalog = ReleaseCatalog()
+        objects = validate(catalog)
+        uncovered = sorted(key for key in objects if not key.startswith(INVENTORY_PREFIXES))
+        if uncovered:
+            raise ValueError(
+                "referenced objects outside inventory prefixes:\n  " + "\n  ".join(uncovered)
+            )
+        sizes = manifest_sizes(catalog)
+        store = open_store()
+
+        inventory = read_cache(args.cache, args.ttl) if args.cache else None
+        source = "cached"
+        # A stale snapshot may predate new uploads, so misses trigger a fresh listing.
+        if inventory is None or check(objects, inventory, sizes):
+            inventory = list_inventory(store)
+            source = "listed"
+            if args.cache:
+                write_cache(args.cache, inventory)
+
+        problems = check(objects, inventory, sizes)
+        if problems:
+            raise ValueError("\n  ".join(["referenced TOS objects failed:", *problems]))
+    except (ObjectStoreError, OSError, ValueError) as exc:
+        print(f"TOS inventory verification failed: {exc}", file=sys.stderr)
+        return 1
+
+    print(
+        f"verified {len(objects)} referenced TOS objects against {source} "
+        f"inventory of {len(inventory)} objects"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,478 @@
+"""TOS object access for release tooling, with a directory-backed stand-in.
+
+``TosObjectStore`` wraps the official SDK (``tos==2.9.0``), imported lazily so
+validation-only jobs never need it. ``LocalObjectStore`` implements the same
+methods on a plain directory; set ``XIAOR_TOS_LOCAL_DIR`` to run the mirror
+and deployment tooling offline against it. ``XIAOR_TOS_LOCAL_FAIL_PARTS``
+(comma-separated part numbers) makes the first upload of each listed part
+fail, to exercise retries and resumed multipart uploads.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Iterator
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class ObjectStoreError(RuntimeError):
+    pass
+
+
+class ObjectExistsError(ObjectStoreError):
+    pass
+
+
+class ObjectChangedError(ObjectStoreError):
+    pass
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    key: str
+    size: int
+    etag: str
+    meta: dict[str, str] = field(default_factory=dict)
+    cache_control: str | None = None
+
+
+def required_env(name: str) -> str:
+    value = os.environ.get(name, "")
+    if not value:
+        raise ValueError(f"missing required environment variable: {name}")
+    return value
+
+
+class TosObjectStore:
+    """Bucket operations on TOS; only ``replace`` may overwrite an existing key."""
+
+    def __init__(self, bucket: str, client=None):
+        if client is None:
+            import tos
+
+            client = tos.TosClientV2(
+                required_env("TOS_ACCESS_KEY_ID"),
+                required_env("TOS_SECRET_ACCESS_KEY"),
+                required_env("TOS_ENDPOINT"),
+                required_env("TOS_REGION"),
+                security_token=os.environ.get("TOS_SECURITY_TOKEN") or None,
+            )
+        self.bucket = bucket
+        self.client = client
+
+    @contextmanager
+    def _errors(self, key: str):
+        from tos.exceptions import TosClientError, TosServerError
+
+        try:
+            yield
+        except TosServerError as exc:
+            if exc.status_code == 409:
+                raise ObjectExistsError(f"object already exists: {key}") from exc
+            if exc.status_code == 412:
+                raise ObjectChangedError(f"object changed concurrently: {key}") from exc
+            raise ObjectStoreError(
+                f"TOS {exc.status_code} {exc.code} for {key}: {exc.message}"
+            ) from exc
+        except TosClientError as exc:
+            raise ObjectStoreError(f"TOS client error for {key}: {exc.message}") from exc
+
+    def head(self, key: str) -> ObjectInfo | None:
+        from tos.exceptions import TosServerError
+
+        try:
+            result = self.client.head_object(self.bucket, key)
+        except TosServerError as exc:
+            if exc.status_code == 404:
+                return None
+            raise ObjectStoreError(f"unable to determine TOS object state: {key}") from exc
+        return ObjectInfo(
+            key=key,
+            size=result.content_length,
+            etag=(result.etag or "").strip('"'),
+            meta=dict(result.meta or {}),
+            cache_control=result.cache_control,
+        )
+
+    def put(
+        self, key: str, data: bytes, meta: dict[str, str], cache_control: str
+    ) -> None:
+        with self._errors(key):
+            self.client.put_object(
+                self.bucket,
+                key,
+                content=data,
+                meta=meta,
+                cache_control=cache_control,
+                forbid_overwrite=True,
+            )
+
+    def replace(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str,
+        cache_control: str,
+        content_encoding: str | None = None,
+        if_match: str | None = None,
+        if_absent: bool = False,
+    ) -> None:
+        """Write a mutable metadata object, overwriting it unless a condition fails.
+
+        ``if_match`` requires the current ETag, ``if_absent`` that the key is new.
+        """
+        with self._errors(key):
+            self.client.put_object(
+                self.bucket,
+                key,
+                content=data,
+                content_type=content_type,
+                cache_control=cache_control,
+                content_encoding=content_encoding,
+                if_match=f'"{if_match}"' if if_match else None,
+                forbid_overwrite=True if if_absent else None,
+            )
+
+    def create_multipart(
+        self, key: str, meta: dict[str, str], cache_control: str
+    ) -> str:
+        with self._errors(key):
+            result = self.client.create_multipart_upload(
+                self.bucket,
+                key,
+                meta=meta,
+                cache_control=cache_control,
+                forbid_overwrite=True,
+            )
+        return result.upload_id
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        with self._errors(key):
+            result = self.client.upload_part(
+                self.bucket, key, upload_id, number, content=data
+            )
+        return result.etag
+
+    def complete_multipart(
+        self, key: str, upload_id: str, parts: list[tuple[int, str]]
+    ) -> None:
+        from tos.models2 import UploadedPart
+
+        with self._errors(key):
+            self.client.complete_multipart_upload(
+                self.bucket,
+                key,
+                upload_id,
+                parts=[UploadedPart(number, etag) for number, etag in sorted(parts)],
+                forbid_overwrite=True,
+            )
+
+    def copy(
+        self, source_key: str, key: str, meta: dict[str, str], cache_control: str
+    ) -> None:
+        """Server-side copy of ``source_key`` to a new ``key``.
+
+        Done as a single-part multipart copy so completion carries the same
+        ``forbid_overwrite`` guarantee as every other write.
+        """
+        upload_id = self.create_multipart(key, meta, cache_control)
+        try:
+            with self._errors(key):
+                result = self.client.upload_part_copy(
+                    self.bucket, key, upload_id, 1, self.bucket, source_key
+                )
+            self.complete_multipart(key, upload_id, [(1, result.etag)])
+        except BaseException:
+            self.abort_multipart(key, upload_id)
+            raise
+
+    def list_parts(self, key: str, upload_id: str) -> dict[int, str]:
+        """Part number -> ETag of an open multipart upload."""
+        parts: dict[int, str] = {}
+        marker = None
+        while True:
+            with self._errors(key):
+                result = self.client.list_parts(
+                    self.bucket, key, upload_id, part_number_marker=marker
+                )
+            for part in result.parts:
+                parts[part.part_number] = (part.etag or "").strip('"')
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        with self._errors(key):
+            self.client.abort_multipart_upload(self.bucket, key, upload_id)
+
+    def read(
+        self,
+        key: str,
+        start: int | None = None,
+        end: int | None = None,
+        etag: str | None = None,
+    ) -> Iterator[bytes]:
+        """Yield the object bytes, optionally only the inclusive range ``start-end``.
+
+        With ``etag`` the read fails instead of mixing bytes from a replaced object.
+        """
+        with self._errors(key):
+            result = self.client.get_object(
+                self.bucket,
+                key,
+                range_start=start,
+                range_end=end,
+                if_match=f'"{etag}"' if etag else None,
+            )
+            while True:
+                chunk = result.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def list(self, prefix: str) -> Iterator[ObjectInfo]:
+        """Yield every object under ``prefix``, 1000 keys and metadata per call."""
+        token = None
+        while True:
+            with self._errors(prefix):
+                result = self.client.list_objects_type2(
+                    self.bucket,
+                    prefix=prefix,
+                    continuation_token=token,
+                    max_keys=1000,
+                    fetch_meta=True,
+                )
+            for item in result.contents:
+                yield ObjectInfo(
+                    key=item.key,
+                    size=item.size,
+                    etag=(item.etag or "").strip('"'),
+                    meta=dict(item.meta or {}),
+                )
+            if not result.is_truncated:
+                return
+            token = result.next_continuation_token
+
+
+class LocalObjectStore:
+    """Directory stand-in for a TOS bucket with the same no-overwrite rules."""
+
+    def __init__(self, root: Path, fail_parts: set[int] | None = None):
+        self.root = Path(root)
+        self.fail_parts = set(fail_parts or ())
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        parts = PurePosixPath(key).parts
+        if not parts or ".." in parts or key.startswith("/"):
+            raise ObjectStoreError(f"unsafe object key: {key}")
+        return self.root.joinpath("objects", *parts)
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / "meta" / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _commit(
+        self, key: str, source: Path, meta: dict[str, str], cache_control: str
+    ) -> None:
+        target = self._path(key)
+        etag = hashlib.md5()
+        with source.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(READ_CHUNK_SIZE), b""):
+                etag.update(chunk)
+        # Check and commit together, like forbid_overwrite on a concurrent writer.
+        with self._lock:
+            if target.exists():
+                source.unlink()
+                raise ObjectExistsError(f"object already exists: {key}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            self._meta_path(key).parent.mkdir(parents=True, exist_ok=True)
+            self._meta_path(key).write_text(
+                json.dumps(
+                    {"etag": etag.hexdigest(), "meta": meta, "cache_control": cache_control}
+                ),
+                encoding="utf-8",
+            )
+            os.replace(source, target)
+
+    def head(self, key: str) -> ObjectInfo | None:
+        path = self._path(key)
+        if not path.is_file():
+            return None
+        try:
+            extra = json.loads(self._meta_path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            extra = {}
+        return ObjectInfo(
+            key=key,
+            size=path.stat().st_size,
+            etag=extra.get("etag", ""),
+            meta=extra.get("meta", {}),
+            cache_control=extra.get("cache_control"),
+        )
+
+    def put(
+        self, key: str, data: bytes, meta: dict[str, str], cache_control: str
+    ) -> None:
+        staging = self.root / "staging" / uuid.uuid4().hex
+        staging.parent.mkdir(parents=True, exist_ok=True)
+        staging.write_bytes(data)
+        self._commit(key, staging, meta, cache_control)
+
+    def replace(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str,
+        cache_control: str,
+        content_encoding: str | None = None,
+        if_match: str | None = None,
+        if_absent: bool = False,
+    ) -> None:
+        target = self._path(key)
+        staging = self.root / "staging" / uuid.uuid4().hex
+        staging.parent.mkdir(parents=True, exist_ok=True)
+        staging.write_bytes(data)
+        with self._lock:
+            current = self.head(key)
+            if if_absent and current is not None:
+                staging.unlink()
+                raise ObjectExistsError(f"object already exists: {key}")
+            if if_match and (current is None or current.etag != if_match):
+                staging.unlink()
+                raise ObjectChangedError(f"object changed concurrently: {key}")
+            meta = {"Content-Type": content_type}
+            if content_encoding:
+                meta["Content-Encoding"] = content_encoding
+            target.parent.mkdir(parents=True, exist_ok=True)
+            self._meta_path(key).parent.mkdir(parents=True, exist_ok=True)
+            self._meta_path(key).write_text(
+                json.dumps(
+                    {
+                        "etag": hashlib.md5(data).hexdigest(),
+                        "meta": meta,
+                        "cache_control": cache_control,
+                    }
+                ),
+                encoding="utf-8",
+            )
+            os.replace(staging, target)
+
+    def copy(
+        self, source_key: str, key: str, meta: dict[str, str], cache_control: str
+    ) -> None:
+        source = self._path(source_key)
+        if not source.is_file():
+            raise ObjectStoreError(f"object not found: {source_key}")
+        staging = self.root / "staging" / uuid.uuid4().hex
+        staging.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, staging)
+        self._commit(key, staging, meta, cache_control)
+
+    def create_multipart(
+        self, key: str, meta: dict[str, str], cache_control: str
+    ) -> str:
+        upload_id = uuid.uuid4().hex
+        directory = self.root / "uploads" / upload_id
+        directory.mkdir(parents=True)
+        (directory / "upload.json").write_text(
+            json.dumps({"key": key, "meta": meta, "cache_control": cache_control}),
+            encoding="utf-8",
+        )
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        directory = self.root / "uploads" / upload_id
+        if not directory.is_dir():
+            raise ObjectStoreError(f"unknown multipart upload: {upload_id}")
+        with self._lock:
+            injected = number in self.fail_parts
+            self.fail_parts.discard(number)
+        if injected:
+            raise ObjectStoreError(f"injected failure for part {number} of {key}")
+        (directory / f"{number:05d}.part").write_bytes(data)
+        return hashlib.md5(data).hexdigest()
+
+    def list_parts(self, key: str, upload_id: str) -> dict[int, str]:
+        directory = self.root / "uploads" / upload_id
+        if not directory.is_dir():
+            raise ObjectStoreError(f"unknown multipart upload: {upload_id}")
+        return {
+            int(part.stem): hashlib.md5(part.read_bytes()).hexdigest()
+            for part in sorted(directory.glob("*.part"))
+        }
+
+    def complete_multipart(
+        self, key: str, upload_id: str, parts: list[tuple[int, str]]
+    ) -> None:
+        directory = self.root / "uploads" / upload_id
+        upload = json.loads((directory / "upload.json").read_text(encoding="utf-8"))
+        staging = directory / "assembled"
+        with staging.open("wb") as output:
+            for number, etag in sorted(parts):
+                part = directory / f"{number:05d}.part"
+                if hashlib.md5(part.read_bytes()).hexdigest() != etag:
+                    raise ObjectStoreError(f"part {number} ETag mismatch for {key}")
+                with part.open("rb") as handle:
+                    shutil.copyfileobj(handle, output)
+        self._commit(key, staging, upload["meta"], upload["cache_control"])
+        shutil.rmtree(directory)
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        shutil.rmtree(self.root / "uploads" / upload_id, ignore_errors=True)
+
+    def read(
+        self,
+        key: str,
+        start: int | None = None,
+        end: int | None = None,
+        etag: str | None = None,
+    ) -> Iterator[bytes]:
+        info = self.head(key)
+        if info is None:
+            raise ObjectStoreError(f"object not found: {key}")
+        if etag and info.etag != etag:
+            raise ObjectChangedError(f"object changed while reading: {key}")
+        path = self._path(key)
+        remaining = None if end is None else end - (start or 0) + 1
+        with path.open("rb") as handle:
+            handle.seek(start or 0)
+            while remaining is None or remaining > 0:
+                size = READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)
+                chunk = handle.read(size)
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def list(self, prefix: str) -> Iterator[ObjectInfo]:
+        objects = self.root / "objects"
+        if not objects.is_dir():
+            return
+        for path in sorted(objects.rglob("*")):
+            key = path.relative_to(objects).as_posix()
+            if path.is_file() and key.startswith(prefix):
+                info = self.head(key)
+                if info is not None:
+                    yield info
+
+
+def open_store() -> TosObjectStore | LocalObjectStore:
+    """Return the local stand-in when ``XIAOR_TOS_LOCAL_DIR`` is set, else TOS."""
+    local = os.environ.get("XIAOR_TOS_LOCAL_DIR")
+    if local:
+        fail_parts = os.environ.get("XIAOR_TOS_LOCAL_FAIL_PARTS", "")
+        return LocalObjectStore(
+            Path(local), {int(number) for number in fail_parts.split(",") if number.strip()}
+        )
+    return TosObjectStore(required_env("TOS_BUCKET"))
@@ -6,20 +6,36 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
+import os
 import re
 import subprocess
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from pathlib import PurePosixPath
-from urllib.parse import urlparse
 
+import timings
+from asset_digest import BlockMapError, digest_file, verify_blockmap
+from build_images import ImageBuildError, check_variants, read_manifest
+from build_metadata import UPDATE_SOURCE, MetadataBuildError, check_build, compile_updates
+from fingerprint_assets import asset_fingerprints, fingerprint_text, referencing_files
+from prerender_index import PrerenderError, apply_prerender
+from release_catalog import (
+    ELECTRON_UPDATER_FILES,
+    PLAIN_UPDATER_FILES,
+    ROOT,
+    ReleaseCatalog,
+    normalize_object,
+    strip_fingerprint,
+)
 
-ROOT = Path(__file__).resolve().parents[1]
 BINARY_SUFFIXES = {
     ".aab",
     ".apk",
     ".bin",
     ".blockmap",
+    ".delta",
     ".dmg",
     ".exe",
     ".hex",
@@ -28,9 +44,19 @@ BINARY_SUFFIXES = {
 }
 RELEASE_SUFFIXES = BINARY_SUFFIXES | {".jpeg", ".jpg", ".png"}
 PUBLIC_DOWNLOAD_BASE_URL = "https://software.xiao-r.com/"
-TOS_DOWNLOAD_HOSTS = {"software.xiao-r.com"}
 MAX_RELEASE_ASSET_SIZE = 2 * 1024 * 1024 * 1024
+MEGABYTE = 1024 * 1024
 RELEASE_TAG_RE = re.compile(r"^[a-z0-9][a-z0-9._-]{2,127}$")
+VALIDATION_CACHE_VERSION = 1
+FIRMWARE_DELTA_FIELDS = {
+    "from_version",
+    "url",
+    "size",
+    "sha256",
+    "source_size",
+    "source_crc32",
+    "source_sha256",
+}
 SENSITIVE_SUFFIXES = {".env", ".key", ".p8", ".p12", ".pem"}
 SENSITIVE_NAMES = {
     ".env",
@@ -44,197 +70,253 @@ def fail(message: str) -> None:
     raise ValueError(message)
 
 
-def tracked_files() -> list[str]:
-    result = subprocess.run(
-        ["git", "ls-files", "-z"],
-        cwd=ROOT,
-        check=True,
-        capture_output=True,
-    )
+def tracked_files(root: Path = ROOT) -> list[str]:
+    timings.count("subprocesses")
+    with timings.phase("tracked_files"):
+        result = subprocess.run(
+            ["git", "ls-files", "-z"],
+            cwd=root,
+            check=True,
+            capture_output=True,
+        )
     return [item.decode() for item in result.stdout.split(b"\0") if item]
 
 
-def normalize_object(value: str, base: str = "") -> str | None:
-    value = value.strip().strip("'\"")
-    if value.startswith("//"):
-        parsed = urlparse(f"https:{value}")
-        if parsed.hostname not in TOS_DOWNLOAD_HOSTS:
-            return None
-        return parsed.path.lstrip("/")
-    if value.startswith(("http://", "https://")):
-        parsed = urlparse(value)
-        if parsed.hostname not in TOS_DOWNLOAD_HOSTS:
-            return None
-        return parsed.path.lstrip("/")
-    if value.startswith("./"):
-        value = value[2:]
-    return f"{base}{value}".lstrip("/")
-
-
-def data_objects() -> tuple[set[str], list[dict]]:
-    path = ROOT / "data.json"
-    try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError) as exc:
-        fail(f"invalid data.json: {exc}")
-    if not isinstance(data, list):
-        fail("data.json must contain a top-level list")
-
-    objects: set[str] = set()
-    for entry in data:
-        if not isinstance(entry, dict):
-            fail("every data.json entry must be an object")
-        for field in ("link", "oldVersion"):
-            values = entry.get(field, [])
-            if not isinstance(values, list):
-                fail(f"data.json field {field} must be a list")
-            for value in values:
-                key = normalize_object(str(value))
-                if key:
-                    objects.add(key)
-        for tool in entry.get("tools", []):
-            if isinstance(tool, dict) and tool.get("file_path"):
-                key = normalize_object(str(tool["file_path"]))
-                if key:
-                    objects.add(key)
-    return objects, data
-
-
-def yaml_urls(path: Path, base: str = "") -> set[str]:
-    objects: set[str] = set()
-    for line in path.read_text(encoding="utf-8-sig").splitlines():
-        match = re.match(r"^\s*(?:-\s*)?(?:url|path):\s*(.+?)\s*$", line)
-        if not match:
-            continue
-        key = normalize_object(match.group(1), base)
-        if key:
-            objects.add(key)
-    return objects
+def referenced_objects(
+    catalog: ReleaseCatalog | None = None,
+) -> tuple[set[str], list[dict]]:
+    catalog = catalog or ReleaseCatalog()
+    return catalog.referenced_objects, catalog.data
 
 
-def electron_updater_objects(path: Path, base: str) -> set[str]:
-    """Return updater packages plus their implicit differential blockmaps."""
-    objects = yaml_urls(path, base)
-    blockmaps = {
-        f"{key}.blockmap"
-        for key in objects
-        if Path(key).suffix.lower() in {".dmg", ".exe", ".zip"}
-    }
-    return objects | blockmaps
+def check_manifest(relative: str, text: str) -> dict:
+    """Validate one release manifest on its own and summarize it.
 
+    Checks that span manifests (duplicate tags and TOS keys) are left to
+    :func:`validate_release_manifests`, so the JSON-serializable summary
+    depends only on ``relative`` and ``text`` and can be cached by content.
+    """
+    try:
+        tag, keys = _check_manifest(relative, text)
+    except ValueError as exc:
+        return {"error": str(exc)}
+    return {"tag": tag, "keys": keys}
 
-def referenced_objects() -> tuple[set[str], list[dict]]:
-    objects, data = data_objects()
-    objects |= yaml_urls(ROOT / "update/software.yaml")
-    objects |= yaml_urls(ROOT / "firmware/mxbit/version.yaml", "firmware/mxbit/")
-    objects |= yaml_urls(
-        ROOT / "firmware/xr-car-tail/version.yaml", "firmware/xr-car-tail/"
-    )
-    objects |= yaml_urls(ROOT / "software/pc/latest.yml", "software/pc/")
-    objects |= yaml_urls(
-        ROOT / "software/pc/moxin/latest.yml", "software/pc/moxin/"
-    )
-    objects |= electron_updater_objects(
-        ROOT / "ota/xr-studio/latest.yml", "ota/xr-studio/"
-    )
-    objects |= electron_updater_objects(
-        ROOT / "ota/xr-studio/latest-mac.yml", "ota/xr-studio/"
-    )
-    return objects, data
 
+def _check_manifest(relative: str, text: str) -> tuple[str, list[str]]:
+    try:
+        with timings.phase("parse_json"):
+            manifest = json.loads(text)
+    except json.JSONDecodeError as exc:
+        fail(f"invalid release manifest {relative}: {exc}")
+    if not isinstance(manifest, dict):
+        fail(f"release manifest must be an object: {relative}")
+    if set(manifest) != {
+        "schema_version",
+        "tag",
+        "title",
+        "target_commitish",
+        "assets",
+    }:
+        fail(f"unexpected fields in release manifest: {relative}")
+    tag = manifest.get("tag")
+    if (
+        manifest.get("schema_version") != 1
+        or not isinstance(tag, str)
+        or not RELEASE_TAG_RE.fullmatch(tag)
+        or PurePosixPath(relative).stem != tag
+    ):
+        fail(f"invalid or duplicate release tag: {relative}")
+    if manifest.get("target_commitish") != "master":
+        fail(f"release target must be master: {relative}")
+    if not isinstance(manifest.get("title"), str) or not manifest["title"].strip():
+        fail(f"release title must not be empty: {relative}")
+    assets = manifest.get("assets")
+    if not isinstance(assets, list) or not assets:
+        fail(f"release manifest must contain assets: {relative}")
+
+    seen_names: set[str] = set()
+    keys: list[str] = []
+    for asset in assets:
+        if not isinstance(asset, dict) or set(asset) != {
+            "name",
+            "tos_key",
+            "size",
+            "sha256",
+        }:
+            fail(f"invalid asset fields in {relative}")
+        name = asset.get("name")
+        tos_key = asset.get("tos_key")
+        size = asset.get("size")
+        digest = asset.get("sha256")
+        if (
+            not isinstance(name, str)
+            or Path(name).name != name
+            or Path(name).suffix.lower() not in BINARY_SUFFIXES
+            or re.search(r"[\x00-\x1f*?\[\]]", name)
+            or name in seen_names
+        ):
+            fail(f"invalid or duplicate asset name in {relative}")
+        key = PurePosixPath(tos_key) if isinstance(tos_key, str) else None
+        if (
+            key is None
+            or key.is_absolute()
+            or ".." in key.parts
+            or re.search(r"[\x00-\x1f]", key.as_posix())
+            or not key.as_posix().startswith(("software/", "firmware/", "ota/"))
+            or Path(key.name).suffix.lower() != Path(name).suffix.lower()
+            or key.as_posix() in keys
+        ):
+            fail(f"invalid or duplicate TOS key in {relative}")
+        if not isinstance(size, int) or size <= 0 or size >= MAX_RELEASE_ASSET_SIZE:
+            fail(f"asset must be non-empty and smaller than 2 GiB: {name}")
+        if not isinstance(digest, str) or not re.fullmatch(r"[0-9a-f]{64}", digest):
+            fail(f"invalid SHA256 for release asset: {name}")
+        seen_names.add(name)
+        keys.append(key.as_posix())
+    return tag, keys
+
+
+def default_cache_path() -> Path:
+    configured = os.environ.get("XIAOR_VALIDATION_CACHE")
+    if configured:
+        return Path(configured).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "xiaor-release" / "validation.json"
+
+
+class ValidationCache:
+    """Per-manifest summaries from earlier runs, keyed by path and content hash.
+
+    The whole cache is discarded when this script changes, so a tightened
+    rule always revalidates every manifest. Entries for manifests that no
+    longer exist are dropped on save.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = path or default_cache_path()
+        self.validator = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+        self.entries: dict[str, dict] = {}
+        self.hits = 0
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if (
+            isinstance(data, dict)
+            and data.get("version") == VALIDATION_CACHE_VERSION
+            and data.get("validator") == self.validator
+            and isinstance(data.get("entries"), dict)
+        ):
+            self.entries = data["entries"]
 
-def validate_release_manifests() -> tuple[int, set[str]]:
-    manifest_dir = ROOT / "releases"
+    def get(self, relative: str, digest: str) -> dict | None:
+        entry = self.entries.get(relative)
+        if not isinstance(entry, dict) or entry.get("sha256") != digest:
+            return None
+        summary = entry.get("summary")
+        if not isinstance(summary, dict):
+            return None
+        self.hits += 1
+        return summary
+
+    def put(self, relative: str, digest: str, summary: dict) -> None:
+        self.entries[relative] = {"sha256": digest, "summary": summary}
+
+    def save(self, keep: list[str]) -> None:
+        entries = {
+            relative: self.entries[relative]
+            for relative in keep
+            if relative in self.entries
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=self.path.parent, delete=False
+        ) as handle:
+            json.dump(
+                {
+                    "version": VALIDATION_CACHE_VERSION,
+                    "validator": self.validator,
+                    "entries": entries,
+                },
+                handle,
+            )
+        os.replace(handle.name, self.path)
+
+
+def manifest_summaries(
+    catalog: ReleaseCatalog, jobs: int = 1, cache: ValidationCache | None = None
+) -> list[tuple[str, dict]]:
+    """Return ``(path, summary)`` for every manifest, checking only cache misses."""
+    texts = {relative: catalog.text(relative) for relative in catalog.manifest_paths}
+    digests: dict[str, str] = {}
+    for relative, text in texts.items():
+        encoded = text.encode("utf-8")
+        digests[relative] = hashlib.sha256(encoded).hexdigest()
+        timings.count("bytes_hashed", len(encoded))
+    summaries: dict[str, dict] = {}
+    pending: list[str] = []
+    for relative in texts:
+        summary = cache.get(relative, digests[relative]) if cache else None
+        if summary is None:
+            pending.append(relative)
+        else:
+            summaries[relative] = summary
+
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(
+                pool.map(
+                    check_manifest,
+                    pending,
+                    [texts[relative] for relative in pending],
+                    chunksize=max(1, len(pending) // (jobs * 4)),
+                )
+            )
+    else:
+        results = [check_manifest(relative, texts[relative]) for relative in pending]
+    timings.count("manifests_checked", len(pending))
+    timings.count("manifests_cached", len(texts) - len(pending))
+    for relative, summary in zip(pending, results):
+        summaries[relative] = summary
+        if cache:
+            cache.put(relative, digests[relative], summary)
+    if cache:
+        cache.save(list(texts))
+    return [(relative, summaries[relative]) for relative in texts]
+
+
+def validate_release_manifests(
+    catalog: ReleaseCatalog | None = None,
+    jobs: int = 1,
+    cache: ValidationCache | None = None,
+) -> tuple[int, set[str]]:
+    catalog = catalog or ReleaseCatalog()
     seen_tags: set[str] = set()
-    seen_tos_keys: set[str] = set()
     count = 0
     manifest_keys: set[str] = set()
-    for path in sorted(manifest_dir.glob("*.json")):
-        try:
-            manifest = json.loads(path.read_text(encoding="utf-8"))
-        except json.JSONDecodeError as exc:
-            fail(f"invalid release manifest {path.relative_to(ROOT)}: {exc}")
-        if not isinstance(manifest, dict):
-            fail(f"release manifest must be an object: {path.relative_to(ROOT)}")
-        if set(manifest) != {
-            "schema_version",
-            "tag",
-            "title",
-            "target_commitish",
-            "assets",
-        }:
-            fail(f"unexpected fields in release manifest: {path.relative_to(ROOT)}")
-        tag = manifest.get("tag")
-        if (
-            manifest.get("schema_version") != 1
-            or not isinstance(tag, str)
-            or not RELEASE_TAG_RE.fullmatch(tag)
-            or path.stem != tag
-            or tag in seen_tags
-        ):
-            fail(f"invalid or duplicate release tag: {path.relative_to(ROOT)}")
-        if manifest.get("target_commitish") != "master":
-            fail(f"release target must be master: {path.relative_to(ROOT)}")
-        if not isinstance(manifest.get("title"), str) or not manifest["title"].strip():
-            fail(f"release title must not be empty: {path.relative_to(ROOT)}")
-        assets = manifest.get("assets")
-        if not isinstance(assets, list) or not assets:
-            fail(f"release manifest must contain assets: {path.relative_to(ROOT)}")
-
-        seen_names: set[str] = set()
-        for asset in assets:
-            if not isinstance(asset, dict) or set(asset) != {
-                "name",
-                "tos_key",
-                "size",
-                "sha256",
-            }:
-                fail(f"invalid asset fields in {path.relative_to(ROOT)}")
-            name = asset.get("name")
-            tos_key = asset.get("tos_key")
-            size = asset.get("size")
-            digest = asset.get("sha256")
-            if (
-                not isinstance(name, str)
-                or Path(name).name != name
-                or Path(name).suffix.lower() not in BINARY_SUFFIXES
-                or re.search(r"[\x00-\x1f*?\[\]]", name)
-                or name in seen_names
-            ):
-                fail(f"invalid or duplicate asset name in {path.relative_to(ROOT)}")
-            key = PurePosixPath(tos_key) if isinstance(tos_key, str) else None
-            if (
-                key is None
-                or key.is_absolute()
-                or ".." in key.parts
-                or re.search(r"[\x00-\x1f]", key.as_posix())
-                or not key.as_posix().startswith(("software/", "firmware/", "ota/"))
-                or Path(key.name).suffix.lower() != Path(name).suffix.lower()
-                or key.as_posix() in seen_tos_keys
-            ):
-                fail(f"invalid or duplicate TOS key in {path.relative_to(ROOT)}")
-            if not isinstance(size, int) or size <= 0 or size >= MAX_RELEASE_ASSET_SIZE:
-                fail(f"asset must be non-empty and smaller than 2 GiB: {name}")
-            if not isinstance(digest, str) or not re.fullmatch(r"[0-9a-f]{64}", digest):
-                fail(f"invalid SHA256 for release asset: {name}")
-            seen_names.add(name)
-            seen_tos_keys.add(key.as_posix())
-            manifest_keys.add(key.as_posix())
+    for relative, summary in manifest_summaries(catalog, jobs, cache):
+        if "error" in summary:
+            fail(summary["error"])
+        if summary["tag"] in seen_tags:
+            fail(f"invalid or duplicate release tag: {relative}")
+        for key in summary["keys"]:
+            if key in manifest_keys:
+                fail(f"invalid or duplicate TOS key in {relative}")
+            manifest_keys.add(key)
             count += 1
-        seen_tags.add(tag)
+        seen_tags.add(summary["tag"])
     return count, manifest_keys
 
 
 def validate_superseded_assets(
-    manifest_keys: set[str], referenced_keys: set[str]
+    manifest_keys: set[str],
+    referenced_keys: set[str],
+    catalog: ReleaseCatalog | None = None,
 ) -> set[str]:
-    path = ROOT / "releases/audit/superseded-assets.json"
-    if not path.exists():
+    records = (catalog or ReleaseCatalog()).superseded
+    if records is None:
         return set()
-    try:
-        records = json.loads(path.read_text(encoding="utf-8"))
-    except json.JSONDecodeError as exc:
-        fail(f"invalid superseded asset registry: {exc}")
     if not isinstance(records, list):
         fail("superseded asset registry must contain a top-level list")
 
@@ -266,8 +348,57 @@ def validate_superseded_assets(
     return superseded
 
 
-def validate() -> set[str]:
-    tracked = tracked_files()
+def validate_firmware_deltas(catalog: ReleaseCatalog) -> None:
+    """Check ``version.yaml`` delta entries against their release manifests."""
+    for relative, entries in catalog.firmware_deltas.items():
+        for entry in entries:
+            if set(entry) != FIRMWARE_DELTA_FIELDS:
+                fail(f"invalid firmware delta fields in {relative}")
+            key = normalize_object(entry["url"], PLAIN_UPDATER_FILES[relative])
+            if not key or not key.endswith(".delta"):
+                fail(f"firmware delta url must be a .delta object in {relative}")
+            asset = catalog.assets_by_key.get(key)
+            if asset is None:
+                fail(f"firmware delta is not declared by a release manifest: {key}")
+            if entry["size"] != str(asset.size) or entry["sha256"] != asset.sha256:
+                fail(f"firmware delta size/sha256 does not match its release manifest: {key}")
+            if (
+                not entry["source_size"].isdigit()
+                or not entry["source_crc32"].isdigit()
+                or int(entry["source_crc32"]) >= 1 << 32
+                or not re.fullmatch(r"[0-9a-f]{64}", entry["source_sha256"])
+            ):
+                fail(f"invalid firmware delta source image digests: {key}")
+
+
+def validate_update_index(catalog: ReleaseCatalog) -> None:
+    """The compiled per-app update documents must point at the YAML's TOS keys."""
+    try:
+        files = compile_updates(catalog.text(UPDATE_SOURCE))
+    except MetadataBuildError as exc:
+        fail(str(exc))
+    compiled = set()
+    for payload in files.values():
+        url = json.loads(payload).get("url")
+        if url is None:
+            continue
+        compiled.add(normalize_object(url, PLAIN_UPDATER_FILES[UPDATE_SOURCE]))
+    expected = catalog.urls(UPDATE_SOURCE, PLAIN_UPDATER_FILES[UPDATE_SOURCE])
+    if compiled != expected:
+        fail(
+            f"compiled update index does not reference the {UPDATE_SOURCE} TOS objects:\n  "
+            + "\n  ".join(sorted(str(key) for key in compiled ^ expected))
+        )
+
+
+def validate(
+    catalog: ReleaseCatalog | None = None,
+    jobs: int = 1,
+    cache: ValidationCache | None = None,
+) -> set[str]:
+    catalog = catalog or ReleaseCatalog()
+    tracked = tracked_files(catalog.root)
+    timings.count("tracked_files", len(tracked))
     binaries = [path for path in tracked if Path(path).suffix.lower() in BINARY_SUFFIXES]
     if binaries:
         fail("release binaries are tracked by Git:\n  " + "\n  ".join(binaries))
@@ -283,9 +414,12 @@ def validate() -> set[str]:
     if sensitive:
         fail("sensitive files are tracked by Git:\n  " + "\n  ".join(sensitive))
 
-    objects, data = referenced_objects()
-    _, manifest_keys = validate_release_manifests()
-    superseded = validate_superseded_assets(manifest_keys, objects)
+    with timings.phase("referenced_objects"):
+        objects, data = referenced_objects(catalog)
+    with timings.phase("manifest_checks"):
+        _, manifest_keys = validate_release_manifests(catalog, jobs, cache)
+    with timings.phase("superseded_checks"):
+        superseded = validate_superseded_assets(manifest_keys, objects, catalog)
     orphaned = sorted(manifest_keys - objects - superseded)
     if orphaned:
         fail("release assets are not referenced by public metadata:\n  " + "\n  ".join(orphaned))
@@ -293,13 +427,39 @@ def validate() -> set[str]:
     if invalid:
         fail("unsupported release object references:\n  " + "\n  ".join(invalid))
 
-    index = (ROOT / "index.html").read_text(encoding="utf-8")
-    style_digest = hashlib.sha256((ROOT / "style.css").read_bytes()).hexdigest()[:12]
-    expected_style_href = f'href="style.css?v={style_digest}"'
-    if expected_style_href not in index:
+    with timings.phase("metadata_checks"):
+        check_public_metadata(catalog, objects)
+        validate_firmware_deltas(catalog)
+        validate_update_index(catalog)
+    return objects
+
+
+def check_public_metadata(catalog: ReleaseCatalog, objects: set[str]) -> None:
+    index = catalog.text("index.html")
+    fingerprints = asset_fingerprints(catalog.root)
+    hashed = sum((catalog.root / key).stat().st_size for key in fingerprints)
+    timings.count("bytes_hashed", hashed)
+    stale = []
+    for relative in referencing_files(catalog.root):
+        stale += fingerprint_text(relative, catalog.text(relative), fingerprints)[1]
+    if stale:
         fail(
-            "index.html stylesheet cache version must match the first 12 "
-            "characters of the style.css SHA256"
+            "static asset references must carry the first 12 characters of the "
+            "asset SHA256; run python3 scripts/fingerprint_assets.py:\n  "
+            + "\n  ".join(stale)
+        )
+    try:
+        images = read_manifest(catalog.root)["images"]
+        variant_problems = check_variants(catalog.data, catalog.root)
+        prerendered = apply_prerender(index, catalog.data, images)
+    except (ImageBuildError, PrerenderError) as exc:
+        fail(str(exc))
+    if variant_problems:
+        fail("logo image variants are invalid:\n  " + "\n  ".join(variant_problems))
+    if prerendered != index:
+        fail(
+            "index.html pre-rendered download list does not match data.json; "
+            "run python3 scripts/prerender_index.py"
         )
     expected_base = f"const RELEASE_BASE_URL = '{PUBLIC_DOWNLOAD_BASE_URL}';"
     if expected_base not in index:
@@ -307,11 +467,7 @@ def validate() -> set[str]:
     if "software2.tos-cn-beijing.volces.com" in index:
         fail("index.html must not expose the raw TOS bucket domain")
 
-    xrblock = [
-        entry
-        for entry in data
-        if entry.get("name", {}).get("en") == "XRBlock Scratch3.0 Software"
-    ]
+    xrblock = catalog.entries_named("XRBlock Scratch3.0 Software")
     if len(xrblock) != 1:
         fail("data.json must contain exactly one XRBlock entry")
     entry = xrblock[0]
@@ -324,9 +480,7 @@ def validate() -> set[str]:
     if omnimind:
         fail("retired OmniMind objects must not be referenced")
 
-    xr_studio = [
-        entry for entry in data if entry.get("name", {}).get("en") == "XR Studio"
-    ]
+    xr_studio = catalog.entries_named("XR Studio")
     expected_xr_studio = {
         "windows": {
             "version": "v1.0.0",
@@ -356,7 +510,7 @@ def validate() -> set[str]:
         expected = expected_xr_studio.get(platform)
         if (
             expected is None
-            or entry.get("logoSrc") != "./software/image/xr-studio.png"
+            or strip_fingerprint(str(entry.get("logoSrc"))) != "./software/image/xr-studio.png"
             or entry.get("version") != expected["version"]
             or entry.get("link") != expected["link"]
             or entry.get("btnNames", {}).get("en") != expected["button_en"]
@@ -366,15 +520,12 @@ def validate() -> set[str]:
         ):
             fail(f"invalid XR Studio data.json entry for platform: {platform}")
 
-    for updater_name in ("latest.yml", "latest-mac.yml"):
-        updater_path = ROOT / "ota/xr-studio" / updater_name
-        updater_text = updater_path.read_text(encoding="utf-8-sig")
+    for updater_path in ELECTRON_UPDATER_FILES:
+        updater_text = catalog.text(updater_path)
         if not re.search(r"^version:\s*1\.0\.0\s*$", updater_text, re.MULTILINE):
-            fail(f"XR Studio {updater_name} version must be 1.0.0")
+            fail(f"XR Studio {Path(updater_path).name} version must be 1.0.0")
 
-    xr_car_tail = (ROOT / "firmware/xr-car-tail/version.yaml").read_text(
-        encoding="utf-8"
-    )
+    xr_car_tail = catalog.yaml_scalars("firmware/xr-car-tail/version.yaml")
     required_xr_car_tail_fields = {
         "id": "xr-car-tail",
         "device_type": "XR-CAR-TAIL",
@@ -388,16 +539,47 @@ def validate() -> set[str]:
         "min_bootloader_version": "2.0.0.0",
     }
     for field, expected in required_xr_car_tail_fields.items():
-        if not re.search(
-            rf"^\s*{re.escape(field)}:\s*['\"]?{re.escape(expected)}['\"]?\s*$",
-            xr_car_tail,
-            re.MULTILINE,
-        ):
+        if expected not in xr_car_tail.get(field, []):
             fail(f"XR-CAR-TAIL {field} must be {expected}")
-    if not re.search(r"^\s*-\s*24833\s*$", xr_car_tail, re.MULTILINE):
+    if "24833" not in xr_car_tail.get("", []):
         fail("XR-CAR-TAIL product_codes must contain 24833")
 
-    return objects
+
+def dedup_summary(catalog: ReleaseCatalog, groups: bool = False) -> str:
+    """Describe content published under several keys, copied server-side by the mirror."""
+    duplicates = catalog.duplicate_content
+    saved = sum(size * (len(keys) - 1) for _, size, keys in duplicates)
+    lines = [
+        f"duplicate content: {len(duplicates)} groups, "
+        f"{sum(len(keys) - 1 for _, _, keys in duplicates)} copied keys, "
+        f"{saved / MEGABYTE:.1f} MB not re-uploaded"
+    ]
+    if groups:
+        for digest, size, keys in duplicates:
+            lines.append(f"  {digest[:12]} {size / MEGABYTE:.1f} MB: " + ", ".join(keys))
+    return "\n".join(lines)
+
+
+def verify_local_blockmap(catalog: ReleaseCatalog, value: str) -> str:
+    """Check a local ``ASSET=BLOCKMAP`` pair and the asset's updater entry."""
+    if "=" not in value:
+        fail("--verify-blockmap must use ASSET=BLOCKMAP")
+    asset_text, blockmap_text = value.split("=", 1)
+    asset = Path(asset_text).expanduser()
+    blockmap = Path(blockmap_text).expanduser()
+    if blockmap.name != f"{asset.name}.blockmap":
+        fail(f"blockmap name must be {asset.name}.blockmap: {blockmap.name}")
+    try:
+        chunks = verify_blockmap(asset, blockmap.read_bytes())
+    except BlockMapError as exc:
+        fail(f"invalid blockmap {blockmap.name}: {exc}")
+    entry = catalog.updater_entries.get(asset.name)
+    if entry is not None:
+        result = digest_file(asset)
+        timings.count("bytes_hashed", result.size)
+        if (result.sha512, result.size) != entry:
+            fail(f"{asset.name} does not match its electron-updater sha512/size")
+    return f"verified blockmap {blockmap.name}: {chunks} chunks"
 
 
 def main() -> int:
@@ -407,17 +589,66 @@ def main() -> int:
         action="store_true",
         help="print normalized TOS object keys after validation",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="reuse cached results for release manifests whose content is unchanged",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="validate release manifests in N processes (default: 1)",
+    )
+    parser.add_argument(
+        "--verify-blockmap",
+        action="append",
+        default=[],
+        metavar="ASSET=BLOCKMAP",
+        help="also check a local blockmap chunk by chunk against its local asset "
+        "and the asset against ota/ latest*.yml; repeatable",
+    )
+    parser.add_argument(
+        "--metadata-build",
+        type=Path,
+        metavar="DIR",
+        help="also check a build_metadata.py output: every encoded variant must "
+        "decode to the canonical form of its source",
+    )
+    parser.add_argument(
+        "--dedup-report",
+        action="store_true",
+        help="list every group of TOS keys that publish identical content",
+    )
+    timings.add_timings_argument(parser)
     args = parser.parse_args()
+    status = "failed"
     try:
-        objects = validate()
+        cache = ValidationCache() if args.incremental else None
+        catalog = ReleaseCatalog()
+        objects = validate(catalog, args.jobs, cache)
+        with timings.phase("blockmap_checks"):
+            for value in args.verify_blockmap:
+                print(verify_local_blockmap(catalog, value))
+        if args.metadata_build:
+            with timings.phase("metadata_build_checks"):
+                problems = check_build(args.metadata_build)
+            if problems:
+                fail("\n  ".join(["metadata build is invalid:", *problems]))
+        status = "ok"
     except (OSError, subprocess.CalledProcessError, ValueError) as exc:
         print(f"release validation failed: {exc}", file=sys.stderr)
         return 1
+    finally:
+        if args.timings_json:
+            timings.write_report(args.timings_json, "validate_release", status)
 
     if args.print_objects:
         print("\n".join(sorted(objects)))
     else:
         print(f"release validation passed: {len(objects)} referenced TOS objects")
+        print(dedup_summary(catalog, args.dedup_report))
     return 0
 
 
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""Verify referenced release objects on the public download host concurrently.
+
+Every key gets a HEAD and a single-byte Range GET: the status must be 200
+and 206, ``Content-Length`` and ``Content-Range`` must match the manifest
+size and manifest assets must carry the immutable ``Cache-Control`` the
+mirror uploads them with. ``--sha256-sample N`` additionally rebuilds the
+SHA256 of N random objects from ranged reads. Requests share a small pool of
+keep-alive HTTP/1.1 connections per host, started at a bounded rate, so
+hundreds of keys take seconds instead of one curl pair after another.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import ssl
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from fingerprint_assets import STATIC_ASSET_DIRS
+from mirror_release import (
+    IMMUTABLE_CACHE_CONTROL,
+    PUBLIC_DOWNLOAD_BASE_URL,
+    PUBLIC_RETRIES,
+    public_url,
+)
+from release_catalog import ReleaseCatalog
+from validate_release import validate
+
+
+MEGABYTE = 1024 * 1024
+RANGE_SIZE = 8 * MEGABYTE
+READ_SIZE = 64 * 1024
+MAX_REDIRECTS = 3
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+
+class PublicVerifyError(RuntimeError):
+    pass
+
+
+class StaleConnection(Exception):
+    """A pooled keep-alive connection the server had already closed."""
+
+
+@dataclass(frozen=True)
+class Expectation:
+    key: str
+    size: int | None = None
+    sha256: str | None = None
+    cache_control: str | None = None
+
+
+@dataclass(frozen=True)
+class Response:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+
+def expectations(catalog: ReleaseCatalog, objects: set[str]) -> list[Expectation]:
+    """What the public host must serve for each key.
+
+    Manifest assets are fully known. Static assets tracked in Git are
+    compared with the checked-out file; other legacy objects only have to
+    answer consistently.
+    """
+    static_prefixes = tuple(f"{directory}/" for directory in STATIC_ASSET_DIRS)
+    result = []
+    for key in sorted(objects):
+        asset = catalog.assets_by_key.get(key)
+        local = catalog.root / key
+        if asset is not None:
+            result.append(Expectation(key, asset.size, asset.sha256, IMMUTABLE_CACHE_CONTROL))
+        elif key.startswith(static_prefixes) and local.is_file():
+            data = local.read_bytes()
+            result.append(Expectation(key, len(data), hashlib.sha256(data).hexdigest()))
+        else:
+            result.append(Expectation(key))
+    return result
+
+
+def _directives(value: str) -> list[str]:
+    return sorted(part.strip().lower() for part in value.split(","))
+
+
+def _same_cache_control(value: str | None, expected: str) -> bool:
+    return value is not None and _directives(value) == _directives(expected)
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str) -> tuple[Response, bool]:
+    """Parse one HTTP/1.1 response; also return whether the connection is reusable."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError("connection closed before a response")
+    version, status, *_ = line.decode("latin-1").split(" ", 2)
+    headers: dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    code = int(status)
+    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    body = bytearray()
+    if method == "HEAD" or code in (204, 304) or code < 200:
+        pass
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if not size:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+    elif "content-length" in headers:
+        body += await reader.readexactly(int(headers["content-length"]))
+    else:
+        # Close-delimited body: the connection cannot carry another request.
+        while chunk := await reader.read(READ_SIZE):
+            body += chunk
+        keep_alive = False
+    return Response(code, headers, bytes(body)), keep_alive
+
+
+class HostPool:
+    """Keep-alive connections to one host, with request starts spaced by ``rate``."""
+
+    def __init__(
+        self, scheme: str, host: str, port: int, connections: int, rate: float, timeout: float
+    ):
+        self.host = host
+        self.port = port
+        default_port = 443 if scheme == "https" else 80
+        self.authority = host if port == default_port else f"{host}:{port}"
+        self.ssl = ssl.create_default_context() if scheme == "https" else None
+        self.timeout = timeout
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.slots = asyncio.Semaphore(connections)
+        self.idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.next_start = 0.0
+        self.opened = 0
+        self.requests = 0
+
+    async def _throttle(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def request(self, method: str, target: str, headers: dict[str, str]) -> Response:
+        async with self.slots:
+            await self._throttle()
+            reused = bool(self.idle)
+            if reused:
+                reader, writer = self.idle.pop()
+            else:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl),
+                    self.timeout,
+                )
+                self.opened += 1
+            lines = [f"{method} {target} HTTP/1.1", f"Host: {self.authority}"]
+            lines += [f"{name}: {value}" for name, value in headers.items()]
+            self.requests += 1
+            try:
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                await writer.drain()
+                response, keep_alive = await asyncio.wait_for(
+                    _read_response(reader, method), self.timeout
+                )
+            except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                writer.close()
+                if reused:
+                    raise StaleConnection() from exc
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    def close(self) -> None:
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class PublicVerifier:
+    def __init__(
+        self,
+        base_url: str,
+        connections: int = 8,
+        rate: float = 50.0,
+        timeout: float = 60.0,
+        retries: int = PUBLIC_RETRIES,
+    ):
+        self.base_url = base_url
+        self.connections = connections
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+        self.pools: dict[tuple[str, str, int], HostPool] = {}
+
+    def _pool(self, url: str) -> tuple[HostPool, str]:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise PublicVerifyError(f"unsupported public URL: {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        if key not in self.pools:
+            self.pools[key] = HostPool(*key, self.connections, self.rate, self.timeout)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        return self.pools[key], target
+
+    async def fetch(
+        self, method: str, key: str, headers: dict[str, str] | None = None
+    ) -> Response:
+        """Request a key, following redirects and retrying 5xx and broken connections."""
+        url = public_url(self.base_url, key)
+        redirects = 0
+        attempt = 0
+        while True:
+            pool, target = self._pool(url)
+            try:
+                response = await pool.request(method, target, headers or {})
+            except StaleConnection:
+                continue
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as exc:
+                if attempt == self.retries:
+                    raise PublicVerifyError(f"{method} {url} failed: {exc!r}") from exc
+            else:
+                if response.status in REDIRECT_STATUSES and "location" in response.headers:
+                    redirects += 1
+                    if redirects > MAX_REDIRECTS:
+                        raise PublicVerifyError(f"too many redirects: {key}")
+                    url = urljoin(url, response.headers["location"])
+                    continue
+                if response.status < 500 or attempt == self.retries:
+                    return response
+            await asyncio.sleep(2**attempt)
+            attempt += 1
+
+    async def content_sha256(self, key: str, size: int) -> str:
+        digest = hashlib.sha256()
+        for start in range(0, size, RANGE_SIZE):
+            end = min(start + RANGE_SIZE, size) - 1
+            response = await self.fetch("GET", key, {"Range": f"bytes={start}-{end}"})
+            if response.status != 206 or len(response.body) != end - start + 1:
+                raise PublicVerifyError(f"public Range read failed at byte {start}: {key}")
+            digest.update(response.body)
+        return digest.hexdigest()
+
+    async def check(self, expected: Expectation, hash_content: bool) -> list[str]:
+        key = expected.key
+        try:
+            head = await self.fetch("HEAD", key)
+            if head.status != 200:
+                return [f"public HEAD returned {head.status}: {key}"]
+            problems = []
+            length = head.headers.get("content-length")
+            size = expected.size
+            if size is None and length is not None and length.isdigit():
+                size = int(length)
+            if size is None or length != str(size):
+                problems.append(f"public Content-Length {length} does not match {size}: {key}")
+            if expected.cache_control and not _same_cache_control(
+                head.headers.get("cache-control"), expected.cache_control
+            ):
+                problems.append(
+                    f"public Cache-Control {head.headers.get('cache-control')!r} is not "
+                    f"{expected.cache_control!r}: {key}"
+                )
+            if size:
+                ranged = await self.fetch("GET", key, {"Range": "bytes=0-0"})
+                content_range = ranged.headers.get("content-range")
+                if ranged.status != 206 or content_range != f"bytes 0-0/{size}":
+                    problems.append(
+                        f"public Range returned {ranged.status} {content_range}: {key}"
+                    )
+                elif hash_content and expected.sha256 and not problems:
+                    if await self.content_sha256(key, size) != expected.sha256:
+                        problems.append(f"public content SHA256 mismatch: {key}")
+            return problems
+        except PublicVerifyError as exc:
+            return [str(exc)]
+
+    async def verify(self, expected: list[Expectation], hashed: set[str]) -> list[str]:
+        try:
+            results = await asyncio.gather(
+                *(self.check(item, item.key in hashed) for item in expected)
+            )
+        finally:
+            for pool in self.pools.values():
+                pool.close()
+        return [problem for problems in results for problem in problems]
+
+    @property
+    def requests(self) -> int:
+        return sum(pool.requests for pool in self.pools.values())
+
+    @property
+    def opened(self) -> int:
+        return sum(pool.opened for pool in self.pools.values())
+
+
+def read_objects(path: Path) -> set[str]:
+    text = sys.stdin.read() if str(path) == "-" else path.read_text(encoding="utf-8")
+    return {line.strip() for line in text.splitlines() if line.strip()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--objects",
+        type=Path,
+        metavar="FILE",
+        help="keys from validate_release.py --print-objects, - for stdin "
+        "(default: validate the checkout)",
+    )
+    parser.add_argument(
+        "--public-base-url",
+        default=os.environ.get("PUBLIC_RELEASE_BASE_URL", PUBLIC_DOWNLOAD_BASE_URL),
+    )
+    parser.add_argument(
+        "--connections", type=int, default=8, help="keep-alive connections per host"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=50.0, help="requests started per second and host"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per request")
+    parser.add_argument(
+        "--sha256-sample",
+        type=int,
+        default=0,
+        metavar="N",
+        help="also rebuild the SHA256 of N random objects with known digests from ranged reads",
+    )
+    parser.add_argument("--seed", type=int, help="random seed for --sha256-sample")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        catalog = ReleaseCatalog()
+        if args.objects:
+            objects = read_objects(args.objects)
+        else:
+            objects = validate(catalog)
+        expected = expectations(catalog, objects)
+        candidates = sorted(item.key for item in expected if item.sha256 and item.size)
+        hashed = set(
+            random.Random(args.seed).sample(candidates, min(args.sha256_sample, len(candidates)))
+        )
+        verifier = PublicVerifier(
+            args.public_base_url, args.connections, args.rate, args.timeout
+        )
+        problems = asyncio.run(verifier.verify(expected, hashed))
+        if problems:
+            raise PublicVerifyError("\n  ".join(["public objects failed:", *problems]))
+    except (PublicVerifyError, OSError, ValueError) as exc:
+        print(f"public verification failed: {exc}", file=sys.stderr)
+        return 1
+
+    hashed_note = f", {len(hashed)} rehashed" if hashed else ""
+    print(
+        f"verified {len(expected)} public objects{hashed_note} with {verifier.requests} "
+        f"requests over {verifier.opened} connections in "
+        f"{time.perf_counter() - started:.1f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
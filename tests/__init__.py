@@ -0,0 +1,8 @@
+"""Offline tests for the release scripts; run with ``python3 -m unittest``."""
+
+import sys
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parents[1] / "scripts"
+if str(SCRIPTS) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS))
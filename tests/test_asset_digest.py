@@ -0,0 +1,80 @@
+import os
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from asset_digest import (
+    CHUNK_MAX_SIZE,
+    CHUNK_MIN_SIZE,
+    BlockMapBuilder,
+    DigestCache,
+    digest_files,
+    verify_blockmap,
+)
+from prepare_release import ReleaseError, updater_platform
+
+
+def blockmap(data: bytes, step: int | None = None) -> BlockMapBuilder:
+    builder = BlockMapBuilder()
+    view = memoryview(data)
+    for start in range(0, len(data), step or len(data)):
+        builder.update(view[start : start + (step or len(data))])
+    builder.finish()
+    return builder
+
+
+class BlockMapBuilderTest(unittest.TestCase):
+    def setUp(self):
+        self.data = random.Random(7).randbytes(2 * 1024 * 1024)
+
+    def test_chunks_are_bounded_and_cover_the_input(self):
+        builder = blockmap(self.data)
+        self.assertEqual(sum(builder.sizes), len(self.data))
+        self.assertGreaterEqual(min(builder.sizes[:-1]), CHUNK_MIN_SIZE)
+        self.assertLessEqual(max(builder.sizes), CHUNK_MAX_SIZE)
+
+    def test_chunks_do_not_depend_on_read_size(self):
+        expected = blockmap(self.data)
+        for step in (1 << 13, 8191, 100_003):
+            self.assertEqual(blockmap(self.data, step).checksums, expected.checksums)
+
+    def test_insertion_only_changes_nearby_chunks(self):
+        edited = self.data[:500_000] + b"inserted" + self.data[500_000:]
+        before = blockmap(self.data).checksums
+        after = blockmap(edited).checksums
+        self.assertGreaterEqual(len(set(before) & set(after)), len(before) - 3)
+
+
+class BlockMapCacheTest(unittest.TestCase):
+    def test_blockmap_is_reused_from_the_digest_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            package = Path(directory) / "app-1.0.0-win-x64.exe"
+            package.write_bytes(random.Random(3).randbytes(300_000))
+            cache_path = Path(directory) / "cache" / "digests.json"
+
+            fresh = digest_files([package], 1, DigestCache(cache_path), blockmaps=[True])[0]
+            cached = digest_files([package], 1, DigestCache(cache_path), blockmaps=[True])[0]
+            self.assertFalse(fresh.cached)
+            self.assertTrue(cached.cached)
+            self.assertEqual(cached.blockmap, fresh.blockmap)
+            self.assertGreater(verify_blockmap(package, cached.blockmap), 1)
+
+            os.utime(package, ns=(0, 1))
+            rehashed = digest_files([package], 1, DigestCache(cache_path), blockmaps=[True])[0]
+            self.assertFalse(rehashed.cached)
+
+
+class UpdaterPlatformTest(unittest.TestCase):
+    def test_packages_are_filed_by_platform_not_extension(self):
+        self.assertEqual(updater_platform("ota/x/app-1.0.0-win-x64.zip"), "windows")
+        self.assertEqual(updater_platform("ota/x/app-1.0.0-mac-arm64.zip"), "mac")
+        self.assertEqual(updater_platform("ota/x/app-1.0.0-arm64.dmg"), "mac")
+        self.assertEqual(updater_platform("ota/x/app Setup 1.0.0.exe"), "windows")
+        for key in ("ota/x/app-1.0.0.zip", "ota/x/app-1.0.0-mac.exe"):
+            with self.assertRaises(ReleaseError):
+                updater_platform(key)
+
+
+if __name__ == "__main__":
+    unittest.main()
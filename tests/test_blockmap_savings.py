@@ -0,0 +1,135 @@
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import blockmap_savings
+from asset_digest import (
+    BLOCKMAP_CHECKSUM_SIZE,
+    CHUNK_MAX_SIZE,
+    chunked_here,
+    digest_file,
+    encode_blockmap,
+)
+from blockmap_savings import plan_download
+
+
+def blockmap(*chunks):
+    """``("a", 10), ("b", 20)`` -> the (checksums, sizes) pair of a blockmap."""
+    return [checksum for checksum, _ in chunks], [size for _, size in chunks]
+
+
+def fixed_size_blockmap(data, size):
+    """A valid blockmap cut every ``size`` bytes rather than by our chunker."""
+    chunks = [data[start : start + size] for start in range(0, len(data), size)]
+    checksums = [
+        base64.b64encode(
+            hashlib.blake2b(chunk, digest_size=BLOCKMAP_CHECKSUM_SIZE).digest()
+        ).decode("ascii")
+        for chunk in chunks
+    ]
+    return encode_blockmap(checksums, [len(chunk) for chunk in chunks])
+
+
+class PlanDownloadTest(unittest.TestCase):
+    def test_identical_blockmaps_plan_no_ranges(self):
+        old = blockmap(("a", 10), ("b", 20), ("c", 30))
+        plan = plan_download(old, old)
+        self.assertEqual((plan.ranges, plan.copies), ([], 1))
+        self.assertEqual((plan.size, plan.download, plan.saved), (60, 0, 60))
+
+    def test_adjacent_changed_chunks_are_coalesced(self):
+        old = blockmap(("a", 10), ("b", 20), ("c", 30), ("d", 40))
+        new = blockmap(("a", 10), ("x", 5), ("y", 25), ("c", 30), ("z", 8))
+        plan = plan_download(old, new)
+        self.assertEqual(plan.ranges, [(10, 40), (70, 78)])
+        self.assertEqual((plan.download, plan.saved, plan.copies), (38, 40, 2))
+
+    def test_same_checksum_with_another_size_is_downloaded(self):
+        old = blockmap(("a", 10), ("b", 20))
+        new = blockmap(("a", 10), ("b", 21))
+        plan = plan_download(old, new)
+        self.assertEqual(plan.ranges, [(10, 31)])
+        self.assertEqual(plan.copies, 1)
+
+    def test_reordered_chunks_are_separate_copied_runs(self):
+        old = blockmap(("a", 10), ("b", 20), ("c", 30))
+        new = blockmap(("c", 30), ("a", 10), ("b", 20))
+        plan = plan_download(old, new)
+        self.assertEqual(plan.ranges, [])
+        # "c" and the still contiguous "a" + "b" are two local copies.
+        self.assertEqual(plan.copies, 2)
+        new = blockmap(("b", 20), ("a", 10), ("c", 30))
+        self.assertEqual(plan_download(old, new).copies, 3)
+
+
+class SinglePairTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = Path(temporary.name)
+
+    def pair(self, name, data, chunk_size=None):
+        """Write ``name`` and its blockmap, cut here or into fixed-size chunks."""
+        asset = self.root / name
+        asset.write_bytes(data)
+        source = self.root / f"{name}.blockmap"
+        if chunk_size is None:
+            source.write_bytes(digest_file(asset, blockmap=True).blockmap)
+        else:
+            source.write_bytes(fixed_size_blockmap(data, chunk_size))
+        return f"{asset}={source}"
+
+    def run_main(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        argv = ["blockmap_savings.py", *argv, "--json"]
+        with mock.patch.object(sys, "argv", argv), contextlib.redirect_stdout(
+            out
+        ), contextlib.redirect_stderr(err):
+            status = blockmap_savings.main()
+        return status, json.loads(out.getvalue()), err.getvalue()
+
+    def test_explicit_pairs_are_compared_when_platform_keys_differ(self):
+        data = random.Random(13).randbytes(256 * 1024)
+        old = self.pair("xr-studio-1.0.0.exe", data)
+        new = self.pair("xr-studio-setup-1.0.1.exe", data[:1000] + b"patched" + data[1000:])
+        self.assertNotEqual(
+            blockmap_savings.platform_key("xr-studio-1.0.0.exe"),
+            blockmap_savings.platform_key("xr-studio-setup-1.0.1.exe"),
+        )
+        status, [row], warnings = self.run_main(old, new)
+        self.assertEqual((status, warnings), (0, ""))
+        self.assertEqual(row["platform"], "xr-studio-setup-*.exe")
+        self.assertEqual(
+            (row["old"], row["new"]), ("xr-studio-1.0.0.exe", "xr-studio-setup-1.0.1.exe")
+        )
+        self.assertEqual(row["size"], len(data) + 7)
+        self.assertGreater(row["saved"], 0)
+        self.assertLess(row["download"], row["size"])
+
+    def test_blockmap_from_another_chunker_warns(self):
+        data = random.Random(13).randbytes(256 * 1024)
+        old = self.pair("xr-studio-1.0.0.exe", data, chunk_size=2 * CHUNK_MAX_SIZE)
+        new = self.pair("xr-studio-1.0.1.exe", data)
+        status, [row], warnings = self.run_main(old, new)
+        self.assertEqual(status, 0)
+        self.assertIn("were chunked differently", warnings)
+        # Identical bytes, but no chunk in common: the first update is a full download.
+        self.assertEqual(row["download"], row["size"])
+
+    def test_chunked_here_checks_every_chunk_but_the_last(self):
+        self.assertTrue(chunked_here([8192, CHUNK_MAX_SIZE, 1]))
+        self.assertTrue(chunked_here([]))
+        self.assertFalse(chunked_here([8191, 8192]))
+        self.assertFalse(chunked_here([CHUNK_MAX_SIZE + 1, 1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
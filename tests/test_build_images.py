@@ -0,0 +1,162 @@
+import json
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+from unittest import mock
+
+import build_images
+from build_images import (
+    MANIFEST_NAME,
+    PNG_SIGNATURE,
+    ImageBuildError,
+    build,
+    check_variants,
+    read_png,
+    write_png,
+)
+from release_catalog import ROOT
+
+LOGO = "software/image/wulibot.png"
+
+
+def gradient(width, height, alpha):
+    """RGBA pixels whose rows compress differently, with ``alpha(x, y)`` opacity."""
+    return bytearray(
+        value
+        for y in range(height)
+        for x in range(width)
+        for value in ((x * 7) & 0xFF, (y * 13) & 0xFF, (x * y) & 0xFF, alpha(x, y))
+    )
+
+
+def filtered(rgba, width, height, bpp=4):
+    """Raw PNG rows using filter ``y % 5``, so a decode exercises every filter."""
+    stride = width * bpp
+    previous = bytes(stride)
+    raw = bytearray()
+    for y in range(height):
+        line = rgba[y * stride : (y + 1) * stride]
+        kind = y % 5
+        out = bytearray()
+        for i, value in enumerate(line):
+            left = line[i - bpp] if i >= bpp else 0
+            corner = previous[i - bpp] if i >= bpp else 0
+            predictor = (
+                0,
+                left,
+                previous[i],
+                (left + previous[i]) // 2,
+                build_images._paeth(left, previous[i], corner),
+            )[kind]
+            out.append((value - predictor) & 0xFF)
+        raw += bytes([kind]) + out
+        previous = line
+    return bytes(raw)
+
+
+def color_type(png):
+    return struct.unpack_from(">IIBB", png, len(PNG_SIGNATURE) + 8)[3]
+
+
+class PngCodecTest(unittest.TestCase):
+    def test_rgba_round_trip(self):
+        rgba = gradient(23, 17, lambda x, y: (x * 11 + y) & 0xFF)
+        png = write_png(23, 17, rgba)
+        self.assertEqual(color_type(png), 6)
+        self.assertEqual(read_png(png), (23, 17, rgba))
+
+    def test_opaque_image_is_stored_as_rgb(self):
+        rgba = gradient(19, 9, lambda x, y: 255)
+        png = write_png(19, 9, rgba)
+        self.assertEqual(color_type(png), 2)
+        self.assertEqual(read_png(png), (19, 9, rgba))
+
+    def test_every_filter_type_decodes(self):
+        rgba = gradient(13, 10, lambda x, y: (x * y * 3) & 0xFF)
+        header = struct.pack(">IIBBBBB", 13, 10, 8, 6, 0, 0, 0)
+        png = (
+            PNG_SIGNATURE
+            + build_images._chunk(b"IHDR", header)
+            + build_images._chunk(b"IDAT", zlib.compress(filtered(rgba, 13, 10)))
+            + build_images._chunk(b"IEND", b"")
+        )
+        self.assertEqual(read_png(png), (13, 10, rgba))
+
+    def test_repository_logos_decode(self):
+        # One RGB and one RGBA logo; together they cover every color type in use.
+        for source, kind in (("software/image/donkeycar.png", 2), (LOGO, 6)):
+            data = (ROOT / source).read_bytes()
+            width, height, rgba = read_png(data)
+            self.assertEqual(color_type(data), kind)
+            self.assertEqual(struct.unpack_from(">II", data, 16), (width, height))
+            self.assertEqual(len(rgba), width * height * 4)
+
+    def test_other_color_types_are_rejected(self):
+        for color in (0, 3, 4):
+            header = struct.pack(">IIBBBBB", 1, 1, 8, color, 0, 0, 0)
+            png = (
+                PNG_SIGNATURE
+                + build_images._chunk(b"IHDR", header)
+                + build_images._chunk(b"IDAT", zlib.compress(b"\0\0"))
+                + build_images._chunk(b"IEND", b"")
+            )
+            with self.assertRaisesRegex(ImageBuildError, "RGB or RGBA"):
+                read_png(png)
+
+
+class BuildCacheTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = Path(temporary.name) / "site"
+        self.cache = Path(temporary.name) / "cache"
+        (self.root / LOGO).parent.mkdir(parents=True)
+        shutil.copy(ROOT / LOGO, self.root / LOGO)
+        self.data = [{"logoSrc": f"./{LOGO}"}, {"logoSrc": "https://example.com/x.png"}]
+        (self.root / "data.json").write_text(json.dumps(self.data))
+
+    def variants(self):
+        manifest = json.loads((self.root / MANIFEST_NAME).read_text())
+        return {
+            item["path"]: (self.root / item["path"]).read_bytes()
+            for item in manifest["images"][LOGO]["variants"]
+        }
+
+    def test_cache_hit_skips_decoding(self):
+        self.assertEqual(check_variants(self.data, self.root), [])
+        [(source, action, _)] = build(self.root, self.cache)
+        self.assertEqual((source, action), (LOGO, "built"))
+        built = self.variants()
+        self.assertEqual(len(built), 2)
+        self.assertEqual(check_variants(self.data, self.root), [])
+
+        # A fresh checkout: nothing generated, only the cache survives.
+        shutil.rmtree(self.root / build_images.VARIANT_DIR)
+        (self.root / MANIFEST_NAME).unlink()
+        with mock.patch.object(build_images, "read_png", side_effect=AssertionError):
+            [(_, action, _)] = build(self.root, self.cache)
+            self.assertEqual(action, "cached")
+            self.assertEqual(self.variants(), built)
+            [(_, action, _)] = build(self.root, self.cache)
+            self.assertEqual(action, "up to date")
+
+    def test_changed_cache_entry_is_rebuilt(self):
+        build(self.root, self.cache)
+        for path in self.cache.glob("*.png"):
+            path.write_bytes(b"tampered")
+        (self.root / MANIFEST_NAME).unlink()
+        [(_, action, _)] = build(self.root, self.cache)
+        self.assertEqual(action, "built")
+
+    def test_replaced_logo_makes_the_variants_stale(self):
+        build(self.root, self.cache)
+        shutil.copy(ROOT / "software/image/roscollie.png", self.root / LOGO)
+        [problem] = check_variants(self.data, self.root)
+        self.assertIn("image variants are stale", problem)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import contextlib
+import io
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import deploy_metadata
+import timings
+from build_metadata import CATALOG_INDEX, build
+from deploy_metadata import (
+    STAGES,
+    STATE_KEY,
+    DeployError,
+    apply,
+    plan,
+    read_state,
+    stage_of,
+)
+from tos_store import LocalObjectStore, ObjectChangedError, ObjectExistsError
+
+
+class _RecordingStore(LocalObjectStore):
+    """Local store that remembers the order of metadata writes."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.written = []
+        self.before_replace = None
+        self._order = threading.Lock()
+
+    def replace(self, key, *args, **kwargs):
+        if self.before_replace is not None:
+            self.before_replace(key)
+        super().replace(key, *args, **kwargs)
+        with self._order:
+            self.written.append(key)
+
+
+def planned(plan_data):
+    return [item["key"] for stage in plan_data["stages"] for item in stage["files"]]
+
+
+class DeployMetadataTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        temporary = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(temporary.cleanup)
+        cls.build = Path(temporary.name) / "build"
+        build(cls.build)
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.store = _RecordingStore(Path(temporary.name))
+
+    def apply(self, plan_data, jobs=4):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return apply(self.store, plan_data, jobs)
+
+    def deploy(self, jobs=4):
+        plan_data = plan(self.store, self.build)
+        self.apply(plan_data, jobs)
+        return plan_data
+
+    def write_state(self, files):
+        _, etag = read_state(self.store)
+        state = json.dumps({"version": deploy_metadata.STATE_VERSION, "files": files})
+        self.store.replace(
+            STATE_KEY, state.encode(), "application/json", "no-store", if_match=etag
+        )
+
+    def test_first_deploy_uploads_everything_and_writes_the_state(self):
+        self.assertEqual(read_state(self.store), ({}, None))
+        plan_data = plan(self.store, self.build)
+        self.assertIsNone(plan_data["state_etag"])
+        self.assertEqual(sorted(planned(plan_data)), sorted(plan_data["state"]))
+        timings.reset()
+        self.assertEqual(self.apply(plan_data), len(plan_data["state"]))
+        # One upload phase per stage, with every uploaded byte counted once.
+        upload = timings.report("test", "ok")["phases"]["upload"]
+        sizes = [
+            Path(item["source"]).stat().st_size
+            for stage in plan_data["stages"]
+            for item in stage["files"]
+        ]
+        self.assertEqual((upload["calls"], upload["bytes"]), (len(STAGES), sum(sizes)))
+        files, etag = read_state(self.store)
+        self.assertEqual(files, plan_data["state"])
+        self.assertEqual(etag, self.store.head(STATE_KEY).etag)
+        self.assertIn("data.json", files)
+
+    def test_replanning_a_deployed_tree_is_a_no_op(self):
+        self.deploy()
+        self.store.written.clear()
+        plan_data = plan(self.store, self.build)
+        self.assertEqual(planned(plan_data), [])
+        self.assertEqual(plan_data["state_etag"], self.store.head(STATE_KEY).etag)
+        self.assertEqual(self.apply(plan_data), 0)
+        self.assertEqual(self.store.written, [STATE_KEY])
+
+    def test_only_changed_records_are_planned(self):
+        self.deploy()
+        files, _ = read_state(self.store)
+        files["style.css"] = {**files["style.css"], "sha256": "0" * 64}
+        self.write_state(files)
+        self.assertEqual(planned(plan(self.store, self.build)), ["style.css"])
+
+    def test_apply_against_a_stale_state_etag_fails(self):
+        self.deploy()
+        stale = plan(self.store, self.build, full=True)
+        files, _ = read_state(self.store)
+        self.write_state({**files, "data/extra.json": files["data.json"]})
+        self.store.written.clear()
+        with self.assertRaisesRegex(DeployError, "changed since the plan was made"):
+            self.apply(stale)
+        self.assertEqual(self.store.written, [])
+
+    def race_apply(self, plan_data, error):
+        """Let another deployment write the state while ``plan_data`` uploads."""
+
+        def concurrent_deploy(key):
+            if key == CATALOG_INDEX:
+                self.store.before_replace = None
+                self.write_state({"index.html": {}})
+
+        self.store.before_replace = concurrent_deploy
+        with self.assertRaises(error):
+            self.apply(plan_data)
+        self.assertEqual(read_state(self.store)[0], {"index.html": {}})
+
+    def test_state_written_during_the_first_deploy_is_not_overwritten(self):
+        self.race_apply(plan(self.store, self.build), ObjectExistsError)
+
+    def test_state_changed_during_apply_is_not_overwritten(self):
+        self.deploy()
+        self.race_apply(plan(self.store, self.build, full=True), ObjectChangedError)
+
+    def test_removed_tracked_file_fails_the_plan(self):
+        self.deploy()
+        files, _ = read_state(self.store)
+        removed = "docs/removed.html"
+        self.store.put(removed, b"<html></html>", {}, "no-cache")
+        self.write_state({**files, removed: files["index.html"]})
+        with self.assertRaisesRegex(DeployError, "deletion/rename is forbidden"):
+            plan(self.store, self.build)
+
+    def test_generated_shards_and_old_fingerprints_may_drop_out(self):
+        self.deploy()
+        files, _ = read_state(self.store)
+        dropped = ["data/old.0123456789ab.json", "style.0123456789ab.css"]
+        for key in dropped:
+            self.store.put(key, b"old", {}, "no-cache")
+        self.write_state({**files, **{key: files["style.css"] for key in dropped}})
+        plan_data = plan(self.store, self.build)
+        self.assertEqual(planned(plan_data), [])
+        self.assertFalse(set(dropped) & set(plan_data["state"]))
+
+    def test_stages_upload_in_order_and_the_state_last(self):
+        plan_data = self.deploy(jobs=8)
+        self.assertEqual([stage["name"] for stage in plan_data["stages"]], list(STAGES))
+        order = [STAGES.index(stage_of(key)) for key in self.store.written[:-1]]
+        self.assertEqual(order, sorted(order))
+        self.assertEqual(set(order), set(range(len(STAGES))))
+        self.assertEqual(self.store.written[-1], STATE_KEY)
+        self.assertLess(
+            self.store.written.index("style.css"), self.store.written.index("index.html")
+        )
+        self.assertLess(
+            self.store.written.index("data.json"), self.store.written.index(CATALOG_INDEX)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from build_metadata import IMMUTABLE_CACHE_CONTROL
+from deploy_metadata import cache_control
+from fingerprint_assets import fingerprint_text, is_fingerprinted
+from release_catalog import normalize_object
+
+FINGERPRINTS = {
+    "style.css": "92533870d66b",
+    "software/ios/app.png": "0123456789ab",
+    "docs/assets/shot.png": "ba9876543210",
+}
+
+
+class FingerprintTextTest(unittest.TestCase):
+    def rewrite(self, relative, text):
+        return fingerprint_text(relative, text, FINGERPRINTS)
+
+    def test_digest_goes_into_the_object_name(self):
+        text, problems = self.rewrite("index.html", '<link href="style.css"/>')
+        self.assertEqual(text, '<link href="style.92533870d66b.css"/>')
+        self.assertEqual(problems, ["index.html: style.css has a missing fingerprint"])
+
+    def test_query_and_stale_fingerprints_are_replaced(self):
+        for old in ("software/ios/app.png?v=0123456789ab", "software/ios/app.000000000000.png"):
+            text, problems = self.rewrite("data.json", f'"{old}"')
+            self.assertEqual(text, '"software/ios/app.0123456789ab.png"')
+            self.assertEqual(problems, ["data.json: software/ios/app.png has a stale fingerprint"])
+
+    def test_current_references_are_unchanged(self):
+        text = "<img src='./assets/shot.ba9876543210.png'>"
+        self.assertEqual(self.rewrite("docs/page.html", text), (text, []))
+
+    def test_logo_variants_and_other_paths_are_left_alone(self):
+        text = '"software/image/variants/app.48x48.abcdefabcdef.png" "update/app.yml"'
+        self.assertEqual(self.rewrite("index.html", text), (text, []))
+
+    def test_unknown_static_asset_is_reported(self):
+        _, problems = self.rewrite("index.html", '"software/ios/gone.0123456789ab.png"')
+        self.assertEqual(
+            problems, ["index.html: software/ios/gone.png is not a static asset in the repository"]
+        )
+
+
+class PublishedNameTest(unittest.TestCase):
+    def test_only_fingerprinted_names_are_immutable(self):
+        self.assertTrue(is_fingerprinted("software/ios/app.0123456789ab.png"))
+        self.assertFalse(is_fingerprinted("software/ios/app.png"))
+        self.assertFalse(is_fingerprinted("software/image/variants/app.48x48.abcdefabcdef.png"))
+        self.assertEqual(cache_control("style.92533870d66b.css"), IMMUTABLE_CACHE_CONTROL)
+        self.assertNotEqual(cache_control("style.css"), IMMUTABLE_CACHE_CONTROL)
+        self.assertNotEqual(cache_control("software/ios/app.png"), IMMUTABLE_CACHE_CONTROL)
+
+    def test_fingerprinted_links_map_to_the_source_object(self):
+        self.assertEqual(
+            normalize_object("./software/ios/app.0123456789ab.png"), "software/ios/app.png"
+        )
+
+    def test_release_keys_with_a_hex_segment_are_unchanged(self):
+        for value, base in (
+            ("firmware/arm/fw.1a2b3c4d5e6f.bin", ""),
+            ("./software/pc/app.1a2b3c4d5e6f.exe", ""),
+            ("fw.1a2b3c4d5e6f.bin", "firmware/mxbit/"),
+            ("software/image/variants/app.48x48.abcdefabcdef.png", ""),
+        ):
+            self.assertEqual(
+                normalize_object(value, base), (base + value).replace("./", "")
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import random
+import unittest
+
+from firmware_delta import HEADER, DeltaError, apply_patch, create_patch, read_header
+
+
+def firmware_image(seed: int, size: int) -> bytes:
+    """Code-like bytes: repeated instruction patterns with varying operands."""
+    generator = random.Random(seed)
+    words = [generator.randbytes(4) for _ in range(64)]
+    return b"".join(generator.choice(words) for _ in range(size // 4))
+
+
+class RoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.source = firmware_image(1, 64 * 1024)
+
+    def assertRoundTrip(self, target: bytes) -> bytes:
+        patch = create_patch(self.source, target)
+        self.assertEqual(apply_patch(self.source, patch), target)
+        return patch
+
+    def test_identical_image(self):
+        patch = self.assertRoundTrip(self.source)
+        self.assertLess(len(patch), len(self.source) // 20)
+
+    def test_appended_image(self):
+        self.assertRoundTrip(self.source + firmware_image(2, 4096))
+
+    def test_truncated_image(self):
+        self.assertRoundTrip(self.source[: len(self.source) // 3])
+
+    def test_patched_image(self):
+        target = bytearray(self.source)
+        for offset in range(100, len(target), 997):
+            target[offset] ^= 0x5A
+        target[20_000:20_000] = b"new function body" * 40
+        self.assertRoundTrip(bytes(target))
+
+    def test_unrelated_random_image(self):
+        self.assertRoundTrip(random.Random(3).randbytes(16 * 1024))
+
+    def test_empty_images(self):
+        self.assertEqual(apply_patch(b"", create_patch(b"", b"")), b"")
+        self.assertRoundTrip(b"")
+
+
+class RejectionTest(unittest.TestCase):
+    def setUp(self):
+        self.source = firmware_image(4, 32 * 1024)
+        target = bytearray(self.source)
+        target[1000:1004] = b"\x01\x02\x03\x04"
+        self.target = bytes(target) + b"tail"
+        self.patch = create_patch(self.source, self.target)
+
+    def test_wrong_base_image(self):
+        wrong = bytearray(self.source)
+        wrong[-1] ^= 1
+        with self.assertRaisesRegex(DeltaError, "source image does not match"):
+            apply_patch(bytes(wrong), self.patch)
+        with self.assertRaisesRegex(DeltaError, "source image does not match"):
+            apply_patch(self.source[:-1], self.patch)
+
+    def test_corrupted_stream(self):
+        for offset in range(HEADER.size, len(self.patch)):
+            corrupt = bytearray(self.patch)
+            corrupt[offset] ^= 0xFF
+            with self.assertRaises(DeltaError, msg=f"byte {offset} flipped"):
+                apply_patch(self.source, bytes(corrupt))
+
+    def test_corrupted_target_digest(self):
+        corrupt = bytearray(self.patch)
+        corrupt[HEADER.size - 3 * 8 - 1] ^= 0xFF  # last byte of the target SHA256
+        with self.assertRaisesRegex(DeltaError, "rebuilt image does not match"):
+            apply_patch(self.source, bytes(corrupt))
+
+    def test_truncated_or_foreign_patch(self):
+        with self.assertRaisesRegex(DeltaError, "truncated"):
+            apply_patch(self.source, self.patch[: HEADER.size - 1])
+        with self.assertRaisesRegex(DeltaError, "stream lengths"):
+            apply_patch(self.source, self.patch[:-1])
+        with self.assertRaisesRegex(DeltaError, "not a firmware delta"):
+            read_header(b"NOTDELTA" + self.patch[8:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import prepare_release
+from github_releases import GitHubReleaseClient
+
+ASSET = b"draft asset bytes\n" * 64
+
+
+class _ClosingHandler(BaseHTTPRequestHandler):
+    """Fake GitHub API that silently drops every connection after one response.
+
+    Releases created through it are kept in ``server.releases`` and uploaded
+    bodies in ``server.uploads``, so the client can be driven end to end.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # No "Connection: close": the client keeps the socket and only finds
+        # out it is dead when it sends the next request.
+        self.close_connection = True
+
+    def _json(self, status, value):
+        self._reply(status, json.dumps(value).encode())
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, None))
+        if self.path.startswith("/repos/o/r/releases/assets/"):
+            self._reply(200, ASSET, "application/octet-stream")
+        else:
+            self._json(200, self.server.releases)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append(("POST", self.path, body))
+        url = urlsplit(self.path)
+        if url.path == "/repos/o/r/releases":
+            payload = json.loads(body)
+            release = {
+                "id": len(self.server.releases) + 1,
+                "tag_name": payload["tag_name"],
+                "name": payload["name"],
+                "draft": payload["draft"],
+                "assets": [],
+            }
+            self.server.releases.append(release)
+            self._json(201, release)
+            return
+        release_id = int(url.path.split("/")[-2])
+        release = next(item for item in self.server.releases if item["id"] == release_id)
+        asset = {
+            "id": 100 + len(release["assets"]),
+            "name": parse_qs(url.query)["name"][0],
+            "state": "uploaded",
+            "size": len(body),
+            "digest": f"sha256:{hashlib.sha256(body).hexdigest()}",
+        }
+        release["assets"].append(asset)
+        self.server.uploads[asset["name"]] = body
+        self._json(201, asset)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGitHubTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ClosingHandler)
+        self.server.requests = []
+        self.server.releases = []
+        self.server.uploads = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.client = GitHubReleaseClient("o/r", "token", api_url=self.url, upload_url=self.url)
+        self.addCleanup(self.client.close)
+
+    def paths(self, method):
+        return [path for verb, path, _ in self.server.requests if verb == method]
+
+
+class KeepAliveRetryTest(FakeGitHubTest):
+    def setUp(self):
+        super().setUp()
+        self.server.releases.append({"id": 1, "tag_name": "v1", "draft": True, "assets": []})
+
+    def test_api_request_reconnects_on_stale_socket(self):
+        for _ in range(3):
+            self.assertEqual(self.client.release_info("v1")["id"], 1)
+        self.assertEqual(self.client.requests, 3)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_open_asset_reconnects_on_stale_socket(self):
+        self.client.release_info("v1")
+        for asset_id in (7, 8):
+            with self.client.open_asset(asset_id) as stream:
+                self.assertEqual(stream.read(), ASSET)
+        self.assertEqual(
+            self.paths("GET")[1:],
+            ["/repos/o/r/releases/assets/7", "/repos/o/r/releases/assets/8"],
+        )
+
+
+class DraftUploadTest(FakeGitHubTest):
+    def test_create_draft_release(self):
+        self.assertIsNone(self.client.release_info("v2"))
+        release = self.client.create_draft_release("v2", "Version 2", "master", "notes")
+        self.assertEqual(
+            release,
+            {"id": 1, "isDraft": True, "name": "Version 2", "tagName": "v2", "assets": []},
+        )
+        payload = json.loads(self.server.requests[-1][2])
+        self.assertEqual(payload["target_commitish"], "master")
+        self.assertTrue(payload["draft"])
+
+    def test_upload_streams_the_file_and_retries_a_stale_socket(self):
+        release = self.client.create_draft_release("v2", "Version 2", "master", "notes")
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / "app.exe"
+            source.write_bytes(ASSET * 512)
+            with mock.patch.object(Path, "read_bytes", side_effect=AssertionError("copied")):
+                # The create above left a socket the server has since closed.
+                asset = self.client.upload_asset(release["id"], source, "app.exe")
+        self.assertEqual(asset["size"], len(ASSET) * 512)
+        self.assertEqual(self.server.uploads["app.exe"], ASSET * 512)
+        self.assertEqual(self.paths("POST")[-1], "/repos/o/r/releases/1/assets?name=app.exe")
+        self.assertEqual(self.client.requests, 2)
+
+    def test_prepare_release_over_the_api_transport(self):
+        with tempfile.TemporaryDirectory() as directory:
+            root = Path(directory)
+            sources = []
+            for name, data in (("app-1.0.0-win-x64.exe", ASSET * 3), ("fw 1.0.bin", ASSET)):
+                source = root / name
+                source.write_bytes(data)
+                key = "ota/app/" if name.endswith(".exe") else "firmware/arm/"
+                sources += ["--asset", f"{source}={key}{name}"]
+            argv = [
+                "prepare_release.py",
+                "--tag",
+                "app-v1.0.0",
+                "--title",
+                "App 1.0.0",
+                "--repo",
+                "o/r",
+                "--transport",
+                "api",
+                "--no-cache",
+                "--jobs",
+                "2",
+                *sources,
+            ]
+            client = functools.partial(
+                GitHubReleaseClient, api_url=self.url, upload_url=self.url
+            )
+            out = io.StringIO()
+            with mock.patch.object(sys, "argv", argv), mock.patch.multiple(
+                prepare_release,
+                ROOT=root,
+                MANIFEST_DIR=root / "releases",
+                GitHubReleaseClient=client,
+            ), mock.patch.dict(os.environ, {"GH_TOKEN": "token"}), contextlib.redirect_stdout(
+                out
+            ):
+                status = prepare_release.main()
+            self.assertEqual(status, 0, out.getvalue())
+            manifest = json.loads((root / "releases/app-v1.0.0.json").read_text())
+
+        # One draft, three streamed uploads (with the generated blockmap).
+        self.assertEqual(len(self.server.releases), 1)
+        self.assertTrue(self.server.releases[0]["draft"])
+        self.assertEqual(
+            sorted(self.server.uploads),
+            ["app-1.0.0-win-x64.exe", "app-1.0.0-win-x64.exe.blockmap", "fw.1.0.bin"],
+        )
+        self.assertEqual(self.server.uploads["fw.1.0.bin"], ASSET)
+        declared = {asset["name"]: asset for asset in manifest["assets"]}
+        self.assertEqual(declared["fw.1.0.bin"]["tos_key"], "firmware/arm/fw 1.0.bin")
+        for name, asset in declared.items():
+            body = self.server.uploads[name]
+            self.assertEqual(asset["size"], len(body))
+            self.assertEqual(asset["sha256"], hashlib.sha256(body).hexdigest())
+        self.assertIn("GitHub API requests: 5", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
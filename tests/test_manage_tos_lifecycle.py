@@ -0,0 +1,40 @@
+import unittest
+
+from manage_tos_lifecycle import build_variant, hot_rollbacks, tier_plan
+from release_catalog import ReleaseCatalog
+
+APK = "https://software.xiao-r.com/software/android/app_V1.{}_{}-release.apk"
+
+
+class HotRollbackTest(unittest.TestCase):
+    def test_newest_rollback_is_kept_per_abi(self):
+        old = [
+            APK.format(3, "arm64-v8a"),
+            APK.format(2, "armeabi-v7a"),
+            APK.format(2, "arm64-v8a"),
+            APK.format(1, "armeabi-v7a"),
+        ]
+        self.assertEqual(hot_rollbacks({"oldVersion": old}), old[:2])
+
+    def test_platform_and_file_type_are_variants(self):
+        self.assertEqual(build_variant("xr-studio-1.0.0-win-x64.exe"), (".exe", "win", "x64"))
+        self.assertEqual(build_variant("xr-studio-1.0.0-mac-arm64.dmg"), (".dmg", "mac", "arm64"))
+        self.assertEqual(build_variant("WIFIRobot_V2.7.1_Setup.exe"), (".exe",))
+
+    def test_checkout_plan(self):
+        catalog = ReleaseCatalog()
+        plan = tier_plan(catalog)
+        for key in catalog.superseded_keys:
+            self.assertEqual(plan[key], "superseded")
+        # The newest rollback of each ABI of a multi-ABI entry stays hot.
+        rollbacks = {
+            "XR-Controller_V1.4.162.260212.379dc84_arm64-v8a-release.apk": None,
+            "XR-Controller_V1.4.144.251030.ac19f2c_armeabi-v7a-release.apk": None,
+            "XR-Controller_V1.4.143.250603.91316e0_armeabi-v7a-release.apk": "historical",
+        }
+        for name, tier in rollbacks.items():
+            self.assertEqual(plan[f"software/android/{name}"], tier)
+
+
+if __name__ == "__main__":
+    unittest.main()
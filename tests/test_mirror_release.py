@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+import mirror_release
+from asset_digest import MultiDigest
+from mirror_release import (
+    MirrorError,
+    UploadJournal,
+    object_meta,
+    stream_upload,
+    verify_existing,
+)
+from tos_store import LocalObjectStore, ObjectStoreError, open_store
+
+PART_SIZE = 1024
+KEY = "software/pc/app-1.0.0.exe"
+
+
+class ResumeMultipartTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = Path(temporary.name)
+        self.data = os.urandom(PART_SIZE * 10 + 123)
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        self.journal = UploadJournal(self.root / "journal")
+
+    def store(self, fail_parts: str = ""):
+        """Open the local stand-in through the environment hook, counting part uploads."""
+        environment = {
+            "XIAOR_TOS_LOCAL_DIR": str(self.root / "bucket"),
+            "XIAOR_TOS_LOCAL_FAIL_PARTS": fail_parts,
+        }
+        with mock.patch.dict(os.environ, environment):
+            store = open_store()
+        store.uploaded = []
+        upload_part = store.upload_part
+
+        def counting(key, upload_id, number, data):
+            etag = upload_part(key, upload_id, number, data)
+            store.uploaded.append(number)
+            return etag
+
+        store.upload_part = counting
+        return store
+
+    def upload(self, store) -> int:
+        return stream_upload(
+            store,
+            KEY,
+            BytesIO(self.data),
+            len(self.data),
+            self.sha256,
+            None,
+            part_size=PART_SIZE,
+            part_jobs=2,
+            journal=self.journal,
+        )
+
+    def test_rerun_uploads_only_missing_parts(self):
+        first = self.store("4")
+        with mock.patch.object(mirror_release, "PART_RETRIES", 0):
+            with self.assertRaisesRegex(ObjectStoreError, "injected failure for part 4"):
+                self.upload(first)
+        self.assertIsNone(first.head(KEY))
+        self.assertNotIn(4, first.uploaded)
+
+        second = self.store()
+        reused = self.upload(second)
+        total = -(-len(self.data) // PART_SIZE)
+        self.assertEqual(reused, len(set(first.uploaded)))
+        missing = set(range(1, total + 1)) - set(first.uploaded)
+        self.assertEqual(sorted(second.uploaded), sorted(missing))
+
+        info = second.head(KEY)
+        self.assertEqual(info.meta["sha256"], self.sha256)
+        digest = MultiDigest()
+        for chunk in second.read(KEY):
+            digest.update(chunk)
+        self.assertEqual(digest.sha256, self.sha256)
+        self.assertEqual(list((self.root / "journal").glob("*.json")), [])
+
+    def test_failed_part_is_retried_within_a_run(self):
+        store = self.store("2")
+        with mock.patch.object(mirror_release.time, "sleep"):
+            self.assertEqual(self.upload(store), 0)
+        self.assertEqual(store.uploaded.count(2), 1)
+        self.assertEqual(b"".join(store.read(KEY)), self.data)
+
+    def test_digest_mismatch_aborts_and_forgets_the_upload(self):
+        store = self.store()
+        with self.assertRaisesRegex(MirrorError, "SHA256 mismatch"):
+            stream_upload(
+                store,
+                KEY,
+                BytesIO(self.data),
+                len(self.data),
+                "0" * 64,
+                None,
+                part_size=PART_SIZE,
+                journal=self.journal,
+            )
+        self.assertIsNone(store.head(KEY))
+        self.assertEqual(list((self.root / "bucket" / "uploads").iterdir()), [])
+        self.assertEqual(list((self.root / "journal").glob("*.json")), [])
+
+
+class VerifyExistingTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = Path(temporary.name)
+        self.store = LocalObjectStore(self.root / "bucket")
+        self.journal = UploadJournal(self.root / "journal")
+        self.args = argparse.Namespace(
+            verify_existing="metadata", part_size=PART_SIZE, part_jobs=2
+        )
+        self.data = os.urandom(PART_SIZE * 3)
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        self.store.put(KEY, self.data, object_meta(self.sha256, None), "no-cache")
+
+    def verify(self, journal):
+        info = self.store.head(KEY)
+        return verify_existing(
+            self.store, info, len(self.data), self.sha256, None, self.args, journal
+        )
+
+    def test_recorded_etag_is_trusted_after_one_hash(self):
+        self.assertEqual(self.verify(self.journal), "content")
+        self.assertEqual(self.verify(self.journal), "metadata")
+        self.assertEqual(self.verify(None), "content")
+
+    def test_out_of_band_overwrite_with_copied_metadata_is_rehashed(self):
+        self.assertEqual(self.verify(self.journal), "content")
+        replaced = os.urandom(len(self.data))
+        (self.root / "bucket" / "objects" / KEY).write_bytes(replaced)
+        meta_path = self.store._meta_path(KEY)
+        extra = json.loads(meta_path.read_text(encoding="utf-8"))
+        extra["etag"] = hashlib.md5(replaced).hexdigest()
+        meta_path.write_text(json.dumps(extra), encoding="utf-8")
+
+        self.assertEqual(self.store.head(KEY).meta["sha256"], self.sha256)
+        with self.assertRaisesRegex(MirrorError, "refusing overwrite"):
+            self.verify(self.journal)
+
+
+
+class _PublishedRelease:
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+    def release_info(self, tag):
+        assets = [{"name": asset["name"]} for asset in self.manifest["assets"]]
+        return {"id": 1, "isDraft": False, "tagName": tag, "assets": assets}
+
+
+class ReplaySupersededTest(unittest.TestCase):
+    def test_replay_skips_superseded_keys_and_never_copies_from_them(self):
+        catalog = mirror_release.ReleaseCatalog(mirror_release.ROOT)
+        path = "releases/xr-studio-v1.0.0-ota.json"
+        manifest = catalog.manifests[path]
+        listed = {asset["tos_key"] for asset in manifest["assets"]}
+        self.assertTrue(listed & catalog.superseded_keys)
+        args = argparse.Namespace(jobs=1, target=None)
+        with mock.patch.object(mirror_release, "mirror_asset", return_value="ok") as mirror:
+            mirror_release.mirror_manifest(
+                _PublishedRelease(manifest), None, path, catalog, args
+            )
+        mirrored = {call.args[3]["tos_key"] for call in mirror.call_args_list}
+        self.assertEqual(mirrored, listed - catalog.superseded_keys)
+        for call in mirror.call_args_list:
+            self.assertFalse(set(call.args[5]) & catalog.superseded_keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import tos_inventory
+from tos_inventory import check, list_inventory, read_cache, write_cache
+from tos_store import LocalObjectStore
+
+OBJECTS = {
+    "software/pc/app-1.0.0.exe": b"installer" * 100,
+    "firmware/mxbit/fw-1.0.0.hex": b"firmware" * 10,
+    "ota/app/app-1.0.0.zip": b"package" * 50,
+}
+
+
+def cached_fields(inventory):
+    # The snapshot keeps what a TOS listing returns; Cache-Control is not listed.
+    return {key: (info.size, info.etag, info.meta) for key, info in inventory.items()}
+
+
+class InventoryTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = Path(temporary.name)
+        self.store = LocalObjectStore(self.root / "bucket")
+        for key, data in OBJECTS.items():
+            self.store.put(key, data, {"sha256": "x"}, "no-cache")
+        self.store.put("docs/page.html", b"<html></html>", {}, "no-cache")
+        self.sizes = {key: len(data) for key, data in OBJECTS.items()}
+
+    def test_listing_covers_the_three_prefixes_only(self):
+        inventory = list_inventory(self.store)
+        self.assertEqual(set(inventory), set(OBJECTS))
+        for key, info in inventory.items():
+            self.assertEqual(info, self.store.head(key))
+
+    def test_check_reports_missing_keys_and_size_mismatches(self):
+        inventory = list_inventory(self.store)
+        self.assertEqual(check(set(OBJECTS), inventory, self.sizes), [])
+        sizes = {**self.sizes, "ota/app/app-1.0.0.zip": 1}
+        self.assertEqual(
+            check({*OBJECTS, "software/pc/gone.exe"}, inventory, sizes),
+            [
+                f"TOS object size {len(OBJECTS['ota/app/app-1.0.0.zip'])} does not match "
+                "manifest 1: ota/app/app-1.0.0.zip",
+                "missing TOS object: software/pc/gone.exe",
+            ],
+        )
+
+    def test_cache_round_trip_and_expiry(self):
+        path = self.root / "cache" / "inventory.json"
+        inventory = list_inventory(self.store)
+        write_cache(path, inventory)
+        self.assertEqual(cached_fields(read_cache(path, 60)), cached_fields(inventory))
+        later = tos_inventory.time.time() + 61
+        with mock.patch.object(tos_inventory.time, "time", return_value=later):
+            self.assertIsNone(read_cache(path, 60))
+
+    def test_cache_for_other_prefixes_or_versions_is_rejected(self):
+        path = self.root / "inventory.json"
+        write_cache(path, list_inventory(self.store))
+        data = json.loads(path.read_text())
+        for change in ({"prefixes": ["software/"]}, {"version": 0}):
+            path.write_text(json.dumps({**data, **change}))
+            self.assertIsNone(read_cache(path, 60))
+        path.write_text("{")
+        self.assertIsNone(read_cache(path, 60))
+        self.assertIsNone(read_cache(self.root / "missing.json", 60))
+
+    def run_main(self, cache):
+        argv = ["tos_inventory.py", "--cache", str(cache)]
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch.object(sys, "argv", argv), mock.patch.dict(
+            os.environ, {"XIAOR_TOS_LOCAL_DIR": str(self.root / "bucket")}
+        ), mock.patch.object(tos_inventory, "validate", return_value=set(OBJECTS)), (
+            mock.patch.object(tos_inventory, "manifest_sizes", return_value=self.sizes)
+        ), mock.patch.object(
+            LocalObjectStore, "list", autospec=True, side_effect=LocalObjectStore.list
+        ) as listing, contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            status = tos_inventory.main()
+        return status, out.getvalue() + err.getvalue(), listing.call_count
+
+    def test_fresh_cache_is_used_without_listing(self):
+        cache = self.root / "inventory.json"
+        write_cache(cache, list_inventory(self.store))
+        status, output, listings = self.run_main(cache)
+        self.assertEqual((status, listings), (0, 0))
+        self.assertIn("against cached inventory of 3 objects", output)
+
+    def test_cache_miss_forces_a_fresh_listing(self):
+        cache = self.root / "inventory.json"
+        inventory = list_inventory(self.store)
+        del inventory["ota/app/app-1.0.0.zip"]
+        write_cache(cache, inventory)
+        status, output, listings = self.run_main(cache)
+        self.assertEqual((status, listings), (0, 3))
+        self.assertIn("against listed inventory of 3 objects", output)
+        self.assertEqual(
+            cached_fields(read_cache(cache, 60)), cached_fields(list_inventory(self.store))
+        )
+
+    def test_object_missing_from_the_bucket_fails(self):
+        self.sizes["software/pc/gone.exe"] = 1
+        with mock.patch.dict(OBJECTS, {"software/pc/gone.exe": b"x"}):
+            status, output, _ = self.run_main(self.root / "inventory.json")
+        self.assertEqual(status, 1)
+        self.assertIn("missing TOS object: software/pc/gone.exe", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
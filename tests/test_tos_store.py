@@ -0,0 +1,140 @@
+import argparse
+import hashlib
+import tempfile
+import threading
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+import mirror_release
+from mirror_release import hash_object, mirror_asset, stream_upload
+from tos_store import LocalObjectStore, ObjectChangedError, ObjectExistsError
+
+KEY = "software/pc/app-1.0.0.exe"
+PART_SIZE = 1024
+
+
+class _Release:
+    """Stand-in GitHub client serving one draft asset."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.downloads = 0
+
+    def open_asset(self, asset_id):
+        self.downloads += 1
+        return BytesIO(self.data)
+
+
+class ConditionalWriteTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.store = LocalObjectStore(Path(temporary.name))
+
+    def test_concurrent_multipart_writers_keep_the_first_object(self):
+        first, second = b"a" * 3000, b"b" * 3000
+        uploads = []
+        for data in (first, second):
+            upload_id = self.store.create_multipart(KEY, {}, "no-cache")
+            etag = self.store.upload_part(KEY, upload_id, 1, data)
+            uploads.append((upload_id, etag))
+        self.store.complete_multipart(KEY, uploads[0][0], [(1, uploads[0][1])])
+        with self.assertRaises(ObjectExistsError):
+            self.store.complete_multipart(KEY, uploads[1][0], [(1, uploads[1][1])])
+        self.assertEqual(b"".join(self.store.read(KEY)), first)
+
+    def test_racing_puts_commit_exactly_once(self):
+        errors = []
+
+        def put(index):
+            try:
+                self.store.put(KEY, bytes([index]) * 4096, {}, "no-cache")
+            except ObjectExistsError:
+                errors.append(index)
+
+        threads = [threading.Thread(target=put, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 7)
+        self.assertEqual(len(set(b"".join(self.store.read(KEY)))), 1)
+
+    def test_stale_etag_is_rejected(self):
+        self.store.replace(KEY, b"version 1", "text/plain", "no-store", if_absent=True)
+        stale = self.store.head(KEY)
+        self.store.replace(KEY, b"version 2", "text/plain", "no-store", if_match=stale.etag)
+        with self.assertRaises(ObjectChangedError):
+            self.store.replace(KEY, b"version 3", "text/plain", "no-store", if_match=stale.etag)
+        with self.assertRaises(ObjectExistsError):
+            self.store.replace(KEY, b"version 3", "text/plain", "no-store", if_absent=True)
+        with self.assertRaises(ObjectChangedError):
+            hash_object(self.store, stale)
+        self.assertEqual(b"".join(self.store.read(KEY)), b"version 2")
+
+    def test_replace_with_the_current_etag_keeps_identical_content(self):
+        self.store.replace(KEY, b"same", "text/plain", "no-store", if_absent=True)
+        before = self.store.head(KEY)
+        self.store.replace(KEY, b"same", "text/plain", "no-store", if_match=before.etag)
+        self.assertEqual(self.store.head(KEY), before)
+
+
+class IdenticalRewriteTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = Path(temporary.name)
+        self.store = LocalObjectStore(self.root / "bucket")
+        self.data = bytes(range(256)) * 20
+        self.asset = {
+            "name": "app-1.0.0.exe",
+            "tos_key": KEY,
+            "size": len(self.data),
+            "sha256": hashlib.sha256(self.data).hexdigest(),
+        }
+        self.args = argparse.Namespace(
+            verify_existing="metadata",
+            part_size=PART_SIZE,
+            part_jobs=2,
+            public_base_url="http://127.0.0.1/",
+        )
+        self.journal = mirror_release.UploadJournal(self.root / "journal")
+
+    def mirror(self, client):
+        draft = {self.asset["name"]: {"id": 1, "size": len(self.data), "digest": None}}
+        with mock.patch.object(mirror_release, "verify_public"):
+            return mirror_asset(
+                client, self.store, draft, self.asset, {}, [], self.args, self.journal
+            )
+
+    def test_mirroring_identical_content_again_writes_nothing(self):
+        client = _Release(self.data)
+        self.assertIn("Uploaded new TOS object", self.mirror(client))
+        written = self.store.head(KEY)
+        with mock.patch.object(self.store, "create_multipart") as create, mock.patch.object(
+            self.store, "put"
+        ) as put:
+            self.assertIn("already matches (metadata); skipped", self.mirror(client))
+        create.assert_not_called()
+        put.assert_not_called()
+        self.assertEqual(client.downloads, 1)
+        self.assertEqual(self.store.head(KEY), written)
+
+    def test_different_content_under_the_same_key_is_refused(self):
+        stream_upload(
+            self.store,
+            KEY,
+            BytesIO(b"x" * len(self.data)),
+            len(self.data),
+            hashlib.sha256(b"x" * len(self.data)).hexdigest(),
+            None,
+            part_size=PART_SIZE,
+        )
+        with self.assertRaisesRegex(mirror_release.MirrorError, "refusing overwrite"):
+            self.mirror(_Release(self.data))
+
+
+if __name__ == "__main__":
+    unittest.main()
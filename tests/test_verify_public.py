@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import io
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import verify_public
+from mirror_release import IMMUTABLE_CACHE_CONTROL
+from release_catalog import ROOT
+from verify_public import Expectation, PublicVerifier
+
+ASSET = bytes(range(256)) * 40
+STATIC_KEY = "software/ios/wifirobot-ios.png"
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)$")
+
+
+class _ObjectHandler(BaseHTTPRequestHandler):
+    """Keep-alive HTTP/1.1 host serving ``server.objects`` with HEAD and Range."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, send_body):
+        key = self.path.lstrip("/")
+        if key not in self.server.objects:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, declared = self.server.objects[key]
+        status = 200
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if match:
+            start, end = int(match[1]), min(int(match[2]), len(body) - 1)
+            content_range = f"bytes {start}-{end}/{len(body)}"
+            body, status = body[start : end + 1], 206
+        self.send_response(status)
+        self.send_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+        if status == 206:
+            self.send_header("Content-Range", content_range)
+        # ``declared`` lets a HEAD claim a size that differs from the bytes served.
+        length = declared if declared is not None and status == 200 else len(body)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def log_message(self, *args):
+        pass
+
+
+class PublicVerifyTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ObjectHandler)
+        self.server.objects = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.sha256 = hashlib.sha256(ASSET).hexdigest()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve(self, key, body, declared=None):
+        self.server.objects[key] = (body, declared)
+
+    def check(self, key, hash_content=True):
+        verifier = PublicVerifier(self.base_url, connections=2, rate=0, retries=0)
+        expected = Expectation(key, len(ASSET), self.sha256, IMMUTABLE_CACHE_CONTROL)
+        hashed = {key} if hash_content else set()
+        return asyncio.run(verifier.verify([expected], hashed)), verifier
+
+    def test_matching_object_passes_over_one_connection(self):
+        self.serve("software/pc/app.exe", ASSET)
+        with mock.patch.object(verify_public, "RANGE_SIZE", 4096):
+            problems, verifier = self.check("software/pc/app.exe")
+        self.assertEqual(problems, [])
+        # HEAD, Range 0-0 and three 4 KiB ranges reuse one keep-alive socket.
+        self.assertEqual((verifier.requests, verifier.opened), (5, 1))
+
+    def test_missing_object_fails(self):
+        problems, _ = self.check("software/pc/missing.exe")
+        self.assertEqual(problems, ["public HEAD returned 404: software/pc/missing.exe"])
+
+    def test_wrong_content_length_fails(self):
+        self.serve("software/pc/app.exe", ASSET, declared=len(ASSET) - 1)
+        problems, _ = self.check("software/pc/app.exe")
+        self.assertEqual(
+            problems,
+            [
+                f"public Content-Length {len(ASSET) - 1} does not match {len(ASSET)}: "
+                "software/pc/app.exe"
+            ],
+        )
+
+    def test_sampled_content_mismatch_fails(self):
+        self.serve("software/pc/app.exe", ASSET[::-1])
+        self.assertEqual(self.check("software/pc/app.exe", hash_content=False)[0], [])
+        problems, _ = self.check("software/pc/app.exe")
+        self.assertEqual(problems, ["public content SHA256 mismatch: software/pc/app.exe"])
+
+    def run_main(self, objects):
+        with tempfile.TemporaryDirectory() as directory:
+            listing = Path(directory) / "objects.txt"
+            listing.write_text("\n".join(objects) + "\n", encoding="utf-8")
+            argv = [
+                "verify_public.py",
+                "--objects",
+                str(listing),
+                "--public-base-url",
+                self.base_url,
+                "--sha256-sample",
+                "1",
+                "--rate",
+                "0",
+            ]
+            out, err = io.StringIO(), io.StringIO()
+            with mock.patch.object(sys, "argv", argv), redirect_stdout(out), redirect_stderr(err):
+                status = verify_public.main()
+        return status, out.getvalue(), err.getvalue()
+
+    def test_cli_checks_static_assets_against_the_checkout(self):
+        data = (ROOT / STATIC_KEY).read_bytes()
+        self.serve(STATIC_KEY, data)
+        status, out, _ = self.run_main([STATIC_KEY])
+        self.assertEqual(status, 0)
+        self.assertIn("verified 1 public objects, 1 rehashed", out)
+
+        self.serve(STATIC_KEY, bytes(len(data)))
+        status, _, err = self.run_main([STATIC_KEY])
+        self.assertEqual(status, 1)
+        self.assertIn(f"public content SHA256 mismatch: {STATIC_KEY}", err)
+
+
+if __name__ == "__main__":
+    unittest.main()